@@ -0,0 +1,339 @@
+"""
+Batch Service Module
+
+Reproduces many crates without interaction, eg: to re-execute published crates after
+a COMPSs upgrade. The crates and the answers to the questions of the service are given
+in a JSON manifest:
+
+    {
+        "defaults": {"provenance": false},
+        "crates": [
+            {"crate": "https://workflowhub.eu/.../ro_crate?version=1", "name": "matmul"},
+            {"crate": "crates/wordcount.zip", "new_dataset": "datasets/wordcount",
+             "flags": ["-d"], "changes": {"4": "16"}, "run": false}
+        ]
+    }
+
+For each crate: "crate" (link or path, required), "name", "download" (download it after
+the remote probe, true by default), "new_dataset" (folder copied as the new dataset),
+"provenance" and "submitter" (name, e-mail, orcid, organisation_name, ror), "flags"
+added to the command, "changes" of the command values (index from 1 -> new value) and
+"run" (execute the command, true by default). Relative paths are relative to the manifest.
+
+The download, verification and mapping stages of the crates run concurrently on a
+process pool (RS_BATCH_WORKERS processes), each crate in its own execution directory
+inside the batch directory and with its output in its log/rs_log.txt. The commands are
+then executed one after the other, since each COMPSs run uses the whole machine, and a
+table with the result of every crate is printed and exported to the batch directory.
+"""
+import contextlib
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import crate_extractor
+import data_persistance_false
+import utils
+import verification_engine
+
+from crate_context import CrateContext
+from data_persistance_false import command_line_generator_dpf, data_persistence_false_verifier
+from environment_probe import probe_environment
+from file_operations import create_new_execution_directory, move_results_created
+from file_verifier import files_verifier
+from get_workflow import get_change_values, get_more_flags, get_workflow
+from metadata_cache import cache_crate_metadata
+from new_dataset_backend import new_dataset_info_collector
+from provenance_backend import provenance_checker, provenance_info_collector, update_yaml
+from remote_dataset import remote_dataset
+from reproducibility_methods import generate_command_line
+from result_verifier import result_verifier
+from status_report import ReportWriter
+from utils import (TextColor, executor, get_compss_crate_version, get_data_persistence_status, get_instument,
+                   get_objects_dict, get_previous_flags, print_colored)
+
+BATCH_WORKERS: int = int(os.environ.get("RS_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+RESULT_FIELDS = ["name", "source", "status", "stage", "compss_version", "data_persistence", "seconds",
+                 "execution_path", "command", "error"]
+SUBMITTER_FIELDS = ("name", "e-mail", "orcid", "organisation_name", "ror")
+
+
+class CrateRun:
+    """
+    State of the reproduction of one crate, as the attributes generate_command_line expects
+    from the service (crate_directory, crate_context, remote_dataset_flag, new_dataset_flag).
+    """
+    def __init__(self, crate_context: CrateContext, new_dataset_flag: bool):
+        self.crate_directory = crate_context.crate_path
+        self.crate_context = crate_context
+        self.new_dataset_flag = new_dataset_flag
+        self.remote_dataset_flag = False
+
+
+def load_manifest(manifest_path: str) -> list:
+    """
+    Read the crates of a batch manifest, with the defaults applied and the paths made absolute.
+
+    Args:
+        manifest_path (str): path to the JSON manifest.
+
+    Raises:
+        ValueError: If the manifest is not valid.
+
+    Returns:
+        list: one dict of answers per crate.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        try:
+            manifest = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The batch manifest {manifest_path} is not valid JSON: {e}") from e
+    if isinstance(manifest, list):
+        manifest = {"crates": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("crates"), list) or not manifest["crates"]:
+        raise ValueError(f"The batch manifest {manifest_path} does not list any crate")
+
+    base_path = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    names = set()
+    for i, item in enumerate(manifest["crates"], start=1):
+        entry = dict(manifest.get("defaults", {}))
+        entry.update({"crate": item} if isinstance(item, str) else item)
+        if not entry.get("crate"):
+            raise ValueError(f"The crate {i} of the batch manifest has no 'crate' link or path")
+        if not entry["crate"].startswith("http"):
+            entry["crate"] = os.path.join(base_path, entry["crate"])
+        if entry.get("new_dataset"):
+            entry["new_dataset"] = os.path.join(base_path, entry["new_dataset"])
+        name = entry.get("name") or os.path.basename(entry["crate"].rstrip("/")) or f"crate_{i}"
+        while name in names: # names identify the crates in the results table
+            name = f"{name}_{i}"
+        names.add(name)
+        entry["name"] = name
+        entries.append(entry)
+    return entries
+
+
+def preset_answers(entry: dict) -> dict:
+    """
+    Answers of a crate of the manifest to the questions of the service (see utils.get_yes_or_no).
+    """
+    flags = entry.get("flags") or []
+    if isinstance(flags, str):
+        flags = flags.split()
+    changes = entry.get("changes") or {}
+    answers = {
+        "download": entry.get("download", True),
+        "new_dataset": bool(entry.get("new_dataset")),
+        "new_dataset_path": entry.get("new_dataset"),
+        "provenance": entry.get("provenance", False),
+        "add_flags": bool(flags),
+        "flags": " ".join(flags),
+        "change_values": bool(changes),
+        "changes": changes,
+    }
+    for field in SUBMITTER_FIELDS:
+        answers[f"submitter.{field}"] = (entry.get("submitter") or {}).get(field)
+    return answers
+
+
+def _share_cores(workers: int):
+    """
+    Split the processes of the extraction and the hashing among the crates prepared at once.
+    """
+    crate_extractor.EXTRACT_WORKERS = max(1, crate_extractor.EXTRACT_WORKERS // workers)
+    verification_engine.HASH_WORKERS = max(1, verification_engine.HASH_WORKERS // workers)
+
+
+def prepare_crate(entry: dict, batch_path: str) -> dict:
+    """
+    Download, verify and map the command of a crate of the manifest, in a worker process.
+
+    Args:
+        entry (dict): the crate and its answers, from load_manifest.
+        batch_path (str): directory of the batch, where the execution directory is created.
+
+    Returns:
+        dict: the row of the crate in the results table, with the new command and the
+            state the execution needs.
+    """
+    start = time.perf_counter()
+    row = dict.fromkeys(RESULT_FIELDS, "")
+    row.update({"name": entry["name"], "source": entry["crate"], "status": "failed", "stage": "download"})
+    execution_path = create_new_execution_directory(None, batch_path)
+    row["execution_path"] = execution_path
+    utils.PRESET_ANSWERS = preset_answers(entry)
+    data_persistance_false.RESULT_PATH = os.path.join(execution_path, "Result")
+    data_persistance_false.OUTPUT_NUM = 0
+    stdin = sys.stdin
+    with open(os.devnull, 'r', encoding='utf-8') as devnull, \
+            open(os.path.join(execution_path, 'log', 'rs_log.txt'), 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        sys.stdin = devnull # a question without preset answer must not wait
+        try:
+            compss_version, slurm_cluster = probe_environment()
+            print(f"Source for crate: {entry['crate']}")
+            crate_context = CrateContext(get_workflow(execution_path, entry["crate"]))
+            if cache_crate_metadata(crate_context):
+                print("Crate metadata loaded from the cache")
+            row["compss_version"] = get_compss_crate_version(crate_context)
+            if compss_version != row["compss_version"]:
+                print_colored(f"WARNING: The crate was created with COMPSs version: {row['compss_version']}, which "
+                              f"differs with the COMPSs version found locally: {compss_version}", TextColor.YELLOW)
+            data_persistence = get_data_persistence_status(crate_context)
+            row["data_persistence"] = data_persistence
+            os.chdir(execution_path) # Avoid problems when relative paths are used as parameter
+
+            row["stage"] = "verification"
+            crate_run = CrateRun(crate_context, not slurm_cluster and utils.get_yes_or_no(
+                "Do you want to reproduce the crate on a new dataset?", "new_dataset"))
+            provenance_flag = False
+            if not slurm_cluster or data_persistence:
+                provenance_flag = provenance_info_collector(execution_path, os.path.dirname(os.path.abspath(__file__)))
+            if not data_persistence:
+                data_persistence_false_verifier(crate_context, os.path.join(execution_path, "log"))
+            elif crate_run.new_dataset_flag:
+                new_dataset_info_collector(crate_context)
+                crate_context.invalidate_inventory() # the new dataset was copied into the crate
+            else:
+                crate_run.remote_dataset_flag, remote_dataset_dict = remote_dataset(crate_context)
+                files_verifier(crate_context, get_instument(crate_context), get_objects_dict(crate_context),
+                               remote_dataset_dict, os.path.join(execution_path, "log"))
+            if data_persistence and provenance_flag:
+                update_yaml(crate_context)
+
+            row["stage"] = "mapping"
+            if not data_persistence:
+                with open(os.path.join(crate_run.crate_directory, "compss_submission_command_line.txt"),
+                          'r', encoding='utf-8') as file:
+                    new_command = command_line_generator_dpf(next(file).strip(), crate_context)
+            else:
+                new_command = generate_command_line(crate_run, execution_path)
+                if provenance_flag:
+                    new_command.insert(1, "--provenance")
+            new_command = get_more_flags(new_command, get_previous_flags(crate_run.crate_directory))
+            new_command = get_change_values(new_command)
+            crate_context.inventory.materialize(new_command) # crates opened lazily
+            row.update({"status": "prepared", "command": " ".join(new_command), "new_command": new_command,
+                        "crate_path": crate_run.crate_directory, "new_dataset": crate_run.new_dataset_flag,
+                        "provenance": provenance_flag and not slurm_cluster, "slurm_cluster": slurm_cluster,
+                        # the archive of a crate opened lazily is only known to this worker process
+                        "lazy_archive": crate_extractor.lazy_archive(crate_run.crate_directory)})
+        except (Exception, SystemExit) as e: # pylint: disable=broad-except
+            print_colored(e, TextColor.RED)
+            row["error"] = str(e) or type(e).__name__
+        finally:
+            sys.stdin = stdin
+    row["seconds"] = round(time.perf_counter() - start, 1)
+    return row
+
+
+def run_prepared_crate(row: dict):
+    """
+    Execute the command of a prepared crate and compare its results with the original ones.
+    Runs in the main process, one crate at a time.
+    """
+    start = time.perf_counter()
+    execution_path = row["execution_path"]
+    row["stage"] = "execution"
+    with open(os.path.join(execution_path, 'log', 'rs_log.txt'), 'a', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            os.chdir(execution_path)
+            initial_files = set(os.listdir(execution_path))
+            if not executor(row["new_command"], execution_path):
+                row["status"] = "failed"
+                row["error"] = "The command failed, see log/out.log and log/err.log"
+            else:
+                move_results_created(initial_files, execution_path)
+                row["status"] = "executed"
+                if row["slurm_cluster"]: # enqueue_compss only submits the job, the results are not there yet
+                    row["status"] = "submitted"
+                    print_colored("The job was submitted to the SLURM queue, compare its results with the original "
+                                  "run once it finishes", TextColor.YELLOW)
+                elif not row["new_dataset"]: # with a new dataset the results are expected to differ
+                    row["stage"] = "results"
+                    if row["lazy_archive"]:
+                        crate_extractor.LAZY_ARCHIVES[os.path.abspath(row["crate_path"])] = row["lazy_archive"]
+                    crate_context = CrateContext(row["crate_path"])
+                    cache_crate_metadata(crate_context)
+                    reproduced = result_verifier(crate_context, os.path.join(execution_path, "Result"),
+                                                 os.path.join(execution_path, "log"))
+                    row["status"] = "reproduced" if reproduced else "differs"
+                if row["provenance"]:
+                    provenance_checker(execution_path)
+        except Exception as e: # pylint: disable=broad-except
+            print_colored(e, TextColor.RED)
+            row["status"] = "failed"
+            row["error"] = str(e) or type(e).__name__
+    row["seconds"] = round(row["seconds"] + time.perf_counter() - start, 1)
+
+
+def report_batch(rows: list, batch_path: str):
+    """
+    Print the results table of the batch and export it to the batch directory.
+    """
+    with ReportWriter(batch_path, "batch_results", RESULT_FIELDS) as writer:
+        for row in rows:
+            writer.write(tuple(row[field] for field in RESULT_FIELDS))
+    table = [[row["name"], row["status"], row["stage"], row["compss_version"], row["seconds"],
+              os.path.basename(row["execution_path"]), utils.wrap_text(row["error"], 40)] for row in rows]
+    from tabulate import tabulate
+    print(tabulate(table, headers=["Crate", "Status", "Stage", "COMPSs", "Seconds", "Execution directory", "Error"],
+                   tablefmt="grid"))
+    if writer.path:
+        print(f"Batch results exported to {writer.path}")
+
+
+def run_batch(manifest_path: str, workers: int = None) -> bool:
+    """
+    Reproduce the crates of a batch manifest.
+
+    Args:
+        manifest_path (str): path to the JSON manifest.
+        workers (int, optional): crates prepared at once. Defaults to RS_BATCH_WORKERS.
+
+    Raises:
+        ValueError: If the manifest is not valid.
+
+    Returns:
+        bool: True if every crate was reproduced (or prepared, for those not run).
+    """
+    entries = load_manifest(manifest_path)
+    workers = max(1, min(workers or BATCH_WORKERS, len(entries)))
+    working_path = os.getcwd()
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    batch_path = tempfile.mkdtemp(prefix=f"reproducibility_batch_{timestamp}_", dir=os.getcwd())
+    print_colored(f"Preparing {len(entries)} crates, {workers} at once, in {batch_path}", TextColor.BLUE)
+
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_share_cores, initargs=(workers,)) as pool:
+        futures = {pool.submit(prepare_crate, entry, batch_path): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                row = future.result()
+            except Exception as e: # pylint: disable=broad-except  # eg: the worker process died
+                row = dict.fromkeys(RESULT_FIELDS, "")
+                row.update({"name": entry["name"], "source": entry["crate"], "status": "failed",
+                            "stage": "preparation", "error": str(e) or type(e).__name__})
+            rows[entry["name"]] = row
+            color = TextColor.RED if row["status"] == "failed" else TextColor.GREEN
+            utils.print_colored_ns(f"{row['name']}: {row['status']} ({row['stage']}) in {row['seconds']}s", color)
+
+    rows = [rows[entry["name"]] for entry in entries] # in the order of the manifest
+    for entry, row in zip(entries, rows):
+        if row["status"] == "prepared" and entry.get("run", True):
+            print(f"Running {row['name']}: {row['command']}")
+            run_prepared_crate(row)
+            color = TextColor.GREEN if row["status"] in ("executed", "submitted", "reproduced") else TextColor.RED
+            utils.print_colored_ns(f"{row['name']}: {row['status']}", color)
+    os.chdir(working_path)
+
+    report_batch(rows, batch_path)
+    return all(row["status"] in ("prepared", "executed", "submitted", "reproduced") for row in rows)
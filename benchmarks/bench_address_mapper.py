@@ -0,0 +1,97 @@
+"""
+Address Mapper Benchmark
+
+Times the mapping of the paths of a command to a synthetic dataset with the suffix
+index of the crate inventory against the former mapping probing the filesystem for
+every suffix of every path (see tests/former_address_mapper.py), and checks that both
+map every path to the same file. The probes of the former mapping are counted: on a
+local disk with a warm cache they are about as fast as the index lookups, on a parallel
+filesystem each of them is a metadata request to the server (and the dataset of a crate
+opened lazily is not on disk to be probed).
+
+Usage: python benchmarks/bench_address_mapper.py [files] [paths] (20000 files and 1000 paths by default)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from crate_inventory import CrateInventory # pylint: disable=wrong-import-position
+from reproducibility_methods.address_mapper import ( # pylint: disable=wrong-import-position
+    addr_extractor, address_converter_backend
+)
+from former_address_mapper import former_address_converter_backend # pylint: disable=wrong-import-position
+
+ORIGINAL_ROOT = "/gpfs/projects/bsc19/bsc19234/experiments/run_2024_01_01/dataset"
+
+
+def write_dataset(dataset_path: str, files: int) -> list:
+    """
+    Write empty files four directories deep and get their paths relative to the dataset.
+    """
+    relative_paths = []
+    for index in range(files):
+        relative_path = os.path.join(f"block_{index % 10}", f"row_{index % 97}", f"col_{index % 13}",
+                                     f"part_{index}.dat")
+        path = os.path.join(dataset_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8'):
+            pass
+        relative_paths.append(relative_path)
+    return relative_paths
+
+
+def count_probes(run) -> int:
+    """
+    Number of os.path.exists calls made by a function.
+    """
+    exists = os.path.exists
+    probes = 0
+    def counting_exists(path):
+        nonlocal probes
+        probes += 1
+        return exists(path)
+    os.path.exists = counting_exists
+    try:
+        run()
+    finally:
+        os.path.exists = exists
+    return probes
+
+
+def main(files: int, paths: int):
+    with tempfile.TemporaryDirectory() as crate_path:
+        dataset_path = os.path.join(crate_path, "dataset")
+        relative_paths = write_dataset(dataset_path, files)
+        addresses = [f"{ORIGINAL_ROOT}/{relative_path}"
+                     for relative_path in random.Random(22).sample(relative_paths, min(paths, files))]
+        hashmap = addr_extractor(dataset_path)
+
+        start = time.perf_counter()
+        former = [former_address_converter_backend(dataset_path, addr, hashmap) for addr in addresses]
+        former_seconds = time.perf_counter() - start
+        probes = count_probes(lambda: [former_address_converter_backend(dataset_path, addr, hashmap)
+                                       for addr in addresses])
+
+        start = time.perf_counter()
+        inventory = CrateInventory(crate_path)
+        inventory.suffix_index(dataset_path)
+        inventory_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        indexed = [address_converter_backend(dataset_path, addr, hashmap, inventory) for addr in addresses]
+        indexed_seconds = time.perf_counter() - start
+
+        assert former == indexed
+        print(f"{len(addresses)} paths mapped to a dataset of {files} files")
+        print(f"filesystem probes: {former_seconds * 1000:.1f} ms ({probes} os.path.exists calls)")
+        print(f"suffix index:      {indexed_seconds * 1000:.1f} ms "
+              f"(+ {inventory_seconds * 1000:.1f} ms to build the inventory and its suffix index)")
+        print(f"speedup of the mapping: {former_seconds / indexed_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
@@ -0,0 +1,74 @@
+"""
+Entity Index Benchmark
+
+Compares the id/type indexes of CrateContext with the linear scans of get_by_id and
+get_Create_Action they replaced, on a synthetic crate of 50k File entities (the
+CreateAction last, as in the crates generated by COMPSs). Every object of the
+CreateAction is looked up, as the verification stages do.
+
+Usage: python benchmarks/bench_entity_index.py [files] (50000 by default)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crate_context import CrateContext # pylint: disable=wrong-import-position
+from utils import get_by_id, get_Create_Action, get_objects # pylint: disable=wrong-import-position
+from synthetic_crate import write_crate # pylint: disable=wrong-import-position
+
+LINEAR_SAMPLE = 200 # lookups timed with the linear scan, the whole run would take hours
+
+
+def linear_get_by_id(crate, entity_id: str):
+    for entity in crate.get_entities():
+        if entity.id == entity_id:
+            return entity
+    return None
+
+
+def linear_get_create_action(crate):
+    for entity in crate.get_entities():
+        if entity.type == "CreateAction":
+            return entity
+    return None
+
+
+def main(files: int):
+    with tempfile.TemporaryDirectory() as crate_path:
+        write_crate(crate_path, files)
+        crate_context = CrateContext(crate_path, backend="stream")
+        crate = crate_context.crate # parsed before timing, both methods use the same entities
+
+        start = time.perf_counter()
+        create_action = linear_get_create_action(crate)
+        object_ids = [value.id for value in create_action["object"]]
+        sample = object_ids[::max(1, len(object_ids) // LINEAR_SAMPLE)][:LINEAR_SAMPLE]
+        linear = [linear_get_by_id(crate, object_id) for object_id in sample]
+        linear_seconds = time.perf_counter() - start
+        linear_per_lookup = linear_seconds / len(sample)
+
+        start = time.perf_counter()
+        assert get_Create_Action(crate_context) is create_action
+        objects = get_objects(crate_context)
+        indexed = [get_by_id(crate_context, object_id) for object_id in objects]
+        indexed_seconds = time.perf_counter() - start
+
+        assert objects == object_ids
+        assert all(entity is not None for entity in indexed)
+        assert [get_by_id(crate_context, object_id) for object_id in sample] == linear
+        assert get_by_id(crate_context, "missing") is None
+
+        projected = linear_per_lookup * len(objects)
+        print(f"{files} entities, {len(objects)} objects looked up")
+        print(f"linear scans: {linear_per_lookup * 1000:.3f} ms per lookup, "
+              f"{projected:.1f}s projected for every object ({len(sample)} timed)")
+        print(f"indexes:      {indexed_seconds:.3f}s for every object, index build included")
+        print(f"speedup:      {projected / indexed_seconds:.0f}x")
+        assert indexed_seconds < projected
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
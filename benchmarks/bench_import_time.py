@@ -0,0 +1,78 @@
+"""
+Import Time Benchmark
+
+Measures the startup of the service: importing its entry point in a fresh interpreter,
+against an empty interpreter, and checks that the heavy modules (rocrate, ruamel,
+tabulate, the HTTP stack) are not imported until they are needed. The welcome message
+is also timed with RS_WELCOME_DELAY=0, which must not sleep.
+
+Usage: python benchmarks/bench_import_time.py [runs] (10 by default)
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVICE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINT = os.path.join(SERVICE_PATH, "compss_reproducibility_service")
+DEFERRED_MODULES = ("rocrate", "ruamel", "tabulate", "http.client", "ssl", "urllib.request", "numpy")
+
+# Imports the entry point under another name, so that its __main__ block does not run
+IMPORT_SERVICE = f"""
+import importlib.machinery, importlib.util, json, sys, time
+start = time.perf_counter()
+loader = importlib.machinery.SourceFileLoader("rs_entry_point", {ENTRY_POINT!r})
+module = importlib.util.module_from_spec(importlib.util.spec_from_loader(loader.name, loader))
+loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+WELCOME = """
+import json, time
+start = time.perf_counter()
+from utils import print_welcome_message
+print_welcome_message()
+print(json.dumps({"seconds": time.perf_counter() - start}))
+"""
+
+
+def run(code: str, env: dict = None) -> tuple:
+    """
+    Run Python code in a fresh interpreter from the service directory.
+
+    Returns:
+        tuple: wall seconds of the whole process, and the JSON document printed last (if any).
+    """
+    command = [sys.executable, "-c", code]
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=SERVICE_PATH, capture_output=True, text=True, check=True,
+                               env={**os.environ, **(env or {})})
+    seconds = time.perf_counter() - start
+    lines = completed.stdout.strip().splitlines()
+    return seconds, json.loads(lines[-1]) if lines and lines[-1].startswith("{") else None
+
+
+def main(runs: int):
+    empty = [run("pass")[0] for _ in range(runs)]
+    startups = [run(IMPORT_SERVICE) for _ in range(runs)]
+    process = [seconds for seconds, _ in startups]
+    imports = [document["seconds"] for _, document in startups]
+    modules = set(startups[0][1]["modules"])
+
+    print(f"empty interpreter:   {statistics.median(empty) * 1000:.0f} ms (median of {runs})")
+    print(f"service process:     {statistics.median(process) * 1000:.0f} ms")
+    print(f"service imports:     {statistics.median(imports) * 1000:.0f} ms, {len(modules)} modules loaded")
+    loaded = [name for name in DEFERRED_MODULES if name in modules]
+    print(f"deferred modules loaded at startup: {', '.join(loaded) or 'none'}")
+
+    welcome_seconds = run(WELCOME, {"RS_WELCOME_DELAY": "0"})[1]["seconds"]
+    print(f"welcome message:     {welcome_seconds * 1000:.0f} ms with RS_WELCOME_DELAY=0")
+    assert not loaded
+    assert welcome_seconds < 0.5
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
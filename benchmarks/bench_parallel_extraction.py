@@ -0,0 +1,128 @@
+"""
+Parallel Extraction Benchmark
+
+Times the extraction of a synthetic zipped crate with one process and with
+RS_EXTRACT_WORKERS processes, checks the extracted files against the digests of the
+original data, and checks that corrupted members (a flipped byte in a stored member,
+caught by the CRC-32, and in a deflated table, in its data or in the header of its
+first deflate block, which breaks the stream) are reported as a ValueError without
+leaving the corrupted file behind.
+
+Usage: python benchmarks/bench_parallel_extraction.py [MiB] [members] (128 MiB in 32 members
+by default, above the size from which the extraction runs in parallel)
+"""
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crate_extractor import EXTRACT_WORKERS, extract_crate # pylint: disable=wrong-import-position
+
+
+def member_data(index: int, size: int) -> bytes:
+    """
+    Half random bytes, half text, so that deflate has work to do.
+    """
+    text = b"".join(b"%d,%d,measurement\n" % (index, i) for i in range(size // 40))
+    return os.urandom(size // 2) + text[:size - size // 2]
+
+
+def write_zip(zip_path: str, total_bytes: int, members: int) -> dict:
+    """
+    Write a crate archive and get the sha256 of each of its members.
+    """
+    digests = {}
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+        zip_file.writestr("ro-crate-metadata.json", '{"@context": {}, "@graph": []}')
+        table = b"".join(b"%d,%d,measurement\n" % (i, i * i) for i in range(100000))
+        zip_file.writestr("dataset/table.csv", table)
+        digests["dataset/table.csv"] = hashlib.sha256(table).hexdigest()
+        for index in range(members):
+            name = f"dataset/part_{index:04d}.dat"
+            data = member_data(index, total_bytes // members)
+            compression = zipfile.ZIP_STORED if index % 2 else zipfile.ZIP_DEFLATED
+            zip_file.writestr(zipfile.ZipInfo(name, (2024, 1, 1, 0, 0, 0)), data, compression)
+            digests[name] = hashlib.sha256(data).hexdigest()
+    return digests
+
+
+def extract(zip_path: str, destination: str, workers: int) -> float:
+    shutil.rmtree(destination, ignore_errors=True)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        extract_crate(zip_path, destination, skip_unreferenced=False, workers=workers)
+    return time.perf_counter() - start
+
+
+def check_digests(destination: str, digests: dict):
+    for name, digest in digests.items():
+        with open(os.path.join(destination, name), 'rb') as file:
+            assert hashlib.sha256(file.read()).hexdigest() == digest, name
+
+
+def corrupt(zip_path: str, corrupted_path: str, name: str, position: float):
+    """
+    Copy the archive flipping a byte of the data of a member.
+
+    Args:
+        position (float): where the byte is in the compressed data, from 0 to 1.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_file:
+        info = zip_file.getinfo(name)
+    with open(zip_path, 'rb') as file:
+        data = bytearray(file.read())
+    # Local header: 30 bytes, then the name and the extra field (lengths at offsets 26 and 28)
+    header = info.header_offset
+    start = header + 30 + int.from_bytes(data[header + 26:header + 28], "little") \
+        + int.from_bytes(data[header + 28:header + 30], "little")
+    data[start + int(info.compress_size * position)] ^= 0xFF
+    with open(corrupted_path, 'wb') as file:
+        file.write(data)
+
+
+def check_corrupted(zip_path: str, directory: str, name: str, position: float):
+    corrupted_path = os.path.join(directory, "corrupted.zip")
+    destination = os.path.join(directory, "corrupted")
+    corrupt(zip_path, corrupted_path, name, position)
+    try:
+        extract(corrupted_path, destination, 1)
+        raise AssertionError(f"the corruption of {name} was not detected")
+    except ValueError as e:
+        error = str(e)
+    assert name in error, error
+    assert not os.path.exists(os.path.join(destination, name))
+    print(f"corrupted {name}: detected, no file left ({error.rsplit(': ', 1)[-1]})")
+
+
+def main(megabytes: int, members: int):
+    workers = max(2, EXTRACT_WORKERS)
+    with tempfile.TemporaryDirectory() as directory:
+        zip_path = os.path.join(directory, "crate.zip")
+        digests = write_zip(zip_path, megabytes * 1024 * 1024, members)
+        print(f"{megabytes} MiB in {members} members, {os.path.getsize(zip_path) / (1024 * 1024):.0f} MiB zipped")
+
+        destination = os.path.join(directory, "crate")
+        sequential = extract(zip_path, destination, 1)
+        check_digests(destination, digests)
+        parallel = extract(zip_path, destination, workers)
+        check_digests(destination, digests)
+        print(f"1 process:   {sequential:.2f}s ({megabytes / sequential:.0f} MiB/s)")
+        print(f"{workers} processes: {parallel:.2f}s ({megabytes / parallel:.0f} MiB/s), "
+              f"{sequential / parallel:.1f}x on {os.cpu_count()} CPUs")
+        if (os.cpu_count() or 1) >= 4:
+            assert sequential / parallel > 1.5
+
+        check_corrupted(zip_path, directory, "dataset/part_0001.dat", 0.5) # stored
+        check_corrupted(zip_path, directory, "dataset/table.csv", 0.5) # deflated, caught by the CRC-32
+        check_corrupted(zip_path, directory, "dataset/table.csv", 0) # header of the first deflate block
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 128, int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -0,0 +1,74 @@
+"""
+Streaming Loader Benchmark
+
+Measures the time and the peak memory (tracemalloc) of loading a big synthetic
+ro-crate-metadata.json with the streaming backend (crate_stream), against loading the
+whole document with json.load, the first step of the rocrate backend. The rocrate
+backend itself is measured too when the rocrate package is installed.
+
+Usage: python benchmarks/bench_streaming_loader.py [files] [padding] (100000 files with
+500 characters of unused metadata each by default, about 70 MB)
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crate_context import CrateContext # pylint: disable=wrong-import-position
+from utils import get_objects # pylint: disable=wrong-import-position
+from synthetic_crate import write_crate # pylint: disable=wrong-import-position
+
+
+def measure(load) -> tuple:
+    """
+    Run a loader and get its result, seconds and peak of allocated memory in MiB.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def load_json(metadata_path: str) -> int:
+    with open(metadata_path, 'r', encoding='utf-8') as file:
+        return len(json.load(file)["@graph"])
+
+
+def load_crate(crate_path: str, backend: str) -> int:
+    crate_context = CrateContext(crate_path, backend=backend)
+    return len(get_objects(crate_context))
+
+
+def main(files: int, padding: int):
+    with tempfile.TemporaryDirectory() as crate_path:
+        metadata_path = write_crate(crate_path, files, padding)
+        print(f"ro-crate-metadata.json: {os.path.getsize(metadata_path) / (1024 * 1024):.1f} MiB, {files} files")
+
+        entities, json_seconds, json_peak = measure(lambda: load_json(metadata_path))
+        objects, stream_seconds, stream_peak = measure(lambda: load_crate(crate_path, "stream"))
+        assert entities == files + 5
+        assert objects == files
+        print(f"json.load:  {json_seconds:.2f}s, peak {json_peak:.0f} MiB (document only, no entity objects)")
+        print(f"stream:     {stream_seconds:.2f}s, peak {stream_peak:.0f} MiB (entities indexed, objects resolved)")
+        try:
+            import rocrate # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            print("rocrate:    not installed, skipped")
+        else:
+            objects, rocrate_seconds, rocrate_peak = measure(lambda: load_crate(crate_path, "rocrate"))
+            assert objects == files
+            print(f"rocrate:    {rocrate_seconds:.2f}s, peak {rocrate_peak:.0f} MiB")
+        assert stream_peak < json_peak
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
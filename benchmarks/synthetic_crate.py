@@ -0,0 +1,47 @@
+"""
+Synthetic Crate Module
+
+Writes a COMPSs-like ro-crate-metadata.json with many File entities, used by the
+benchmarks to measure the service on crates bigger than the published ones.
+"""
+import json
+import os
+
+
+def write_crate(crate_path: str, files: int, padding: int = 0) -> str:
+    """
+    Write a crate whose CreateAction uses all its files as objects. The CreateAction
+    is the last entity of the @graph, the worst case for a linear scan.
+
+    Args:
+        crate_path (str): directory of the crate, created if needed.
+        files (int): number of File entities.
+        padding (int, optional): characters of extra metadata per file (a description
+            the service does not use), to reach realistic file sizes.
+
+    Returns:
+        str: path to the ro-crate-metadata.json written.
+    """
+    os.makedirs(crate_path, exist_ok=True)
+    file_ids = [f"dataset/part_{i:07d}.csv" for i in range(files)]
+    graph = [
+        {"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}},
+        {"@id": "./", "@type": "Dataset", "name": "Synthetic crate", "hasPart": [{"@id": i} for i in file_ids]},
+        {"@id": "application_sources/main.py", "@type": ["File", "SoftwareSourceCode", "ComputationalWorkflow"],
+         "name": "main.py"},
+        {"@id": "#COMPSs", "@type": "ComputerLanguage", "name": "COMPSs Programming Model", "version": "3.3.1"},
+    ]
+    description = "x" * padding
+    for i, file_id in enumerate(file_ids):
+        entity = {"@id": file_id, "@type": "File", "name": os.path.basename(file_id), "contentSize": 1000 + i,
+                  "dateModified": "2024-01-01T00:00:00+00:00", "encodingFormat": "text/csv"}
+        if padding:
+            entity["description"] = description
+        graph.append(entity)
+    graph.append({"@id": "#COMPSs_Workflow_Run_Crate_synthetic", "@type": "CreateAction",
+                  "instrument": {"@id": "application_sources/main.py"},
+                  "object": [{"@id": i} for i in file_ids], "result": [{"@id": "./"}]})
+    metadata_path = os.path.join(crate_path, "ro-crate-metadata.json")
+    with open(metadata_path, 'w', encoding='utf-8') as file:
+        json.dump({"@context": "https://w3id.org/ro/crate/1.1/context", "@graph": graph}, file)
+    return metadata_path
@@ -0,0 +1,147 @@
+"""
+Command Plan Module
+
+Stores how the tokens of the submission command were mapped (original token ->
+mapped path or value) so that the next reproduction of the same crate reuses the
+mapping instead of resolving every path again. A plan is keyed by the digest of the
+crate metadata, the submission command and the dataset choice, and records for each
+token the folders of the crate its mapping depended on (dataset, application_sources...)
+together with a fingerprint of their file tree taken from the crate inventory.
+
+On reuse only the tokens depending on a folder whose fingerprint changed are resolved
+again, and tokens mapped outside the crate (data persistence false) are reused only
+if their path still exists. Mapped paths are stored relative to the crate or to the
+Result directory, since every reproduction extracts the crate in a new execution
+directory. The plans live in the cache directory of the service (like the metadata
+cache) rather than next to the crate, which is recreated by each run.
+"""
+import hashlib
+import json
+import os
+
+from crate_context import CrateContext
+from disk_cache import DiskCache
+from metadata_cache import crate_digest
+from utils import print_colored, TextColor
+
+PLAN_FORMAT_VERSION: int = 1
+COMMAND_PLAN: bool = os.environ.get("RS_COMMAND_PLAN", "1").lower() not in ("0", "false", "no")
+PLAN_CACHE = DiskCache("plans", int(os.environ.get("RS_PLAN_CACHE_MB", "64")) * 1024 * 1024)
+EXISTS = "exists" # dependency of the tokens mapped outside the crate: their path must still exist
+
+
+def folder_fingerprint(crate_context: CrateContext, folder: str) -> str:
+    """
+    Fingerprint of the file tree of a folder of the crate: the relative paths and types
+    of its entries, from the inventory. Sizes and dates are left out, a crate extracted
+    again has the same fingerprint.
+
+    Args:
+        crate_context (CrateContext): the crate.
+        folder (str): name of the folder, eg: dataset.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    inventory = crate_context.inventory
+    prefix = folder + os.sep
+    digest = hashlib.sha256()
+    for relative_path in sorted(path for path in inventory.entries if path.startswith(prefix)):
+        digest.update(f"{relative_path[len(prefix):]}\0{int(inventory.entries[relative_path].is_dir)}\n".encode())
+    return digest.hexdigest()
+
+
+def plan_key(crate_context: CrateContext, mode: str, tokens: list, options: tuple) -> str:
+    """
+    Key of the plan of a command: digest of the crate metadata, mapping mode, tokens and options.
+    """
+    digest = crate_context.fact("crate_digest", lambda: crate_digest(crate_context))
+    return hashlib.sha256(json.dumps([digest, mode, tokens, list(options)]).encode()).hexdigest()
+
+
+def _relocatable(value: str, crate_path: str, result_path: str) -> list:
+    """
+    Store a mapped value relative to the crate or to the Result directory when it is inside them.
+    """
+    for kind, base in (("result", result_path), ("crate", crate_path)):
+        if base and (value == base or value.startswith(os.path.join(base, ""))):
+            relative_path = os.path.relpath(value, base)
+            return [kind, os.path.join(relative_path, "") if value.endswith(os.sep) else relative_path]
+    return ["literal", value]
+
+
+def _expand(stored: list, crate_path: str, result_path: str) -> str:
+    kind, value = stored
+    if kind == "literal":
+        return value
+    if kind == "result":
+        path = os.path.normpath(os.path.join(result_path, value))
+        # The Result directories the mapping created in the previous run
+        os.makedirs(path if value.endswith(os.sep) else result_path, exist_ok=True)
+        return os.path.join(path, "") if value.endswith(os.sep) else path
+    path = os.path.normpath(os.path.join(crate_path, value))
+    return os.path.join(path, "") if value.endswith(os.sep) else path
+
+
+def map_command(crate_context: CrateContext, mode: str, tokens: list, options: tuple, folders: list,
+                result_path: str, resolve) -> list:
+    """
+    Map the tokens of a command, reusing the plan of a previous reproduction for the
+    tokens whose dependencies did not change, and store the updated plan.
+
+    Args:
+        crate_context (CrateContext): the crate.
+        mode (str): mapping method, eg: "dpf".
+        tokens (list): tokens of the original command.
+        options (tuple): choices the mapping depends on, eg: (remote_dataset_flag, new_dataset_flag).
+        folders (list): names of the folders of the crate the mapping may depend on.
+        result_path (str): Result directory of this reproduction.
+        resolve (callable): (index, token) -> (mapped value, dependencies), the value is None
+            for the tokens dropped from the new command and the dependencies are the folders
+            the mapping depended on (and/or EXISTS).
+
+    Raises:
+        FileNotFoundError: If a token cannot be resolved.
+
+    Returns:
+        list: the mapped values of the kept tokens, in command order.
+    """
+    crate_path = crate_context.crate_path
+    if not COMMAND_PLAN:
+        return [value for value, _ in (resolve(i, token) for i, token in enumerate(tokens)) if value is not None]
+
+    key = plan_key(crate_context, mode, tokens, options)
+    fingerprints = {folder: folder_fingerprint(crate_context, folder) for folder in folders}
+    plan = PLAN_CACHE.get_json(key)
+    if not plan or plan.get("version") != PLAN_FORMAT_VERSION or len(plan["tokens"]) != len(tokens):
+        plan = None
+    changed = {folder for folder in folders if not plan or plan["fingerprints"].get(folder) != fingerprints[folder]}
+
+    # The entries still valid are expanded first, so that the tokens resolved again (eg: a new
+    # output directory) do not take the paths of the reused ones
+    entries = [None] * len(tokens)
+    mapped = [None] * len(tokens)
+    for i, token in enumerate(tokens):
+        entry = plan["tokens"][i] if plan else None
+        if entry is None or entry["token"] != token or changed.intersection(entry["depends"]):
+            continue
+        value = _expand(entry["value"], crate_path, result_path) if entry["value"] else None
+        if value is not None and EXISTS in entry["depends"] and not os.path.exists(value):
+            continue
+        entries[i], mapped[i] = entry, value
+
+    resolved = 0
+    for i, token in enumerate(tokens):
+        if entries[i] is None:
+            value, depends = resolve(i, token)
+            resolved += 1
+            entries[i] = {"token": token, "depends": list(depends),
+                          "value": _relocatable(value, crate_path, result_path) if value is not None else None}
+            mapped[i] = value
+
+    if plan and resolved < len(tokens):
+        print_colored(f"Command mapping reused from a previous reproduction ({resolved} of {len(tokens)} "
+                      "arguments resolved again)", TextColor.BLUE)
+    if resolved:
+        PLAN_CACHE.put_json(key, {"version": PLAN_FORMAT_VERSION, "fingerprints": fingerprints, "tokens": entries})
+    return [value for value in mapped if value is not None]
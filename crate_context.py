@@ -0,0 +1,178 @@
+"""
+Crate Context Module
+
+Holds everything the service reads from a crate, so that ro-crate-metadata.json and
+the YAML configuration file are parsed only once per reproduction and shared by
+every stage (verification, provenance, command line generation).
+"""
+import os
+
+from crate_extractor import lazy_archive
+from crate_inventory import CrateInventory, ZipCrateInventory
+from crate_stream import StreamedCrate
+
+# Backend used to parse ro-crate-metadata.json: "rocrate", "stream" or "auto"
+CRATE_BACKEND: str = os.environ.get("RS_CRATE_BACKEND", "auto")
+# With the "auto" backend, metadata files bigger than this are streamed
+STREAM_THRESHOLD_BYTES: int = 64 * 1024 * 1024
+
+
+class CrateContext:
+    """
+    Parsed RO-Crate shared across the reproducibility service.
+
+    The crate and its YAML configuration are loaded lazily on first access and then
+    kept in memory for the rest of the run. Entities are indexed by id and by type
+    the first time they are looked up, so every lookup afterwards is O(1).
+
+    Very large metadata files are parsed with the streaming backend (see crate_stream),
+    which keeps only the entity properties the service uses.
+
+    Attributes:
+        crate_path (str): Path to the root directory of the RO-Crate.
+        backend (str): "rocrate", "stream" or "auto" (stream when the metadata file is big).
+        facts (dict): Values extracted from the crate (instrument, objects, results,
+            compss_version, data_persistence), computed once or loaded from the metadata cache.
+    """
+    def __init__(self, crate_path: str, backend: str = None):
+        self.crate_path = crate_path
+        self.backend = backend or CRATE_BACKEND
+        self.facts = {}
+        self._crate = None
+        self._entities_by_id = None
+        self._entities_by_type = None
+        self._yaml_file_path = None
+        self._config = None
+        self._inventory = None
+
+    @property
+    def crate(self):
+        """
+        The ROCrate (or StreamedCrate) object, parsed from ro-crate-metadata.json on first access.
+        """
+        if self._crate is None:
+            if self._use_stream_backend():
+                self._crate = StreamedCrate(self.crate_path)
+            else:
+                from rocrate.rocrate import ROCrate # heavy import, only when the crate is parsed
+                self._crate = ROCrate(self.crate_path)
+        return self._crate
+
+    def load_records(self, records: list):
+        """
+        Use already extracted entity records instead of parsing ro-crate-metadata.json.
+        Args:
+            records (list): JSON-LD records of the entities, as built by crate_stream.entity_record.
+        """
+        self._crate = StreamedCrate(self.crate_path, records)
+        self._entities_by_id = None
+        self._entities_by_type = None
+
+    def fact(self, name: str, compute):
+        """
+        Get a value extracted from the crate, computing it only the first time.
+        Args:
+            name (str): Name of the fact, eg: instrument.
+            compute (callable): Function computing the fact if it is not known yet.
+        """
+        if name not in self.facts:
+            self.facts[name] = compute()
+        return self.facts[name]
+
+    def _use_stream_backend(self) -> bool:
+        if self.backend == "stream":
+            return True
+        if self.backend == "rocrate":
+            return False
+        metadata_path = os.path.join(self.crate_path, "ro-crate-metadata.json")
+        return os.path.getsize(metadata_path) > STREAM_THRESHOLD_BYTES
+
+    def _build_indexes(self):
+        """
+        Build the id -> entity and type -> entities indexes in a single pass over the crate.
+        """
+        entities_by_id = {}
+        entities_by_type = {}
+        for entity in self.crate.get_entities():
+            entities_by_id.setdefault(entity.id, entity)
+            types = entity.type if isinstance(entity.type, list) else [entity.type]
+            for entity_type in types:
+                entities_by_type.setdefault(entity_type, []).append(entity)
+        self._entities_by_id = entities_by_id
+        self._entities_by_type = entities_by_type
+
+    def get_by_id(self, entity_id: str):
+        """
+        Get the entity with the specified ID.
+        Args:
+            entity_id (str): The ID of the entity to be retrieved.
+
+        Returns:
+            _type_: None if not found else the entity with the specified ID.
+        """
+        if self._entities_by_id is None:
+            self._build_indexes()
+        return self._entities_by_id.get(entity_id)
+
+    def get_by_type(self, entity_type: str) -> list:
+        """
+        Get all the entities of the specified type, in crate order.
+        Args:
+            entity_type (str): The type of the entities to be retrieved, eg: CreateAction.
+
+        Returns:
+            list: The entities of that type, empty if there are none.
+        """
+        if self._entities_by_type is None:
+            self._build_indexes()
+        return self._entities_by_type.get(entity_type, [])
+
+    @property
+    def inventory(self) -> CrateInventory:
+        """
+        Inventory of the files of the crate, built with one directory walk on first access
+        (plus the central directory of the archive for crates opened lazily).
+        """
+        if self._inventory is None:
+            zip_path = lazy_archive(self.crate_path)
+            if zip_path:
+                self._inventory = ZipCrateInventory(self.crate_path, zip_path)
+            else:
+                self._inventory = CrateInventory(self.crate_path)
+        return self._inventory
+
+    def invalidate_inventory(self):
+        """
+        Forget the inventory after files were added to the crate (eg: remote datasets downloaded),
+        so it is walked again on next access.
+        """
+        self._inventory = None
+
+    @property
+    def yaml_file_path(self) -> str:
+        """
+        Path to the YAML configuration file of the crate.
+        It may not be named ro-crate-info.yaml, eg: 838-1 crate
+
+        Raises:
+            FileNotFoundError: If no YAML file is found in the crate.
+        """
+        if self._yaml_file_path is None:
+            for name in os.listdir(self.crate_path):
+                if name.endswith(".yaml"):
+                    self._yaml_file_path = os.path.join(self.crate_path, name)
+                    break
+            if not self._yaml_file_path:
+                raise FileNotFoundError("YAML file not found in the crate")
+        return self._yaml_file_path
+
+    @property
+    def config(self) -> dict:
+        """
+        The content of the YAML configuration file of the crate.
+        """
+        if self._config is None:
+            from ruamel.yaml import YAML
+            with open(self.yaml_file_path, 'r', encoding='utf-8') as file:
+                self._config = YAML().load(file)
+        return self._config
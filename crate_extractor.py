@@ -0,0 +1,278 @@
+"""
+Crate Extractor Module
+
+Extracts a zipped crate straight from the user's archive (or the downloaded one),
+without copying it first. Members are streamed one by one through a bounded
+buffer, so memory use does not depend on the size of the members. Optionally
+(RS_SKIP_UNREFERENCED=1) the files of dataset/ that the metadata does not reference
+are not extracted at all.
+
+In lazy mode (RS_LAZY_EXTRACT=1) only the members outside dataset/ are extracted up
+front; the dataset members are listed from the central directory of the archive and
+extracted on demand, when the verification or the command line resolves them (see
+crate_inventory.ZipCrateInventory). The time to the first prompt then does not depend
+on the size of the dataset.
+"""
+import contextlib
+import os
+import shutil
+import time
+import zipfile
+import zlib
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import unquote
+
+from crate_stream import iter_graph
+
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+EXTRACT_WORKERS: int = int(os.environ.get("RS_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_EXTRACT_MIN_BYTES = 64 * 1024 * 1024 # compressed, below it a process pool costs more than it saves
+BATCHES_PER_WORKER = 4
+MEMBER_OVERHEAD = 64 * 1024 # cost of a member in bytes, for the balance of many small files
+SKIP_UNREFERENCED: bool = os.environ.get("RS_SKIP_UNREFERENCED", "0").lower() in ("1", "true", "yes")
+METADATA_FILE_NAME = "ro-crate-metadata.json"
+# Only the members under these directories can be skipped, everything else (application
+# sources, submission command, YAML...) is needed to run the workflow.
+SKIPPABLE_DIRECTORIES = ("dataset/",)
+LAZY_EXTRACT: bool = os.environ.get("RS_LAZY_EXTRACT", "0").lower() in ("1", "true", "yes")
+LAZY_ARCHIVES = {} # crate path -> zip file its dataset members are extracted from on demand
+
+
+def lazy_archive(crate_path: str) -> str:
+    """
+    Get the archive of a crate opened in lazy mode.
+
+    Returns:
+        str: path to the zip file, None if the crate was fully extracted.
+    """
+    return LAZY_ARCHIVES.get(os.path.abspath(crate_path))
+
+
+def member_path(destination: str, name: str) -> str:
+    """
+    Path where a member is extracted.
+
+    Raises:
+        ValueError: If the member would be written outside the destination.
+    """
+    normalized = os.path.normpath(name.replace("\\", "/"))
+    if os.path.isabs(normalized) or normalized == os.pardir or normalized.startswith(os.pardir + os.sep):
+        raise ValueError(f"The zip member {name} points outside of the crate")
+    return os.path.join(destination, normalized)
+
+
+def extract_member(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, destination: str) -> int:
+    """
+    Stream one member to the destination directory through a bounded buffer.
+    The output file is preallocated and the CRC of the data is verified.
+
+    Raises:
+        zipfile.BadZipFile: If the data of the member is corrupted, the output file is removed.
+
+    Returns:
+        int: number of bytes written.
+    """
+    target = member_path(destination, info.filename)
+    if info.is_dir():
+        os.makedirs(target, exist_ok=True)
+        return 0
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        # ZipExtFile checks the CRC-32 once the whole member is read
+        with zip_file.open(info) as source, open(target, 'wb') as output:
+            if info.file_size:
+                with contextlib.suppress(OSError, AttributeError): # not supported by every filesystem
+                    os.posix_fallocate(output.fileno(), 0, info.file_size)
+            shutil.copyfileobj(source, output, EXTRACT_BUFFER_SIZE)
+            if output.tell() != info.file_size:
+                raise zipfile.BadZipFile(f"Size of {info.filename} does not match the zip directory")
+    except (zipfile.BadZipFile, EOFError, zlib.error) as e: # zlib.error: corrupted deflate stream
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(target)
+        raise zipfile.BadZipFile(f"{info.filename}: {e}") from e
+    return info.file_size
+
+
+def _extract_batch(zip_path: str, indexes: list, destination: str) -> int:
+    """
+    Extract some members of the archive, in a worker process.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_file:
+        members = zip_file.infolist()
+        return sum(extract_member(zip_file, members[index], destination) for index in indexes)
+
+
+def _batches(members: list, count: int) -> list:
+    """
+    Spread the members over batches of about the same compressed size, the largest
+    members first (longest processing time first).
+
+    Args:
+        members (list): tuples of (index in the archive, ZipInfo).
+        count (int): number of batches.
+
+    Returns:
+        list: lists of indexes, the heaviest batches first.
+    """
+    loads = [[0, []] for _ in range(count)]
+    for index, info in sorted(members, key=lambda member: -member[1].compress_size):
+        lightest = min(loads, key=lambda load: load[0])
+        lightest[0] += info.compress_size + MEMBER_OVERHEAD
+        lightest[1].append(index)
+    return [indexes for _, indexes in sorted(loads, key=lambda load: -load[0]) if indexes]
+
+
+def extract_members(zip_file: zipfile.ZipFile, zip_path: str, members: list, destination: str,
+                    workers: int = None) -> tuple[int, int]:
+    """
+    Extract members of an archive, on a process pool when they are big enough.
+
+    Args:
+        zip_file (zipfile.ZipFile): the open archive.
+        zip_path (str): path to the archive, opened again by each worker process.
+        members (list): tuples of (index in the archive, ZipInfo) of the members to extract.
+        destination (str): directory where the members are extracted.
+        workers (int, optional): number of processes. Defaults to RS_EXTRACT_WORKERS.
+
+    Raises:
+        zipfile.BadZipFile: If the data of a member is corrupted.
+
+    Returns:
+        tuple[int, int]: bytes written and number of processes used.
+    """
+    workers = max(1, workers or EXTRACT_WORKERS)
+    files = [(index, info) for index, info in members if not info.is_dir()]
+    # Directories first, so that the workers only create files
+    for _, info in members:
+        if info.is_dir():
+            extract_member(zip_file, info, destination)
+    workers = min(workers, len(files))
+    if workers <= 1 or sum(info.compress_size for _, info in files) < PARALLEL_EXTRACT_MIN_BYTES:
+        return sum(extract_member(zip_file, info, destination) for _, info in files), 1
+
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_batch, zip_path, indexes, destination)
+                   for indexes in _batches(files, workers * BATCHES_PER_WORKER)]
+        try:
+            for future in as_completed(futures):
+                total_bytes += future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return total_bytes, workers
+
+
+def referenced_paths(metadata_path: str) -> set:
+    """
+    Get the paths, relative to the crate, of the entities of the metadata.
+    """
+    paths = set()
+    for item in iter_graph(metadata_path):
+        entity_id = item.get("@id", "") if isinstance(item, dict) else ""
+        if entity_id and not entity_id.startswith(("#", "http", "file:", "./")):
+            paths.add(unquote(entity_id))
+    return paths
+
+
+def _is_referenced(name: str, referenced: set) -> bool:
+    if not name.startswith(SKIPPABLE_DIRECTORIES):
+        return True
+    if name in referenced:
+        return True
+    # Inside a referenced directory
+    parent = name.rstrip("/")
+    while "/" in parent:
+        parent = parent.rsplit("/", 1)[0]
+        if parent + "/" in referenced or parent in referenced:
+            return True
+    return False
+
+
+def extract_crate(zip_path: str, destination: str, skip_unreferenced: bool = None, workers: int = None) -> int:
+    """
+    Extract a zipped crate directly from the archive, in parallel for big crates.
+
+    Args:
+        zip_path (str): path to the zip file, it is only read.
+        destination (str): directory where the crate is extracted.
+        skip_unreferenced (bool, optional): do not extract the files of dataset/ that are not
+            referenced by ro-crate-metadata.json. Defaults to RS_SKIP_UNREFERENCED.
+        workers (int, optional): number of extraction processes. Defaults to RS_EXTRACT_WORKERS.
+
+    Raises:
+        ValueError: If the file is not a valid zip file, a member is corrupted or a member
+            points outside the destination.
+
+    Returns:
+        int: number of members extracted.
+    """
+    skip_unreferenced = SKIP_UNREFERENCED if skip_unreferenced is None else skip_unreferenced
+    start = time.perf_counter()
+    skipped = 0
+    total_bytes = 0
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            members = list(enumerate(zip_file.infolist()))
+            for _, info in members: # reject unsafe members before writing anything
+                member_path(destination, info.filename)
+            extracted = 0
+            if skip_unreferenced:
+                metadata = next((member for member in members if member[1].filename == METADATA_FILE_NAME), None)
+                if metadata is not None:
+                    total_bytes += extract_member(zip_file, metadata[1], destination)
+                    extracted += 1
+                    members.remove(metadata)
+                    referenced = referenced_paths(os.path.join(destination, METADATA_FILE_NAME))
+                    selected = [member for member in members
+                                if member[1].is_dir() or _is_referenced(member[1].filename, referenced)]
+                    skipped = len(members) - len(selected)
+                    members = selected
+            written, processes = extract_members(zip_file, zip_path, members, destination, workers)
+            total_bytes += written
+            extracted += len(members)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"The file {zip_path} is not a valid zip file or it is corrupted: {e}") from e
+
+    elapsed = time.perf_counter() - start
+    rate = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else float("inf")
+    print(f"Extracted: {extracted} files, {total_bytes / (1024 * 1024):.1f} MiB in {elapsed:.2f}s "
+          f"({rate:.1f} MiB/s, {processes} processes)")
+    if skipped:
+        print(f"{skipped} files of the dataset not referenced by the metadata were not extracted")
+    return extracted
+
+
+def open_crate_lazily(zip_path: str, destination: str) -> int:
+    """
+    Extract only the members of a zipped crate outside dataset/, the dataset members
+    are extracted on demand from the archive, which must be kept.
+
+    Args:
+        zip_path (str): path to the zip file.
+        destination (str): directory where the crate is extracted.
+
+    Raises:
+        ValueError: If the file is not a valid zip file or a member points outside the destination.
+
+    Returns:
+        int: number of members extracted up front.
+    """
+    start = time.perf_counter()
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            members = list(enumerate(zip_file.infolist()))
+            for _, info in members: # reject unsafe members up front, also the deferred ones
+                member_path(destination, info.filename)
+            selected = [member for member in members if not member[1].filename.startswith(SKIPPABLE_DIRECTORIES)]
+            extract_members(zip_file, zip_path, selected, destination)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"The file {zip_path} is not a valid zip file or it is corrupted: {e}") from e
+    extracted = len(selected)
+    deferred = len(members) - extracted
+    LAZY_ARCHIVES[os.path.abspath(destination)] = os.path.abspath(zip_path)
+    print(f"Extracted: {extracted} files in {time.perf_counter() - start:.2f}s, "
+          f"{deferred} dataset files will be extracted from {zip_path} when needed")
+    return extracted
@@ -0,0 +1,317 @@
+"""
+Crate Inventory Module
+
+A single os.scandir walk of the crate directory, kept in memory and shared by the
+verification and the path mapping stages. It holds the size, modification time and
+type of every entry, so those stages answer their existence checks, directory
+listings and stats without hitting the (possibly network) filesystem again.
+
+For crates opened lazily from a zip file (RS_LAZY_EXTRACT), the dataset members
+still in the archive are listed from its central directory and extracted on demand.
+"""
+import bisect
+import itertools
+import os
+import time
+import zipfile
+
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from crate_extractor import extract_member
+from verification_engine import VERIFY_WORKERS, stat_files as stat_files_on_disk
+
+
+class InventoryEntry(namedtuple("InventoryEntry", "st_size st_mtime_ns st_dev st_ino is_dir")):
+    """
+    Stat information of an inventory entry, with the same field names as os.stat_result.
+    """
+    __slots__ = ()
+
+    @property
+    def st_mtime(self) -> float:
+        return self.st_mtime_ns / 1e9
+
+
+class SuffixIndex:
+    """
+    Reversed-segment trie of the entries under a folder: the path of every entry is
+    inserted from its last segment to its first, so the longest suffix of an address
+    that is the path of an entry is found by walking the address backwards, in
+    O(depth) whatever the number of entries.
+    """
+    def __init__(self, entries):
+        """
+        Args:
+            entries (iterable): tuples of (segments of the path relative to the folder, is_dir).
+        """
+        self._root = {}
+        for segments, is_dir in entries:
+            node = self._root
+            for segment in reversed(segments):
+                node = node.setdefault(segment, {})
+            node[None] = is_dir # an entry ends here (None is never a segment)
+
+    def longest_suffix(self, segments: list, directory: bool = False) -> int:
+        """
+        Find the longest suffix of the segments that is the path of an entry.
+
+        Args:
+            segments (list): segments of the address, eg: ["home", "user", "data", "input.txt"].
+            directory (bool, optional): only match directories. Defaults to False.
+
+        Returns:
+            int: number of trailing segments matched, 0 if none.
+        """
+        node = self._root
+        matched = 0
+        for depth, segment in enumerate(reversed(segments), start=1):
+            node = node.get(segment)
+            if node is None:
+                break
+            if None in node and (node[None] or not directory):
+                matched = depth
+        return matched
+
+
+class CrateInventory:
+    """
+    In-memory inventory of a crate directory, built once with a parallel os.scandir walk.
+
+    Attributes:
+        crate_path (str): Path to the root directory of the RO-Crate.
+        entries (dict): path relative to the crate -> InventoryEntry, for files and directories.
+    """
+    def __init__(self, crate_path: str, workers: int = None):
+        self.crate_path = os.path.abspath(crate_path)
+        self.entries = {}
+        self._children = {} # relative directory path -> names of its entries
+        self._suffix_indexes = {} # relative folder path -> SuffixIndex
+        self._build(workers or VERIFY_WORKERS)
+
+    def _scan(self, relative_dir: str):
+        """
+        Scan one directory, returning its path and its entries.
+        """
+        entries = []
+        try:
+            with os.scandir(os.path.join(self.crate_path, relative_dir)) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat() # follows symlinks, like os.path.exists
+                    except OSError:
+                        continue # broken symlink
+                    is_dir = entry.is_dir()
+                    entries.append((entry.name, InventoryEntry(stat.st_size, stat.st_mtime_ns,
+                                                               stat.st_dev, stat.st_ino, is_dir)))
+        except (PermissionError, FileNotFoundError):
+            pass
+        return relative_dir, entries
+
+    def _build(self, workers: int):
+        root = os.stat(self.crate_path)
+        # (device, inode) of the directories above each directory, to avoid symlink loops
+        ancestors = {"": frozenset([(root.st_dev, root.st_ino)])}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(self._scan, "")}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative_dir, entries = future.result()
+                    self._children[relative_dir] = [name for name, _ in entries]
+                    for name, entry in entries:
+                        relative_path = os.path.join(relative_dir, name)
+                        self.entries[relative_path] = entry
+                        directory_id = (entry.st_dev, entry.st_ino)
+                        if entry.is_dir and directory_id not in ancestors[relative_dir]:
+                            ancestors[relative_path] = ancestors[relative_dir] | {directory_id}
+                            pending.add(pool.submit(self._scan, relative_path))
+                    del ancestors[relative_dir]
+
+    def relative(self, path: str) -> str:
+        """
+        Get the path relative to the crate, or None if the path is outside the crate.
+        """
+        relative_path = os.path.relpath(os.path.normpath(os.path.abspath(path)), self.crate_path)
+        if relative_path == os.curdir:
+            return ""
+        if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+            return None
+        return relative_path
+
+    def stat(self, path: str):
+        """
+        Get the stat information of a path.
+
+        Returns:
+            _type_: InventoryEntry (or os.stat_result outside the crate), None if it does not exist.
+        """
+        relative_path = self.relative(path)
+        if relative_path is None:
+            return stat_files_on_disk([path])[path]
+        if relative_path == "":
+            return InventoryEntry(0, 0, 0, 0, True)
+        return self.entries.get(relative_path)
+
+    def exists(self, path: str) -> bool:
+        """
+        Equivalent of os.path.exists answered from the inventory.
+        """
+        relative_path = self.relative(path)
+        if relative_path is None:
+            return os.path.exists(path)
+        return relative_path == "" or relative_path in self.entries
+
+    def stat_files(self, paths: list) -> dict:
+        """
+        Equivalent of verification_engine.stat_files: paths inside the crate are answered
+        from the inventory, the rest are stat'ed in parallel.
+
+        Returns:
+            dict: path -> stat information, or None if the file does not exist.
+        """
+        stats = {}
+        outside = []
+        for path in paths:
+            relative_path = self.relative(path)
+            if relative_path is None:
+                outside.append(path)
+            else:
+                stats[path] = self.entries.get(relative_path)
+        stats.update(stat_files_on_disk(outside))
+        return stats
+
+    def listdir(self, path: str) -> list:
+        """
+        Equivalent of os.listdir answered from the inventory.
+
+        Raises:
+            FileNotFoundError: If the directory does not exist.
+        """
+        relative_path = self.relative(path)
+        if relative_path is None:
+            return os.listdir(path)
+        if relative_path not in self._children:
+            raise FileNotFoundError(f"No such directory: {path}")
+        return list(self._children[relative_path])
+
+    def file_names(self, folder_path: str) -> dict:
+        """
+        Equivalent of utils.get_file_names: file names under a folder and their full paths.
+        When several files share a name, the deepest one is kept (the last in path order
+        among the deepest). utils.get_file_names kept the last one os.walk visited, which
+        depends on the order the filesystem lists the directories and may be a shallower
+        one, so a bare file name of the command (see generate_command_line) can now be
+        mapped to another file than before, the same on every filesystem.
+
+        Returns:
+            dict: dictionary of file names and their full paths.
+        """
+        relative_folder = self.relative(folder_path)
+        if relative_folder is None:
+            return {}
+        prefix = relative_folder + os.sep if relative_folder else ""
+        files = [relative_path for relative_path, entry in self.entries.items()
+                 if not entry.is_dir and relative_path.startswith(prefix)]
+        files.sort(key=lambda relative_path: (relative_path.count(os.sep), relative_path))
+        return {os.path.basename(relative_path): os.path.join(self.crate_path, relative_path)
+                for relative_path in files}
+
+    def suffix_index(self, folder_path: str) -> SuffixIndex:
+        """
+        Index of the entries under a folder by path suffix, built on first use.
+        """
+        relative_folder = self.relative(folder_path)
+        if relative_folder is None:
+            return SuffixIndex([])
+        if relative_folder not in self._suffix_indexes:
+            prefix = relative_folder + os.sep if relative_folder else ""
+            self._suffix_indexes[relative_folder] = SuffixIndex(
+                (relative_path[len(prefix):].split(os.sep), entry.is_dir)
+                for relative_path, entry in self.entries.items() if relative_path.startswith(prefix))
+        return self._suffix_indexes[relative_folder]
+
+    def materialize(self, paths: list) -> int:
+        """
+        Make sure the given paths (and everything under them) exist on disk.
+        Every file of a fully extracted crate is already on disk, see ZipCrateInventory.
+
+        Returns:
+            int: number of files extracted.
+        """
+        return 0
+
+
+class ZipCrateInventory(CrateInventory):
+    """
+    Inventory of a crate opened lazily from its zip file: the members that are not
+    extracted yet are listed from the central directory of the archive, and extracted
+    when materialize is called on them.
+
+    Attributes:
+        zip_path (str): Path to the zip file of the crate.
+    """
+    def __init__(self, crate_path: str, zip_path: str, workers: int = None):
+        super().__init__(crate_path, workers)
+        self.zip_path = zip_path
+        self._members = {} # path relative to the crate -> ZipInfo of the members not extracted yet
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            for info in zip_file.infolist():
+                relative_path = os.path.normpath(info.filename)
+                if relative_path in self.entries:
+                    continue
+                self._add(relative_path, InventoryEntry(info.file_size, _zip_mtime_ns(info), 0, 0, info.is_dir()))
+                if not info.is_dir():
+                    self._members[relative_path] = info
+        self._member_names = sorted(self._members)
+
+    def _add(self, relative_path: str, entry: InventoryEntry):
+        """
+        Add an entry and its missing parent directories.
+        """
+        self.entries[relative_path] = entry
+        if entry.is_dir:
+            self._children.setdefault(relative_path, [])
+        parent, name = os.path.split(relative_path)
+        if parent and parent not in self.entries:
+            self._add(parent, InventoryEntry(0, entry.st_mtime_ns, 0, 0, True))
+        children = self._children.setdefault(parent, [])
+        if name not in children:
+            children.append(name)
+
+    def materialize(self, paths: list) -> int:
+        """
+        Extract the members at or under the given paths that are not on disk yet.
+        Paths outside the crate or not in the archive are ignored.
+
+        Returns:
+            int: number of files extracted.
+        """
+        to_extract = {}
+        for path in paths:
+            relative_path = self.relative(path) if isinstance(path, str) else None
+            if relative_path is None:
+                continue
+            if relative_path in self._members:
+                to_extract[relative_path] = self._members[relative_path]
+            # the members under a directory are contiguous in the sorted names
+            prefix = relative_path + os.sep if relative_path else ""
+            start = bisect.bisect_left(self._member_names, prefix)
+            for name in itertools.takewhile(lambda name: name.startswith(prefix), itertools.islice(self._member_names, start, None)):
+                to_extract[name] = self._members[name]
+        if not to_extract:
+            return 0
+
+        with zipfile.ZipFile(self.zip_path, 'r') as zip_file:
+            for relative_path, info in to_extract.items():
+                extract_member(zip_file, info, self.crate_path)
+                stat = os.stat(os.path.join(self.crate_path, relative_path))
+                self.entries[relative_path] = InventoryEntry(stat.st_size, stat.st_mtime_ns, stat.st_dev, stat.st_ino, False)
+                del self._members[relative_path]
+        self._member_names = sorted(self._members)
+        print(f"Extracted {len(to_extract)} dataset files from {self.zip_path}")
+        return len(to_extract)
+
+
+def _zip_mtime_ns(info: zipfile.ZipInfo) -> int:
+    return int(time.mktime(info.date_time + (0, 0, -1))) * 1000000000
@@ -0,0 +1,182 @@
+"""
+Crate Stream Module
+
+Low-memory alternative to the rocrate object model for very large ro-crate-metadata.json
+files. The JSON-LD @graph is read incrementally, one entity at a time, and only the
+properties used by the service are kept for each entity.
+"""
+import json
+import os
+
+# Properties kept for every entity, the rest of the metadata is discarded while streaming
+KEPT_PROPERTIES = ("name", "version", "contentSize", "dateModified", "hasPart",
+                   "instrument", "object", "result", "sha256")
+CHUNK_SIZE = 1 << 20 # initial number of characters read from the metadata file on each refill
+
+
+class StreamEntity:
+    """
+    Minimal stand-in for rocrate's Entity: exposes `id`, `type`, `in` and `[]`,
+    resolving {"@id": ...} references to other entities of the same crate.
+    """
+    __slots__ = ("id", "type", "_properties", "_crate")
+
+    def __init__(self, entity_id: str, entity_type, properties: dict, crate):
+        self.id = entity_id
+        self.type = entity_type
+        self._properties = properties
+        self._crate = crate
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._properties
+
+    def __getitem__(self, key: str):
+        return self._resolve(self._properties[key])
+
+    def get(self, key: str, default=None):
+        if key not in self._properties:
+            return default
+        return self[key]
+
+    def _resolve(self, value):
+        if isinstance(value, list):
+            return [self._resolve(v) for v in value]
+        if isinstance(value, dict) and "@id" in value:
+            return self._crate.dereference(value["@id"])
+        return value
+
+
+class StreamedCrate:
+    """
+    Crate loaded by streaming the @graph of ro-crate-metadata.json, or built from
+    already extracted entity records (see metadata_cache).
+    It provides the `get_entities` method used by CrateContext to build its indexes.
+    """
+    def __init__(self, crate_path: str, items=None):
+        self.crate_path = crate_path
+        self._entities = {}
+        if items is None:
+            items = iter_graph(os.path.join(crate_path, "ro-crate-metadata.json"))
+        for item in items:
+            entity_id = item.get("@id")
+            if entity_id is None or entity_id in self._entities:
+                continue
+            properties = {key: item[key] for key in KEPT_PROPERTIES if key in item}
+            self._entities[entity_id] = StreamEntity(entity_id, item.get("@type"), properties, self)
+
+    def get_entities(self):
+        return self._entities.values()
+
+    def dereference(self, entity_id: str) -> StreamEntity:
+        """
+        Get the entity with the given id, or an empty entity if it is not described in the crate.
+        """
+        entity = self._entities.get(entity_id)
+        if entity is None:
+            entity = StreamEntity(entity_id, None, {}, self)
+        return entity
+
+
+def entity_record(entity) -> dict:
+    """
+    Get the JSON-LD record of an entity restricted to the properties the service uses.
+
+    Args:
+        entity (_type_): a rocrate Entity or a StreamEntity
+
+    Returns:
+        dict: the record, with @id, @type and the kept properties.
+    """
+    if isinstance(entity, StreamEntity):
+        properties = entity._properties
+    else:
+        properties = entity.as_jsonld()
+    record = {"@id": entity.id, "@type": entity.type}
+    record.update({key: properties[key] for key in KEPT_PROPERTIES if key in properties})
+    return record
+
+
+class _Reader:
+    """
+    Buffered reader over a text file that lets the JSON decoder work on a window of the file.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = None) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(size or CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of ro-crate-metadata.json")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Malformed ro-crate-metadata.json: expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self, decoder: json.JSONDecoder):
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Read geometrically more for big entities, so they are decoded O(log n) times
+            self.fill(size)
+            size *= 2
+
+
+def iter_graph(metadata_path: str):
+    """
+    Yield the items of the top level "@graph" array of a JSON-LD file one by one,
+    without loading the whole document in memory.
+
+    Args:
+        metadata_path (str): path to ro-crate-metadata.json
+
+    Raises:
+        ValueError: If the file is not a JSON object or has no "@graph".
+    """
+    decoder = json.JSONDecoder()
+    with open(metadata_path, 'r', encoding='utf-8') as file:
+        reader = _Reader(file)
+        reader.expect("{")
+        while reader.peek() != "}":
+            key = reader.value(decoder)
+            reader.expect(":")
+            if key != "@graph":
+                reader.value(decoder) # @context and other top level keys are small, skip them
+            else:
+                reader.expect("[")
+                while reader.peek() != "]":
+                    yield reader.value(decoder)
+                    if reader.peek() == ",":
+                        reader.pos += 1
+                reader.pos += 1
+                return
+            if reader.peek() == ",":
+                reader.pos += 1
+    raise ValueError(f"No @graph found in {metadata_path}")
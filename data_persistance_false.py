@@ -12,29 +12,32 @@ import re
 import shlex
 
 from urllib.parse import urlparse
-from rocrate.rocrate import ROCrate
+from command_plan import EXISTS, map_command
+from crate_context import CrateContext
+from crate_inventory import CrateInventory
 from utils import print_colored, TextColor, get_objects, get_by_id, get_instument, get_objects_dict
 from utils import get_results_dict, check_slurm_cluster, executor, get_previous_flags
-from utils import get_file_names, generate_file_status_table
+from status_report import report_file_status, report_inaccessible_paths
 from get_workflow import get_more_flags, get_change_values
+from verification_engine import INTEGRITY_CHECK, check_readable, integrity_verifier
 
 RESULT_PATH:str = None
 OUTPUT_NUM:int = 0
+MAX_PATH_PROBES: int = int(os.environ.get("RS_DPF_MAX_PATH_PROBES", "64")) # existence checks per address
 
 
-def check_file_accessibility(crate: ROCrate) -> tuple[bool,dict]:
+def check_file_accessibility(crate_context: CrateContext) -> tuple[bool,dict]:
     """
     Check if the specified file paths are accessible.
 
     Parameters:
-    file_paths (list): A list of file paths to check.
+    crate_context (CrateContext): The parsed RO-Crate listing the file paths to check.
 
     Returns:
     dict: A dictionary with file paths as keys and a boolean indicating if the file is accessible as values.
     """
-    file_paths = get_objects(crate)
-    accessibility = {}
-    flag = True
+    file_paths = get_objects(crate_context)
+    local_paths = []
     for path in file_paths:
         if path.startswith("http"):
             # do not consider remote path for cluster due to no connection
@@ -44,23 +47,21 @@ def check_file_accessibility(crate: ROCrate) -> tuple[bool,dict]:
         file_path = path.replace(f"file://{parsed_url.netloc}", "")
 
         if file_path:
-            accessibility[file_path] = os.access(file_path, os.R_OK)
-            if accessibility[file_path] == False:
-                flag = False
-            #     print(file_path+ "\n" + "INACCESSIBLE")
-            # else:
-            #     print(file_path+ "\n" + "ACCESSIBLE")
+            local_paths.append(file_path)
+
+    accessibility = check_readable(local_paths) # checked in parallel
+    flag = all(accessibility.values())
 
     return flag,accessibility
 
-def files_verifier_dpf(crate_path: str):
+def files_verifier_dpf(crate_context: CrateContext, log_dir: str = None, integrity: bool = INTEGRITY_CHECK):
     """
     Verify files within an RO-Crate against their metadata.
 
     Args:
-        crate_path (str): Path to the root directory of the RO-Crate.
-        instrument (str): Identifier of the instrument file within the RO-Crate.
-        objects (list[str]): List of identifiers for objects/inputs within the RO-Crate.
+        crate_context (CrateContext): The parsed RO-Crate.
+        log_dir (str, optional): Directory where the computed digests are recorded.
+        integrity (bool, optional): Also verify the content hashes of the files (RS_INTEGRITY_CHECK).
 
     Raises:
         FileNotFoundError: If any referenced file in the RO-Crate does not exist in the directory.
@@ -71,40 +72,46 @@ def files_verifier_dpf(crate_path: str):
         against the actual files in the specified directory. Optionally, it can also verify
         modification dates, although this feature is currently commented out.
     """
-    crate = ROCrate(crate_path)
-    instrument  = get_instument(crate)
+    crate_path = crate_context.crate_path
+    instrument  = get_instument(crate_context)
     size_verifier = True
     date_verifier = True
     temp_size = []
     temp_date = []
-    crate = ROCrate(crate_path)
     instrument_path = os.path.join(crate_path, instrument)
 
-    file_verifer = [] # tuple of (file_name, file_path, Date_modified ,file_size)
-    instrument_tuple = (instrument, instrument_path, 1, 1)
-    if not os.path.getsize(instrument_path) == get_by_id(crate, instrument)["contentSize"]:
-        size_verifier = False
-        temp_size.append(instrument_path)
-        instrument_tuple = (instrument_tuple[0], instrument_tuple[1], instrument_tuple[2], 0)
-    file_verifer.append(instrument_tuple)
-    #Verify the objects/inputs
-    crate = ROCrate(crate_path)
-    file_paths = get_objects(crate)
-    for path in file_paths:
+    to_verify = [] # tuple of (object_id, file_path) of the local objects
+    for path in get_objects(crate_context):
         if path.startswith("http"):
         # do not consider remote path for cluster due to no connection
            continue
 
         parsed_url = urlparse(path)
         # Remove the 'file://<id>' prefix
-        file_path = path.replace(f"file://{parsed_url.netloc}", "")
+        to_verify.append((path, path.replace(f"file://{parsed_url.netloc}", "")))
+    # One stat per file (size and modification date): the instrument from the crate inventory,
+    # the referenced files outside the crate in parallel
+    stats = crate_context.inventory.stat_files([instrument_path] + [file_path for _, file_path in to_verify])
+    missing = [file_path for file_path, file_stat in stats.items() if file_stat is None]
+    if missing:
+        raise FileNotFoundError(f"Files missing: {missing}")
 
-        file_object = get_by_id(crate, path)
+    file_verifer = [] # tuple of (file_name, file_path, Date_modified ,file_size)
+    instrument_tuple = (instrument, instrument_path, 1, 1)
+    if not stats[instrument_path].st_size == get_by_id(crate_context, instrument)["contentSize"]:
+        size_verifier = False
+        temp_size.append(instrument_path)
+        instrument_tuple = (instrument_tuple[0], instrument_tuple[1], instrument_tuple[2], 0)
+    file_verifer.append(instrument_tuple)
+    #Verify the objects/inputs
+    for path, file_path in to_verify:
+        file_stat = stats[file_path]
+        file_object = get_by_id(crate_context, path)
         file_tuple = (path, file_path, 1, 2)
         if "contentSize" in file_object:
             content_size = file_object["contentSize"] # Verify the above content size with the actual file size
             # Get the actual file size
-            actual_size = os.path.getsize(file_path)
+            actual_size = file_stat.st_size
 
             # Verify the content size with the actual file size
             if actual_size != content_size:
@@ -116,7 +123,7 @@ def files_verifier_dpf(crate_path: str):
                 file_tuple = (file_tuple[0], file_tuple[1], file_tuple[2], 1)
                 # print(f"Size of {file_path} is correct")
 
-        actual_modified_date = dt.datetime.utcfromtimestamp(os.path.getmtime(file_path)).replace(microsecond=0).isoformat()
+        actual_modified_date = dt.datetime.utcfromtimestamp(file_stat.st_mtime).replace(microsecond=0).isoformat()
         if "dateModified" in file_object and actual_modified_date != file_object["dateModified"][:-6]:
             # print(f"DateModified of {file_path} is incorrect\n")
             date_verifier = False
@@ -126,9 +133,16 @@ def files_verifier_dpf(crate_path: str):
         #     print(f"DateModified of {file_path} is correct")
         file_verifer.append(file_tuple)
 
+    temp_hash = []
+    if integrity:
+        # the hash is checked in the same column as the size
+        entity_ids = {file_path: path for path, file_path in to_verify}
+        entity_ids[instrument_path] = instrument
+        temp_hash = integrity_verifier(crate_context, file_verifer, entity_ids, log_dir, stats)
+
     print_colored("STATUS TABLE (the crate includes REFERENCES to the files the workflow needs to run, data persistence was FALSE):", TextColor.YELLOW)
 
-    generate_file_status_table(file_verifer, "Mod. Date")
+    report_file_status(file_verifer, "Mod. Date", log_dir)
     if date_verifier:
         print_colored("All files have correct Modification Date", TextColor.GREEN)
     else:
@@ -141,12 +155,18 @@ def files_verifier_dpf(crate_path: str):
             "WARNING: File Size mismatch in the application input files. Re-execution may not work or may lead to different results.",
             TextColor.RED)
 
-def data_persistence_false_verifier(crate_path:str):
+    if temp_hash:
+        print_colored(f"WARNING: Content hash mismatch in the application input files: {temp_hash}. Re-execution may lead to different results.", TextColor.RED)
+    elif integrity:
+        print_colored("All files have correct content hashes", TextColor.GREEN)
+
+def data_persistence_false_verifier(crate_context: CrateContext, log_dir: str = None):
     """
     Verify if the crate was created with data persistance set to false.
 
     Args:
-        crate_path (str): the path to the root directory of the RO-Crate.
+        crate_context (CrateContext): the parsed RO-Crate.
+        log_dir (str, optional): the directory where the computed digests are recorded.
 
     Raises:
         ValueError: If some files are not accessible 
@@ -157,26 +177,21 @@ def data_persistence_false_verifier(crate_path:str):
     #     print("Not a Slurm cluster")
     #     raise ValueError ("The crate was created with data persistence set to false. Please run the crate on the cluster in which the dataset paths are available.")
 
-    crate = ROCrate(crate_path)
-
-    (accessible,access_map) = check_file_accessibility(crate)
+    (accessible,access_map) = check_file_accessibility(crate_context)
 
     if not accessible:
-        print_colored("The following paths are not accessible:", TextColor.RED)
-        for p in access_map:
-            if not access_map[p]:
-                print_colored(p, TextColor.RED)
+        report_inaccessible_paths(access_map, log_dir)
         raise ValueError
 
     else:
         print_colored("All files are accessible", TextColor.GREEN)
         # print("Checking file sizes...")
         try:
-            files_verifier_dpf(crate_path)
+            files_verifier_dpf(crate_context, log_dir)
         except ValueError as e:
             print_colored(str(e), TextColor.RED)
 
-def addr_extractor(path: str) -> dict:
+def addr_extractor(path: str, inventory: CrateInventory = None) -> dict:
     """
     Extracts the addresses of datasets in the given path. For this particular case,
     it is used to extract the mapping of filenames in the crate/dataset and
@@ -184,18 +199,24 @@ def addr_extractor(path: str) -> dict:
 
     Args:
         path (str): The path to the directory containing the datasets.
+        inventory (CrateInventory, optional): Inventory of the crate, to avoid listing the directory again.
 
     Returns:
         dict: A dictionary mapping dataset filenames to a value of 1.
     """
-    if not os.path.exists(path):
-        os.makedirs(path)
+    if inventory is not None and inventory.exists(path):
+        filenames = inventory.listdir(path)
+    else:
+        if not os.path.exists(path):
+            os.makedirs(path)
+        filenames = os.listdir(path)
     hash_map = {}
-    for filename in os.listdir(path):
+    for filename in filenames:
         hash_map[filename] = 1
 
     return hash_map
-def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> str:
+def address_converter_backend(path: str, addr: str, dataset_hashmap: dict,
+                              inventory: CrateInventory = None) -> str:
     """
     Converts the given address to a mapped address inside the RO_Crate
     based on the dataset hashmap.
@@ -204,6 +225,7 @@ def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> st
         path (str): The base path of the dataset.
         addr (str): The address to be converted.
         dataset_hashmap (dict): A dictionary containing the mapping of dataset addresses.
+        inventory (CrateInventory, optional): Inventory of the crate, to check existence without probing the filesystem.
 
     Returns:
         str: The mapped address corresponding to the given address.
@@ -213,6 +235,7 @@ def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> st
     """
     filename = None
     mapped_addr = None
+    exists = inventory.exists if inventory is not None else os.path.exists
 
     if addr.startswith("./"):
         addr = addr[1:]
@@ -233,7 +256,7 @@ def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> st
             for j in range(i + 1, len(addr_list)):
                 temp_addr = os.path.join(temp_addr, addr_list[j])
 
-            if os.path.exists(temp_addr):
+            if exists(temp_addr):
                 mapped_addr = temp_addr
                 break
 
@@ -242,12 +265,98 @@ def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> st
         if not mapped_addr:
             mapped_addr = path
         mapped_addr = os.path.join(mapped_addr, filename)
-        if not os.path.exists(mapped_addr):
+        if not exists(mapped_addr):
             return None
 
     return mapped_addr
 
-def address_mapper_dpf(addr:str, object_list: list, result_list: list, application_sources_hash_map: dict, path:str) -> str:
+class DPFPathMatcher:
+    """
+    Inverted index from path segments to the directories of the objects and results of
+    the crate (as split by url_splitter). An address of the command line is grafted on
+    the directory having the longest path in common with it: that directory up to the
+    common part, followed by the rest of the address.
+
+    The candidates are ranked in memory, without touching the filesystem. The directories
+    of the objects were verified to be accessible, so grafts landing on one of them are not
+    checked again; other grafts (and the file of the address, for the objects) are checked
+    on the (shared) filesystem, the best ranked first, at most MAX_PATH_PROBES times per
+    address, and every check is remembered.
+    """
+    def __init__(self, object_list: list, result_list: list):
+        self._object_prefixes = self._index(object_list)
+        self._result_prefixes = self._index(result_list)
+        self._known = {tuple(segments[:depth]) for segments in object_list for depth in range(1, len(segments) + 1)}
+        self._probed = {} # path segments -> exists
+
+    @staticmethod
+    def _index(path_list: list) -> dict:
+        """
+        Map each segment to the prefixes of the paths ending with it. The first segment
+        of a path is not indexed, a match on it alone does not count.
+        """
+        prefixes = {}
+        for segments in path_list:
+            for depth in range(1, len(segments)):
+                prefixes.setdefault(segments[depth], set()).add(tuple(segments[:depth + 1]))
+        return {segment: list(found) for segment, found in prefixes.items()}
+
+    def _exists(self, segments: tuple, budget: list) -> bool:
+        if segments in self._known:
+            return True
+        if segments not in self._probed:
+            if budget[0] <= 0:
+                return False
+            budget[0] -= 1
+            self._probed[segments] = os.path.exists("/" + "/".join(segments))
+        return self._probed[segments]
+
+    def match(self, addr_list: list, filename: str = None) -> tuple[bool, tuple]:
+        """
+        Find the directory of an address (without its file name).
+
+        The candidates are ranked by the number of segments in common with the address,
+        then by how deep in the address the common part ends, objects before results.
+        The first one whose graft exists is used.
+
+        Args:
+            addr_list (list): segments of the directory of the address.
+            filename (str, optional): file name of the address, it must exist in the object directory.
+
+        Returns:
+            tuple[bool, tuple]: whether the address is a result, and the segments of the
+                mapped directory (None if no match).
+        """
+        candidates = []
+        for i, segment in enumerate(addr_list):
+            for is_object, index in ((False, self._result_prefixes), (True, self._object_prefixes)):
+                for prefix in index.get(segment, ()):
+                    candidates.append((_common_suffix(prefix, addr_list, i), i, is_object, prefix))
+        candidates.sort(key=lambda candidate: candidate[:3], reverse=True)
+
+        budget = [MAX_PATH_PROBES]
+        for _, i, is_object, prefix in candidates:
+            graft = prefix + tuple(addr_list[i + 1:])
+            checked = graft + (filename,) if filename and is_object else graft
+            if self._exists(checked, budget):
+                return not is_object, graft
+            if budget[0] <= 0:
+                print_colored(f"WARNING: {MAX_PATH_PROBES} paths were checked to map {'/'.join(addr_list)} without "
+                              "finding it, the other candidates are ignored (RS_DPF_MAX_PATH_PROBES)", TextColor.YELLOW)
+                break
+        return False, None
+
+def _common_suffix(prefix: tuple, addr_list: list, i: int) -> int:
+    """
+    Number of segments in common at the end of the prefix and of the address up to its segment i.
+    """
+    common = 0
+    while common < len(prefix) and common <= i and prefix[-1 - common] == addr_list[i - common]:
+        common += 1
+    return common
+
+def address_mapper_dpf(addr:str, object_list: list, result_list: list, application_sources_hash_map: dict, path:str,
+                       inventory: CrateInventory = None, matcher: DPFPathMatcher = None) -> str:
     """
     Map the given address to a path inside the RO-Crate based on the given object and result lists.
 
@@ -257,6 +366,9 @@ def address_mapper_dpf(addr:str, object_list: list, result_list: list, applicati
         result_list (_type_): list of results from metadata
         application_sources_hash_map (dict): hashmap of application sources
         path (str): the path to the RO-Crate
+        inventory (CrateInventory, optional): inventory of the crate, to look for the path in application sources
+        matcher (DPFPathMatcher, optional): index of the object and result lists, built once for all the
+            addresses of a command. Built from the lists if not given.
 
     Raises:
         FileNotFoundError: if the mapped path does not exist
@@ -268,7 +380,7 @@ def address_mapper_dpf(addr:str, object_list: list, result_list: list, applicati
     mapped_addr = None
     application_path = os.path.join(path, "application_sources")
 
-    mapped_addr =  address_converter_backend(application_path, addr, application_sources_hash_map) #check if the path is in application sources inside the crate
+    mapped_addr =  address_converter_backend(application_path, addr, application_sources_hash_map, inventory) #check if the path is in application sources inside the crate
 
     if mapped_addr:
         return mapped_addr # if the path is in application sources then return the path as it is
@@ -280,90 +392,34 @@ def address_mapper_dpf(addr:str, object_list: list, result_list: list, applicati
         addr = "/" + addr
 
     # Check if the address is a file or a directory and split it accordingly
-    if addr.endswith("/"):
-        addr_list = addr.split("/")
-    else:
-        addr_list = addr.split("/")
+    addr_list = addr.split("/")
+    if not addr.endswith("/"):
         filename = addr_list.pop()
+    addr_list = [segment for segment in addr_list if segment]
 
-    matched_len = -1
-    result_flag = False
-
-    for i in range(len(addr_list)-1,-1,-1):
-        len_matched_result = 0
-        temp_addr_object = None
-        len_matched_object = 0
-        for ls in result_list:
-            if addr_list[i] in ls:
-                temp_addr =""
-                j= len(ls)-1
-                while j>=0 and ls[j] != addr_list[i]:
-                    j-=1
-                if j==-1: #nothing matched
-                    break
-                for k in range(0,j+1): # join the complete matched part
-                    temp_addr = os.path.join(temp_addr, ls[k])
-                len_matched_result = j #storing how much comman is addr with any result path
-                for j in range(i + 1, len(addr_list)):
-                    temp_addr = os.path.join(temp_addr, addr_list[j])
-
-                if not os.path.exists(f"/{temp_addr}"):
-                    len_matched_result = 0
-
-        for ls in object_list:
-            if addr_list[i] in ls:
-                temp_addr =""
-                j= len(ls)-1
-                while j>=0 and ls[j] != addr_list[i]:
-                    j-=1
-                if j==-1: #nothing matched
-                    break
-                for k in range(0,j+1): # join the complete matched part
-                    temp_addr = os.path.join(temp_addr, ls[k])
-                len_matched_object = j #storing how much comman is addr with any result path
-                for j in range(i + 1, len(addr_list)):
-                    temp_addr = os.path.join(temp_addr, addr_list[j])
-
-                if os.path.exists(f"/{temp_addr}"):
-                    temp_addr_object = temp_addr
-                else:
-                    len_matched_object = 0
-
-        if len_matched_object==0 and len_matched_result ==0:
-            continue
-
-        if len_matched_result>len_matched_object:# Assigning the one with more common path
-            if len_matched_result>matched_len:
-                matched_len = len_matched_result
-                mapped_addr = RESULT_PATH
-                result_flag = True
-        else:
-            if len_matched_object>matched_len:
-                matched_len = len_matched_object
-                mapped_addr = temp_addr_object
-                result_flag = False
+    if matcher is None:
+        matcher = DPFPathMatcher(object_list, result_list)
+    result_flag, matched = matcher.match(addr_list, filename)
 
     if result_flag:
         global OUTPUT_NUM
+        while os.path.exists(os.path.join(RESULT_PATH, f"new_output_{OUTPUT_NUM}")): # taken by a reused command plan
+            OUTPUT_NUM += 1
         os.makedirs(os.path.join(RESULT_PATH,f"new_output_{OUTPUT_NUM}/"), exist_ok=True)
         mapped_addr = os.path.join(RESULT_PATH,f"new_output_{OUTPUT_NUM}/")
         OUTPUT_NUM+=1
         return mapped_addr
-    # If the address is a file, append the filename and check if exists
-    if mapped_addr and filename:
-        mapped_addr = os.path.join(mapped_addr, filename)
-        mapped_addr = "/"+mapped_addr
-        if not os.path.exists(mapped_addr):
-            raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
-        else:
-            return mapped_addr
 
     #Could not find such directory or file
-    if not mapped_addr:
+    if not matched:
         raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
 
-    mapped_addr = "/"+mapped_addr # since in dpf path is always absolute and starts with /
-    return mapped_addr
+    mapped_addr = "/" + "/".join(matched) # since in dpf path is always absolute and starts with /
+    # If the address is a file, append the filename (the matcher checked that it exists)
+    if filename:
+        return os.path.join(mapped_addr, filename)
+
+    return mapped_addr + "/"
 
 def url_splitter(addr: str)-> list[str]:
     """
@@ -393,23 +449,24 @@ def url_splitter(addr: str)-> list[str]:
 
     return addr_list
 
-def command_line_generator_dpf(command: str,path:str) -> list[str]:
+def command_line_generator_dpf(command: str, crate_context: CrateContext) -> list[str]:
     """
     Modify the command line arguments to map the paths to the paths
     defined inside the ro-crate-metadata.json file.
 
     Args:
         command (str): Original command line string.
-        path (str): Path to the RO_Crate directory.
+        crate_context (CrateContext): The parsed RO-Crate.
 
     Returns:
         list[str]: Modified command line arguments with mapped paths.
     """
-    crate = ROCrate(path)
-    objects = get_objects_dict(crate)
-    results = get_results_dict(crate)
-    files_a = get_file_names(os.path.join(path, "application_sources"))
-    application_sources_hashmap = addr_extractor(os.path.join(path, "application_sources"))
+    path = crate_context.crate_path
+    objects = get_objects_dict(crate_context)
+    results = get_results_dict(crate_context)
+    inventory = crate_context.inventory
+    files_a = inventory.file_names(os.path.join(path, "application_sources"))
+    application_sources_hashmap = addr_extractor(os.path.join(path, "application_sources"), inventory)
     result_list = []
     object_list = []
 
@@ -421,63 +478,34 @@ def command_line_generator_dpf(command: str,path:str) -> list[str]:
 
     object_list = [item for item in object_list if item not in result_list]
 
+    object_names = {} # name -> id of the first object with that name, to avoid a lookup per object and token
+    for (name, id), _ in objects.items():
+        object_names.setdefault(name, id)
+
     command = shlex.split(command)
-    flags = []
-    paths = []
-    values = []
-
-    for i, cmd in enumerate(command):
-        if cmd.startswith("--") or cmd.startswith("-"):
-            if not (cmd.startswith("--provenance") or cmd.startswith("-p")):
-                flags.append((cmd, i))
-        elif re.compile(r'[/\\]').search(cmd): # Pattern for detecting paths
-            paths.append((cmd, i))
-        else:
-            if cmd in files_a:
-                values.append((files_a[cmd], i))
-            else:# still to verify if the value is a file among the objects
-                possible = False
-                value = None
-                for _, id in objects.items():
-                    if get_by_id(crate,id)["name"] == cmd:
-                        possible = True
-                        parsed_url = urlparse(id)
-                         # Remove the 'file://<id>' prefix
-                        value = id.replace(f"file://{parsed_url.netloc}", "")
-                        break
-                if possible:
-                    values.append((value, i))
-                else: # else it is considered a value
-                    values.append((cmd, i))
-
-    new_paths = []
-
-    for filepath in paths:
-        new_filepath = address_mapper_dpf(filepath[0], object_list, result_list, application_sources_hashmap, path)
-        new_paths.append((new_filepath, filepath[1]))
-
-    paths = new_paths
-
-    p1 = 0
-    p2 = 0
-
-    new_command = []
-
-    while p1 < len(paths) and p2 < len(values):
-        if paths[p1][1] < values[p2][1]:
-            new_command.append(paths[p1][0])
-            p1 += 1
-        else:
-            new_command.append(values[p2][0])
-            p2 += 1
-
-    while p1 < len(paths):
-        new_command.append(paths[p1][0])
-        p1 += 1
-
-    while p2 < len(values):
-        new_command.append(values[p2][0])
-        p2 += 1
+    application_path = os.path.join(path, "application_sources")
+    matcher = DPFPathMatcher(object_list, result_list) # indexed once for all the paths of the command
+
+    def resolve(_, cmd: str) -> tuple:
+        if cmd.startswith("--") or cmd.startswith("-"): # flags are not kept
+            return None, []
+        if re.compile(r'[/\\]').search(cmd): # Pattern for detecting paths
+            new_filepath = address_mapper_dpf(cmd, object_list, result_list, application_sources_hashmap, path,
+                                              inventory, matcher)
+            if new_filepath.startswith(os.path.join(application_path, "")) or (RESULT_PATH and new_filepath.startswith(RESULT_PATH)):
+                return new_filepath, ["application_sources"]
+            return new_filepath, ["application_sources", EXISTS] # outside the crate, it must still exist
+        if cmd in files_a:
+            return files_a[cmd], ["application_sources"]
+        # still to verify if the value is a file among the objects
+        if cmd in object_names:
+            id = object_names[cmd]
+            parsed_url = urlparse(id)
+            # Remove the 'file://<id>' prefix
+            return id.replace(f"file://{parsed_url.netloc}", ""), []
+        return cmd, ["application_sources"] # else it is considered a value
+
+    new_command = map_command(crate_context, "dpf", command, (), ["application_sources"], RESULT_PATH, resolve)
 
     if check_slurm_cluster()[0]:
         new_command[0] = "enqueue_compss"
@@ -486,13 +514,13 @@ def command_line_generator_dpf(command: str,path:str) -> list[str]:
 
     return new_command
 
-def run_dpf(execution_path:str, crate_path: str) ->bool:
+def run_dpf(execution_path:str, crate_context: CrateContext) ->bool:
     """
     Run the workflow on the cluster in which the dataset paths are available
 
     Args:
         execution_path (str): the path to the execution directory
-        crate_path (str): the path to the root directory of the RO-Crate
+        crate_context (CrateContext): the parsed RO-Crate
 
     Returns:
         bool: True if the workflow was executed successfully, False otherwise
@@ -500,12 +528,13 @@ def run_dpf(execution_path:str, crate_path: str) ->bool:
     try:
         global RESULT_PATH
         RESULT_PATH = os.path.join(execution_path,"Result")
+        crate_path = crate_context.crate_path
         compss_submission_command_path = os.path.join(crate_path, "compss_submission_command_line.txt")
 
         with open(compss_submission_command_path, 'r', encoding='utf-8') as file:
             compss_submission_command = next(file).strip()
 
-        new_command = command_line_generator_dpf(compss_submission_command,crate_path)
+        new_command = command_line_generator_dpf(compss_submission_command,crate_context)
         # print("New command is:",new_command)
         previous_flags = get_previous_flags(crate_path) # get the flags from the previous command
         new_command = get_more_flags(new_command, previous_flags) # ask user for more flags he/she wants to add to the final compss command
@@ -0,0 +1,211 @@
+"""
+Disk Cache Module
+
+Small persistent cache shared by the different stages of the service (crate metadata,
+environment probes, verification results...). Entries live under the user cache
+directory, are written atomically and are evicted in least recently used order when
+the cache grows over its size limit. Several service processes can share it safely.
+"""
+import contextlib
+import fcntl
+import gzip
+import json
+import os
+import tempfile
+
+
+def get_cache_dir() -> str:
+    """
+    Get the root cache directory of the service, RS_CACHE_DIR or the user cache directory.
+
+    Returns:
+        str: path to the cache directory
+    """
+    cache_dir = os.environ.get("RS_CACHE_DIR")
+    if not cache_dir:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(xdg_cache, "compss_reproducibility_service")
+    return cache_dir
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of JSON documents stored as one gzip file per key,
+    and of files (blobs) stored as they are. Blobs are shared by hardlinks, so their
+    last use is recorded on an empty .used file next to them instead of on the blob.
+
+    Reads need no lock since entries are replaced atomically; writes and evictions
+    take an exclusive lock on the cache directory.
+
+    Attributes:
+        directory (str): directory holding the entries of this cache.
+        max_bytes (int): size limit, the least recently used entries are evicted above it.
+    """
+    SUFFIX = ".json.gz"
+    BLOB_SUFFIX = ".blob"
+    USED_SUFFIX = ".used"
+
+    def __init__(self, name: str, max_bytes: int):
+        self.directory = os.path.join(get_cache_dir(), name)
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Exclusive lock on the cache directory, shared between processes.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), 'w', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_json(self, key: str):
+        """
+        Get a cached document.
+
+        Args:
+            key (str): key of the entry
+
+        Returns:
+            _type_: None if there is no (valid) entry for the key else the document.
+        """
+        path = self._entry_path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                document = json.load(file)
+            os.utime(path) # mark as recently used
+            return document
+        except (OSError, ValueError):
+            # missing, evicted by another process meanwhile or corrupted
+            return None
+
+    def put_json(self, key: str, document):
+        """
+        Store a document, replacing the previous entry of the key if any.
+
+        Args:
+            key (str): key of the entry
+            document (_type_): JSON serialisable document
+        """
+        try:
+            with self.lock():
+                self._write(key, document)
+        except OSError as e:
+            # The cache is an optimisation, never fail the reproduction because of it
+            print(f"Could not write the cache entry {key} in {self.directory}: {e}")
+
+    def update_json(self, key: str, update):
+        """
+        Read, modify and store a document while holding the lock, so concurrent
+        updates from several processes are not lost.
+
+        Args:
+            key (str): key of the entry
+            update (callable): takes the current document (None if there is none)
+                and returns the document to store.
+        """
+        try:
+            with self.lock():
+                self._write(key, update(self.get_json(key)))
+        except OSError as e:
+            print(f"Could not write the cache entry {key} in {self.directory}: {e}")
+
+    def blob_path(self, key: str) -> str:
+        """
+        Path of the blob of a key, if the blob is in the cache it is marked as recently used.
+
+        Returns:
+            str: None if there is no blob for the key else its path.
+        """
+        path = os.path.join(self.directory, key + self.BLOB_SUFFIX)
+        if not os.path.isfile(path):
+            return None
+        self._mark_used(path)
+        return path
+
+    def put_blob(self, key: str, source_path: str) -> str:
+        """
+        Move a file into the cache as the blob of a key. Must be called with the lock held
+        (the caller usually also links the blob somewhere before releasing it).
+
+        Args:
+            key (str): key of the blob
+            source_path (str): file to move, on the same filesystem as the cache.
+
+        Returns:
+            str: path of the blob
+        """
+        path = os.path.join(self.directory, key + self.BLOB_SUFFIX)
+        os.replace(source_path, path)
+        self._mark_used(path)
+        self._evict(keep=path)
+        return path
+
+    def _mark_used(self, blob_path: str):
+        """
+        Mark a blob as recently used. The blob itself is left untouched: changing its
+        mtime would change it in every file linked to it (and their digest signatures).
+        """
+        try:
+            with open(blob_path + self.USED_SUFFIX, 'a', encoding='utf-8'):
+                pass
+            os.utime(blob_path + self.USED_SUFFIX)
+        except OSError:
+            pass # read-only cache, the blob is evicted earlier
+
+    def _write(self, key: str, document):
+        """
+        Atomically replace the entry of the key and evict old entries.
+        Must be called with the lock held.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as file:
+                json.dump(document, file, separators=(',', ':'))
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self, keep: str = None):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        Must be called with the lock held.
+
+        Args:
+            keep (str, optional): path of an entry that must not be removed.
+        """
+        entries = []
+        used = {} # blob path -> time of its last use
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith((self.SUFFIX, self.BLOB_SUFFIX)):
+                    stat = entry.stat()
+                    entries.append([stat.st_mtime, stat.st_size, entry.path])
+                    total += stat.st_size
+                elif entry.name.endswith(self.BLOB_SUFFIX + self.USED_SUFFIX):
+                    used[entry.path[:-len(self.USED_SUFFIX)]] = entry.stat().st_mtime
+        for entry in entries:
+            entry[0] = used.pop(entry[2], entry[0])
+        for blob_path in used: # left by blobs removed meanwhile
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(blob_path + self.USED_SUFFIX)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+                if path.endswith(self.BLOB_SUFFIX):
+                    os.unlink(path + self.USED_SUFFIX)
+            total -= size
@@ -0,0 +1,586 @@
+"""
+Downloader Module
+
+Resumable and atomic HTTP downloads. The data is written to a partial file in the
+cache directory (downloads/) and only renamed to its final name once complete, so
+an interrupted download never leaves a truncated file behind. When the download
+is interrupted (Ctrl-C, network failure...) the transfer resumes from the partial
+file with an HTTP Range request, in the same run or in the next one. The ETag or
+Last-Modified date of the first response is sent back in If-Range, so the download
+restarts from zero if the remote file changed meanwhile.
+
+Downloaded files are also kept in a content-addressed cache shared by all the
+reproductions (RS_DOWNLOAD_CACHE): the files are stored by their sha256 and an
+index maps each URL to the digest, size and validators (ETag, Last-Modified) of
+its last download. When the same URL is requested again and the server answers
+that it did not change (or, without validators, when the contentSize of the crate
+matches), the cached file is linked into the execution directory (reflink, else
+read-only hardlink, else copy) instead of being downloaded again.
+
+The transfers run in process on http.client, without wget. Connections are kept
+alive and pooled per host, so the many files of a dataset hosted on the same
+repository server reuse a few connections instead of opening one each (proxies
+from the http_proxy/https_proxy environment variables are honoured). The content
+is hashed while it is streamed, the progress of each download is printed every
+RS_DOWNLOAD_PROGRESS_INTERVAL seconds and failed transfers are retried with an
+exponential backoff. Partial files nobody resumed for RS_DOWNLOAD_PARTIAL_DAYS days
+are removed, with their validators and lock files.
+"""
+import contextlib
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import ssl
+import threading
+import time
+import urllib.request
+
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from disk_cache import DiskCache, get_cache_dir
+
+DOWNLOAD_CACHE_ENABLED: bool = os.environ.get("RS_DOWNLOAD_CACHE", "1").lower() not in ("0", "false", "no")
+DOWNLOAD_CACHE = DiskCache("downloads", int(os.environ.get("RS_DOWNLOAD_CACHE_MB", "20480")) * 1024 * 1024)
+FICLONE = 0x40049409 # Linux ioctl cloning a file (reflink) on copy-on-write filesystems
+DOWNLOAD_RETRIES: int = int(os.environ.get("RS_DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_TIMEOUT: int = int(os.environ.get("RS_DOWNLOAD_TIMEOUT", "60")) # seconds without data
+DOWNLOAD_BACKOFF_MAX: float = float(os.environ.get("RS_DOWNLOAD_BACKOFF_MAX", "60")) # seconds between attempts
+PROGRESS_INTERVAL: float = float(os.environ.get("RS_DOWNLOAD_PROGRESS_INTERVAL", "5")) # seconds, 0 disables it
+PARTIAL_DAYS: float = float(os.environ.get("RS_DOWNLOAD_PARTIAL_DAYS", "7")) # unused partial files are removed after it
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_IDLE_CONNECTIONS = 8 # kept alive per host
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+RETRIABLE_STATUSES = (408, 429) # besides 5xx
+USER_AGENT = "compss-reproducibility-service"
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+PARTIAL_FILE = re.compile(r"([0-9a-f]{32})\.(part|part\.json|lock)")
+_partials_evicted = threading.Event() # once per process
+
+
+class IncompleteDownload(OSError):
+    """
+    The connection ended before the whole file was received.
+    """
+
+
+class DownloadCancelled(OSError):
+    """
+    The download was cancelled (eg: another download of the same dataset failed).
+    The partial file is kept, the next attempt resumes from it.
+    """
+
+
+class HTTPStatusError(OSError):
+    """
+    The server answered with an error status (or 304 Not Modified).
+
+    Attributes:
+        code (int): HTTP status code.
+        headers: headers of the response.
+    """
+    def __init__(self, url: str, code: int, reason: str, headers):
+        super().__init__(f"HTTP Error {code}: {reason} ({url})")
+        self.code = code
+        self.headers = headers
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections, pooled per host and shared by the download threads.
+    """
+    def __init__(self, max_idle: int = MAX_IDLE_CONNECTIONS):
+        self.max_idle = max_idle
+        self._idle = {} # (scheme, host, port) -> idle connections
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    def _connect(self, scheme: str, host: str, port: int) -> tuple[http.client.HTTPConnection, bool]:
+        """
+        Open a connection to the host, through the proxy of the environment if any.
+
+        Returns:
+            tuple[http.client.HTTPConnection, bool]: the connection, and whether requests must
+                use absolute URLs (plain HTTP proxy).
+        """
+        proxy = urllib.request.getproxies().get(scheme)
+        if proxy and urllib.request.proxy_bypass(host):
+            proxy = None
+        if proxy:
+            proxy = urlsplit(proxy if "://" in proxy else "http://" + proxy)
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            if proxy:
+                connection = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=DOWNLOAD_TIMEOUT,
+                                                         context=self._ssl_context)
+                connection.set_tunnel(host, port)
+            else:
+                connection = http.client.HTTPSConnection(host, port, timeout=DOWNLOAD_TIMEOUT, context=self._ssl_context)
+            return connection, False
+        if proxy:
+            return http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=DOWNLOAD_TIMEOUT), True
+        return http.client.HTTPConnection(host, port, timeout=DOWNLOAD_TIMEOUT), False
+
+    def acquire(self, key: tuple) -> tuple[http.client.HTTPConnection, bool, bool]:
+        """
+        Get an idle connection to the host, or a new one.
+
+        Args:
+            key (tuple): (scheme, host, port).
+
+        Returns:
+            tuple[http.client.HTTPConnection, bool, bool]: the connection, whether it was reused
+                and whether requests must use absolute URLs.
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                connection, absolute = idle.pop()
+                return connection, True, absolute
+        return (*self._connect(*key), False)
+
+    def release(self, key: tuple, connection: http.client.HTTPConnection, absolute: bool, response=None):
+        """
+        Give back a connection. It is only kept alive if its last response was read to the end.
+        """
+        if response is not None and not response.isclosed():
+            connection.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((connection, absolute))
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection, _ in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+CONNECTION_POOL = ConnectionPool()
+
+
+def _request(url: str, headers: dict) -> tuple:
+    """
+    Send a GET request on a pooled connection, following redirects.
+
+    Raises:
+        HTTPStatusError: If the final status is not 2xx.
+
+    Returns:
+        tuple: the response, and the pool key, connection and absolute flag to release it.
+    """
+    headers = dict(headers, **{"User-Agent": USER_AGENT})
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise OSError(f"Unsupported URL {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        while True:
+            connection, reused, absolute = CONNECTION_POOL.acquire(key)
+            target = url.split("#", 1)[0] if absolute else urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused: # an idle connection closed by the server, else a real failure
+                    raise
+            except BaseException:
+                connection.close()
+                raise
+        if response.status in REDIRECT_STATUSES and response.headers.get("Location"):
+            response.read()
+            CONNECTION_POOL.release(key, connection, absolute, response)
+            url = urljoin(url, response.headers["Location"])
+            continue
+        if not 200 <= response.status < 300:
+            response.read() # short error page, read to keep the connection alive
+            CONNECTION_POOL.release(key, connection, absolute, response)
+            raise HTTPStatusError(url, response.status, response.reason, response.headers)
+        return response, (key, connection, absolute)
+    raise OSError(f"Too many redirects from {url}")
+
+
+@contextlib.contextmanager
+def open_url(url: str, headers: dict = None):
+    """
+    Open a URL on a pooled connection, the connection is given back once the response is closed.
+    """
+    response, (key, connection, absolute) = _request(url, headers or {})
+    try:
+        yield response
+    except BaseException:
+        connection.close() # the state of the connection is unknown
+        raise
+    CONNECTION_POOL.release(key, connection, absolute, response)
+
+
+class _Progress:
+    """
+    Prints the progress of a download at most every interval seconds.
+    """
+    def __init__(self, url: str, offset: int, total: int, interval: float = None):
+        self.name = os.path.basename(urlsplit(url).path) or url
+        self.offset = offset
+        self.total = total
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def update(self, size: int):
+        if self.interval <= 0:
+            return
+        now = time.perf_counter()
+        if now - self.last < self.interval:
+            return
+        self.last = now
+        rate = (size - self.offset) / (now - self.start) / (1024 * 1024)
+        if self.total:
+            print(f"{self.name}: {size / (1024 * 1024):.1f} of {self.total / (1024 * 1024):.1f} MiB "
+                  f"({100 * size / self.total:.0f}%) at {rate:.1f} MiB/s")
+        else:
+            print(f"{self.name}: {size / (1024 * 1024):.1f} MiB at {rate:.1f} MiB/s")
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def partial_path(url: str) -> str:
+    """
+    Path of the partial file of a download, the same for every run.
+    """
+    return os.path.join(get_cache_dir(), "downloads", _url_key(url) + ".part")
+
+
+@contextlib.contextmanager
+def _download_lock(part_path: str):
+    """
+    Exclusive lock on the download of a URL, shared between processes.
+    """
+    lock_path = part_path[:-len(".part")] + ".lock"
+    while True:
+        with open(lock_path, 'a', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # The lock file may have been removed with a stale partial file meanwhile
+                try:
+                    current = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    yield
+                    return
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _remove_partial(part_path: str):
+    """
+    Remove a partial file and its validators.
+    """
+    for path in (part_path, part_path + ".json"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def evict_stale_partials(directory: str, max_age: float = None):
+    """
+    Remove the partial files (with their validators and lock) not modified for
+    max_age seconds, unless their download is running.
+
+    Args:
+        directory (str): directory of the partial files.
+        max_age (float, optional): Defaults to RS_DOWNLOAD_PARTIAL_DAYS.
+    """
+    max_age = PARTIAL_DAYS * 24 * 3600 if max_age is None else max_age
+    newest = {}
+    with contextlib.suppress(FileNotFoundError), os.scandir(directory) as it:
+        for entry in it:
+            match = PARTIAL_FILE.fullmatch(entry.name)
+            if match:
+                with contextlib.suppress(FileNotFoundError):
+                    key = match.group(1)
+                    newest[key] = max(newest.get(key, 0), entry.stat().st_mtime)
+    cutoff = time.time() - max_age
+    for key, mtime in newest.items():
+        if mtime >= cutoff:
+            continue
+        lock_path = os.path.join(directory, key + ".lock")
+        with open(lock_path, 'a', encoding='utf-8') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue # being downloaded
+            try:
+                _remove_partial(os.path.join(directory, key + ".part"))
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(lock_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _load_validators(part_path: str, url: str) -> dict:
+    try:
+        with open(part_path + ".json", 'r', encoding='utf-8') as file:
+            document = json.load(file)
+        return document if document.get("url") == url else None
+    except (OSError, ValueError):
+        return None
+
+
+def _validators(url: str, response) -> dict:
+    return {"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+
+def _save_validators(part_path: str, validators: dict):
+    with open(part_path + ".json", 'w', encoding='utf-8') as file:
+        json.dump(validators, file)
+
+
+def _fetch(url: str, part_path: str, cancel: threading.Event = None) -> tuple[int, str, dict]:
+    """
+    Download the URL into the partial file, resuming from its current size.
+    The transfer stops at the next chunk once cancel is set (DownloadCancelled).
+
+    Returns:
+        tuple[int, str, dict]: size and sha256 of the complete file, and its validators.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validators = _load_validators(part_path, url) if offset else None
+    validator = validators and (validators["etag"] or validators["last_modified"])
+    if offset and not validator:
+        offset = 0 # the remote file cannot be checked for changes, start again
+    headers = {}
+    if offset:
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+    try:
+        with open_url(url, headers) as response:
+            if response.status == 206:
+                match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+                if not match or int(match.group(1)) != offset:
+                    os.remove(part_path)
+                    raise IncompleteDownload(f"Unexpected range in the response of {url}")
+                total = None if match.group(3) == "*" else int(match.group(3))
+                mode = 'ab'
+                print(f"Resuming the download of {url} from {offset} bytes")
+                digest = hashlib.sha256()
+                _hash_partial(part_path, digest)
+            else: # the whole file, the server does not support ranges or the file changed
+                offset = 0
+                length = response.headers.get("Content-Length")
+                total = int(length) if length and length.isdigit() else None
+                mode = 'wb'
+                validators = _validators(url, response)
+                _save_validators(part_path, validators)
+                digest = hashlib.sha256()
+
+            size = offset
+            progress = _Progress(url, offset, total)
+            with open(part_path, mode) as file:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled(f"Download of {url} cancelled at {size} bytes")
+                    # What has arrived, up to a chunk: a slow transfer still checks cancel often
+                    chunk = response.read1(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        response.read() # marks a complete response as closed, its connection is reused
+                        break
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    progress.update(size)
+            if total is not None and size < total:
+                raise IncompleteDownload(f"Download of {url} interrupted at {size} of {total} bytes")
+    except HTTPStatusError as e:
+        if e.code == 416 and offset: # nothing after the offset: already complete, or the file shrank
+            match = re.match(r"bytes \*/(\d+)", e.headers.get("Content-Range", ""))
+            if match and int(match.group(1)) == offset:
+                return offset, _hash_partial(part_path), validators
+            os.remove(part_path)
+            raise IncompleteDownload(f"Partial download of {url} does not match the remote file") from e
+        raise
+    return size, digest.hexdigest(), validators
+
+
+def _hash_partial(part_path: str, digest=None) -> str:
+    """
+    Hash the data already downloaded, to continue hashing from there.
+    """
+    digest = digest or hashlib.sha256()
+    with open(part_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def materialize(source_path: str, destination: str):
+    """
+    Make a cached file available at the destination without copying its data when
+    possible: a reflink (copy-on-write clone), else a hardlink to the read-only blob,
+    else a copy. The destination is replaced atomically.
+    """
+    tmp_path = destination + ".part"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp_path)
+    try:
+        with open(source_path, 'rb') as source, open(tmp_path, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def _cached_download(url: str, expected_size: int) -> dict:
+    """
+    Get the index entry of the URL if its cached file is still valid: the server
+    answers 304 Not Modified to a conditional request or, if it gave no validators,
+    the size matches the contentSize of the crate.
+
+    Returns:
+        dict: None on a miss, else the entry (url, etag, last_modified, size, sha256).
+    """
+    entry = DOWNLOAD_CACHE.get_json(_url_key(url))
+    if not entry or entry.get("url") != url or DOWNLOAD_CACHE.blob_path(entry["sha256"]) is None:
+        return None
+    if expected_size is not None and entry["size"] != expected_size:
+        return None
+    headers = {}
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    if not headers:
+        return entry if expected_size is not None else None
+    try:
+        with open_url(url, headers):
+            return None # 200: the remote file changed
+    except HTTPStatusError as e:
+        return entry if e.code == 304 else None
+    except (OSError, http.client.HTTPException):
+        return None
+
+
+def _store_download(url: str, part_path: str, size: int, sha256: str, validators: dict, destination: str):
+    """
+    Move the downloaded file into the cache, index it by URL and link it to the destination.
+    """
+    with DOWNLOAD_CACHE.lock():
+        blob_path = DOWNLOAD_CACHE.blob_path(sha256)
+        if blob_path is None:
+            os.chmod(part_path, 0o444) # shared by hardlinks, must not be modified in place
+            blob_path = DOWNLOAD_CACHE.put_blob(sha256, part_path)
+        else: # same content already cached from another URL
+            os.remove(part_path)
+        materialize(blob_path, destination)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(part_path + ".json")
+    DOWNLOAD_CACHE.put_json(_url_key(url), dict(validators or {"url": url, "etag": None, "last_modified": None},
+                                                size=size, sha256=sha256))
+
+
+def publish(part_path: str, destination: str):
+    """
+    Atomically move a complete partial file to its final name.
+    """
+    try:
+        os.replace(part_path, destination)
+    except OSError:
+        # the cache and the destination are on different filesystems:
+        # copy next to the destination, then rename
+        tmp_path = destination + ".part"
+        shutil.copyfile(part_path, tmp_path)
+        os.replace(tmp_path, destination)
+        os.remove(part_path)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(part_path + ".json")
+
+
+def _backoff(attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt: exponential, capped at RS_DOWNLOAD_BACKOFF_MAX,
+    with jitter so that concurrent downloads from the same server do not retry together.
+    """
+    return min(DOWNLOAD_BACKOFF_MAX, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def download(url: str, destination: str, expected_size: int = None, retries: int = None,
+             cancel: threading.Event = None) -> int:
+    """
+    Download a URL to a file, resuming interrupted transfers and renaming the file
+    to its final name only once it is complete. Files already in the download cache
+    are linked from it when the remote file did not change.
+
+    Args:
+        url (str): The URL of the file to be downloaded.
+        destination (str): The path of the downloaded file.
+        expected_size (int, optional): contentSize of the file in the crate, checked once downloaded.
+        retries (int, optional): attempts after a failure, resuming each time. Defaults to RS_DOWNLOAD_RETRIES.
+        cancel (threading.Event, optional): stops the transfer once set, eg: when another download failed.
+
+    Raises:
+        ValueError: If the size of the downloaded file is not the expected one.
+        DownloadCancelled: If cancel was set, the partial file is kept to resume later.
+        OSError: If the file could not be downloaded.
+
+    Returns:
+        int: size of the downloaded file.
+    """
+    retries = DOWNLOAD_RETRIES if retries is None else retries
+    part_path = partial_path(url)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    if not _partials_evicted.is_set():
+        _partials_evicted.set()
+        evict_stale_partials(os.path.dirname(part_path))
+    with _download_lock(part_path):
+        if DOWNLOAD_CACHE_ENABLED:
+            entry = _cached_download(url, expected_size)
+            if entry:
+                with DOWNLOAD_CACHE.lock():
+                    blob_path = DOWNLOAD_CACHE.blob_path(entry["sha256"])
+                    if blob_path is not None: # not evicted meanwhile
+                        materialize(blob_path, destination)
+                        print(f"{url} found in the download cache, not downloaded again")
+                        return entry["size"]
+
+        for attempt in range(retries + 1):
+            try:
+                size, sha256, validators = _fetch(url, part_path, cancel)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == retries or isinstance(e, DownloadCancelled) or isinstance(e, HTTPStatusError) and e.code < 500 \
+                        and e.code not in RETRIABLE_STATUSES:
+                    if isinstance(e, http.client.HTTPException):
+                        raise OSError(f"Download of {url} failed: {e!r}") from e
+                    raise
+                delay = _backoff(attempt)
+                print(f"Download of {url} failed ({e}), retrying in {delay:.1f}s")
+                if cancel is not None and cancel.wait(delay):
+                    raise DownloadCancelled(f"Download of {url} cancelled") from e
+                if cancel is None:
+                    time.sleep(delay)
+        if expected_size is not None and size != expected_size:
+            _remove_partial(part_path)
+            raise ValueError(f"Downloaded {size} bytes from {url} instead of the {expected_size} of the metadata")
+        if DOWNLOAD_CACHE_ENABLED:
+            _store_download(url, part_path, size, sha256, validators, destination)
+        else:
+            publish(part_path, destination)
+    return size
@@ -0,0 +1,101 @@
+"""
+Environment Probe Module
+
+Detects the COMPSs installation and whether the service runs on a SLURM cluster.
+Both checks run concurrently at startup and their results are kept for the whole
+process. The COMPSs version is also cached on disk, keyed by the path and the
+modification time of the runcompss executable, since starting the COMPSs launcher
+takes seconds.
+"""
+import functools
+import getpass
+import hashlib
+import os
+import shutil
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from disk_cache import DiskCache
+
+# Any of these variables being set means we are on a SLURM cluster (eg: inside a job allocation)
+SLURM_ENV_VARIABLES = ("SLURM_JOB_ID", "SLURM_CLUSTER_NAME", "SLURM_CONF")
+SLURM_QUERY_TIMEOUT: int = 30 # seconds
+ENVIRONMENT_CACHE = DiskCache("environment", 1024 * 1024)
+
+
+@functools.lru_cache(maxsize=None)
+def probe_compss_version() -> str:
+    """
+    To check the version of COMPSs installed on the system.
+    Returns:
+        str: The version of COMPSs installed on the system, or an error message.
+    """
+    runcompss = shutil.which("runcompss")
+    if runcompss is None:
+        return "runcompss command not found. Please ensure that COMPSs is installed and the command is available in your PATH."
+    executable = os.path.realpath(runcompss)
+    cache_key = hashlib.sha256(f"{executable}:{os.stat(executable).st_mtime_ns}".encode()).hexdigest()
+    cached = ENVIRONMENT_CACHE.get_json(cache_key)
+    if cached:
+        print(f"COMPSs Version Found: {cached['compss_version']}")
+        return cached["compss_version"]
+
+    try:
+        # Execute the command
+        result = subprocess.run([runcompss, '-v'], capture_output=True, text=True, check=True)
+
+        # Parse the output
+        output = result.stdout.strip()
+        if "COMPSs version" in output:
+            version = output.split('COMPSs version ')[1].split(" ")[0]
+            print(f"COMPSs Version Found: {version}")
+            ENVIRONMENT_CACHE.put_json(cache_key, {"runcompss": executable, "compss_version": version})
+            return version
+        else:
+            return "COMPSs version not found in the output."
+
+    except subprocess.CalledProcessError as e:
+        return f"An error occurred while trying to get COMPSs version: {e}"
+    except FileNotFoundError:
+        return "runcompss command not found. Please ensure that COMPSs is installed and the command is available in your PATH."
+
+
+@functools.lru_cache(maxsize=None)
+def probe_slurm_cluster() -> tuple[bool, str]:
+    """
+    To check if the program is running on a SLURM cluster.
+    The SLURM environment variables are checked first; otherwise squeue is asked only
+    for the jobs of the current user, instead of listing the whole queue.
+
+    Returns:
+        tuple[bool, str]: tuple of a boolean indicating if the program
+            is running on a SLURM cluster and a message.
+    """
+    for variable in SLURM_ENV_VARIABLES:
+        if os.environ.get(variable):
+            return True, f"{variable} is set"
+
+    if shutil.which("squeue") is None:
+        return False, "squeue command not found"
+    try:
+        result = subprocess.run(['squeue', '--noheader', '--format=%i', f'--user={getpass.getuser()}'],
+                                capture_output=True, text=True, timeout=SLURM_QUERY_TIMEOUT)
+        if result.returncode == 0:
+            return True, result.stdout
+    except Exception as e:
+        return False, str(e)
+
+    return False, "squeue command failed without raising an exception"
+
+
+def probe_environment() -> tuple[str, bool]:
+    """
+    Run the COMPSs and SLURM checks concurrently.
+
+    Returns:
+        tuple[str, bool]: the COMPSs version found and whether the program runs on a SLURM cluster.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        compss_version = pool.submit(probe_compss_version)
+        slurm_cluster = pool.submit(probe_slurm_cluster)
+        return compss_version.result(), slurm_cluster.result()[0]
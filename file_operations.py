@@ -10,6 +10,7 @@ to the current working directory.
 import os
 import shutil
 import datetime
+import tempfile
 
 def move_results_created(initial_files, execution_path: str):
     """
@@ -145,13 +146,24 @@ def copy_all_to_cwd(src_path) -> set[str]:
 #         elif os.path.isdir(file_path):
 #             shutil.rmtree(file_path)
 
-def create_new_execution_directory(SERVICE_PATH: str):
-    # Create a unique sub-directory name based on the current timestamp
+def create_new_execution_directory(SERVICE_PATH: str, parent_path: str = None):
+    """
+    Create the execution directory of a reproduction, with its log and Workflow folders.
+    The name is made unique with a random suffix after the timestamp, so that runs
+    started in the same second (eg: in batch mode) do not collide.
+
+    Args:
+    SERVICE_PATH (str): Path to the service.
+    parent_path (str, optional): Directory where it is created. Defaults to the current working directory.
+
+    Returns:
+    str: Path to the new execution directory.
+    """
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    new_execution_dir = os.path.join(os.getcwd(), f'reproducibility_service_{timestamp}')
-    # Create the new sub-directory
-    os.makedirs(new_execution_dir)
+    # mkdtemp creates the directory atomically under a name nobody else got
+    new_execution_dir = tempfile.mkdtemp(prefix=f'reproducibility_service_{timestamp}_', dir=parent_path or os.getcwd())
+    os.chmod(new_execution_dir, 0o755) # mkdtemp makes it private to the user
     # required directories for the service
     os.makedirs(os.path.join(new_execution_dir, 'log'))
     os.makedirs(os.path.join(new_execution_dir, 'Workflow'))
-    return new_execution_dir
\ No newline at end of file
+    return new_execution_dir
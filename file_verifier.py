@@ -8,21 +8,27 @@ ensuring their existence and optionally their size and modification date.
 
 import os
 
-from rocrate.rocrate import ROCrate
-from utils import get_by_id, print_colored, TextColor, generate_file_status_table
+from crate_context import CrateContext
+from status_report import report_file_status
+from utils import get_by_id, print_colored, TextColor
+from verification_engine import INTEGRITY_CHECK, integrity_verifier
 
-def files_verifier(crate_path: str, instrument: str, objects: dict, remote_dataset_dict: dict):
+def files_verifier(crate_context: CrateContext, instrument: str, objects: dict, remote_dataset_dict: dict,
+                   log_dir: str = None, integrity: bool = INTEGRITY_CHECK):
     """
     Verify files within an RO-Crate against their metadata.
 
     Args:
-        crate_path (str): Path to the root directory of the RO-Crate.
+        crate_context (CrateContext): The parsed RO-Crate.
         instrument (str): Identifier of the instrument file within the RO-Crate.
         objects (list[str]): List of identifiers for objects/inputs within the RO-Crate.
+        remote_dataset_dict (dict): Remote datasets downloaded, mapped from their names to their ids.
+        log_dir (str, optional): Directory where the computed digests are recorded.
+        integrity (bool, optional): Also verify the content hashes of the files (RS_INTEGRITY_CHECK).
 
     Raises:
         FileNotFoundError: If any referenced file in the RO-Crate does not exist in the directory.
-        ValueError:If the content size of any file does not match the recorded size in the RO-Crate.
+        ValueError:If the content size (or hash, in integrity mode) of any file does not match the RO-Crate.
 
     Notes:
         This function verifies the existence and size of files referenced in the RO-Crate
@@ -37,50 +43,57 @@ def files_verifier(crate_path: str, instrument: str, objects: dict, remote_datas
     temp_size = []
     temp_path = []
     # temp_date = []
-    crate = ROCrate(crate_path)
+    crate_path = crate_context.crate_path
     instrument_path = os.path.join(crate_path, instrument)
+
+    to_verify = [] # tuple of (object_name, file_path, object_id) of the local objects
+    for name,input in (objects or {}).items():
+        if not remote_dataset_dict and name[0] in remote_dataset_dict: # Do not verifiy the local objects if remote dataset exists
+            continue
+        # Skip the remote objects
+        if input.startswith("http"):
+            continue
+        to_verify.append((name[0], os.path.join(crate_path, input), input))
+    # Answered from the crate inventory, without stat'ing the files again
+    stats = crate_context.inventory.stat_files([instrument_path] + [file_path for _, file_path, _ in to_verify])
+
     instrument_tuple = (instrument, instrument_path, 1, 1)
+    instrument_stat = stats[instrument_path]
     # Verify the instrument file
-    if not os.path.exists(instrument_path):
+    if instrument_stat is None:
         verified = False
         temp_path.append(instrument_path)
         instrument_tuple = (instrument_tuple[0], instrument_tuple[1], 0, 0)
 
-    if not os.path.getsize(instrument_path) == get_by_id(crate, instrument)["contentSize"]:
+    elif not instrument_stat.st_size == get_by_id(crate_context, instrument)["contentSize"]:
         size_verifier = False
         temp_size.append(instrument_path)
         instrument_tuple = (instrument_tuple[0], instrument_tuple[1], instrument_tuple[2], 1)
 
     file_verifier.append(instrument_tuple)
     #Verify the objects/inputs
-    crate = ROCrate(crate_path)
 
     if not objects:
         print_colored("No objects found in the crate, so nothing to verify", TextColor.GREEN)
         return
 
-    for name,input in objects.items():
-        if not remote_dataset_dict and name[0] in remote_dataset_dict: # Do not verifiy the local objects if remote dataset exists
-            continue
-        # Skip the remote objects
-        if input.startswith("http"):
-            continue
-        file_path = os.path.join(crate_path, input)
-        file_tuple = (name[0], file_path, 1, 2)
-        if not os.path.exists(file_path):
+    for name, file_path, input in to_verify:
+        file_tuple = (name, file_path, 1, 2)
+        file_stat = stats[file_path]
+        if file_stat is None:
             verified = False
             temp_path.append(file_path)
-            file_tuple = (name[0], file_path, 0, 0)
+            file_tuple = (name, file_path, 0, 0)
             file_verifier.append(file_tuple)
             continue
         # else:
         #     print(file_path+"\n"+"FILE EXISTS")
-        file_object = get_by_id(crate, input)
+        file_object = get_by_id(crate_context, input)
         if "contentSize" in file_object:
             content_size = file_object["contentSize"]
             # Verify the above content size with the actual file size
             # Get the actual file size
-            actual_size = os.path.getsize(file_path)
+            actual_size = file_stat.st_size
 
             # Verify the content size with the actual file size
             if actual_size != content_size:
@@ -94,18 +107,28 @@ def files_verifier(crate_path: str, instrument: str, objects: dict, remote_datas
 
         file_verifier.append(file_tuple)
 
+    temp_hash = []
+    if integrity:
+        # the hash is checked in the same column as the size
+        entity_ids = {file_path: input for _, file_path, input in to_verify}
+        entity_ids[instrument_path] = instrument
+        if crate_context.inventory.materialize(list(entity_ids)): # crates opened lazily
+            stats = crate_context.inventory.stat_files(list(entity_ids))
+        temp_hash = integrity_verifier(crate_context, file_verifier, entity_ids, log_dir, stats)
+
     print_colored("STATUS TABLE (the crate includes the DATASETS needed by the workflow to run, data persistence was TRUE):", TextColor.YELLOW)
 
-    generate_file_status_table(file_verifier, "Included")
+    report_file_status(file_verifier, "Included", log_dir)
 
     if not size_verifier:
         if verified:
             raise ValueError(f"Content size mismatch in files: {temp_size}")
         else:
             raise ValueError(f"Content size mismatch in files: {temp_size}\nFiles missing: {temp_path}")
+    if temp_hash:
+        raise ValueError(f"Content hash mismatch in files: {temp_hash}")
     if not verified:
         raise FileNotFoundError(f"Files missing in directory: {temp_path}")
 
     print_colored("All files in the crate have been verified successfully", TextColor.GREEN)
 
-
@@ -6,11 +6,11 @@ and change values in the final command
 
 """
 import os
-import shutil
 import zipfile
 import urllib.parse
 
-from utils import print_colored,print_colored_ns, TextColor, executor, get_yes_or_no
+from crate_extractor import LAZY_EXTRACT, extract_crate, open_crate_lazily
+from utils import print_colored,print_colored_ns, TextColor, get_yes_or_no, get_answer, preset_answer
 
 def get_workflow(execution_path: str, link_or_path: str) -> str:
     """
@@ -22,7 +22,8 @@ def get_workflow(execution_path: str, link_or_path: str) -> str:
         link_or_path (str): The link or path to the workflow.
 
     Raises:
-        ValueError: It can occur if the file is not a valid zip file or the link is not a valid URL.
+        ValueError: It can occur if the file is not a valid zip file or the link is not a valid URL,
+            or if the user does not download the crate after its summary.
     Returns:
         str: The path to the workflow
     """
@@ -39,7 +40,13 @@ def get_workflow(execution_path: str, link_or_path: str) -> str:
         crate_path = os.path.abspath(link_or_path)
 
         if zipfile.is_zipfile(crate_path):
-            shutil.copy(crate_path, os.path.join(workflow_path, "my_crate.zip"))
+            # Extracted directly from the user's archive, without copying it first
+            if LAZY_EXTRACT:
+                open_crate_lazily(crate_path, workflow_path)
+            else:
+                extract_crate(crate_path, workflow_path)
+            print(f"The workflow has been successfully extracted to {workflow_path}")
+            return workflow_path # returns crate path
         elif os.path.isdir(crate_path):
             return crate_path
         else:
@@ -53,20 +60,35 @@ def get_workflow(execution_path: str, link_or_path: str) -> str:
         if not urllib.parse.urlparse(crate_link).scheme in ['http', 'https']:
             raise ValueError("The link provided is not a valid URL.")
 
-        executor(["wget", "-O", os.path.join(workflow_path, "my_crate.zip"), crate_link], execution_path)
+        # http.client, ssl and urllib.request are only imported when a crate is downloaded
+        from downloader import download
+        from remote_probe import REMOTE_PROBE, probe_remote_crate
+        # Only the metadata is read with Range requests, to show what the crate is before the whole download
+        if REMOTE_PROBE and probe_remote_crate(crate_link):
+            if not get_yes_or_no("Do you want to download the whole crate to reproduce it?", "download"):
+                raise ValueError("The download of the crate was cancelled.")
+
+        # Resumed if interrupted, and linked from the download cache if the crate was already downloaded
+        print_colored(f"Downloading the crate from {crate_link}, please wait...", TextColor.YELLOW)
+        try:
+            download(crate_link, os.path.join(workflow_path, "my_crate.zip"))
+        except OSError as e:
+            raise ValueError(f"The crate could not be downloaded from {crate_link}: {e}. Run the service again to resume the download.")
 
     else:
         raise ValueError("Invalid input. Please enter 'path' or 'link'.")
 
     crate_zip_path = os.path.join(workflow_path, "my_crate.zip")
 
+    if LAZY_EXTRACT: # the archive is kept, the dataset is extracted from it on demand
+        open_crate_lazily(crate_zip_path, workflow_path)
+        print(f"The workflow has been successfully opened from {crate_zip_path}")
+        return workflow_path # returns crate path
+
     try:
-        with zipfile.ZipFile(crate_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(workflow_path)
+        extract_crate(crate_zip_path, workflow_path)
         print(f"The workflow has been successfully extracted to {workflow_path}")
         return workflow_path # returns crate path
-    except zipfile.BadZipFile as e:
-        raise ValueError(f"The file {crate_zip_path} is not a valid zip file or it is corrupted.")
     finally:
         os.remove(crate_zip_path)
 
@@ -85,13 +107,13 @@ def get_more_flags(command: list[str], previous_flags: list[str]) -> list[str]:
     print_colored(" ".join(command), TextColor.YELLOW)
     previous_flags_str = " ".join(previous_flags)
     print_colored(f"For Reference) The previously applied flags are as follows: {previous_flags_str}", TextColor.BLUE)
-    more = get_yes_or_no("Do you want to add more flags to the compss runtime command shown above")
+    more = get_yes_or_no("Do you want to add more flags to the compss runtime command shown above", "add_flags")
 
     if not more: # return if no more flags are needed
         return command
 
     print_colored("WARNING: Submit the flags in one go. Example) Please enter the flags you want to add: --lang=python -d -p",TextColor.RED)
-    flag = input("Please enter the flags you want to add: ")
+    flag = get_answer("Please enter the flags you want to add: ", "flags")
     flags: list[str] = flag.split(" ")
     for f in flags:
         command.insert(1, f)
@@ -113,7 +135,15 @@ def get_change_values(command : list[str]) -> list[str]:
     """
     print_colored("The current command is as follows:", TextColor.YELLOW)
     print_colored_ns(" ".join(command), TextColor.YELLOW)
-    if not get_yes_or_no("Do you want to change anything from the above command?"):
+    if not get_yes_or_no("Do you want to change anything from the above command?", "change_values"):
+        return command
+    changes = preset_answer("changes", {})
+    if changes is not None: # batch mode: index (from 1) -> new value
+        for index, value in changes.items():
+            if not str(index).isdigit() or not 1 <= int(index) <= len(command):
+                raise ValueError(f"Invalid index {index} in the changes of the batch manifest (1-{len(command)})")
+            command[int(index)-1] = str(value)
+        print_colored_ns(" ".join(command), TextColor.YELLOW)
         return command
     else:
         n = len(command)
@@ -0,0 +1,116 @@
+"""
+Metadata Cache Module
+
+Stores the facts the service extracts from a crate (instrument, objects, results,
+COMPSs version and data_persistence flag) together with the few entities it reads,
+keyed by a digest of ro-crate-metadata.json and the YAML file. Reproducing the same
+crate again then skips parsing the metadata entirely.
+"""
+import hashlib
+import os
+
+from crate_context import CrateContext
+from crate_stream import entity_record
+from disk_cache import DiskCache
+from utils import (
+    get_by_id, get_Create_Action, get_compss_crate_version, get_data_persistence_status,
+    get_instument, get_objects_dict, get_results_dict
+)
+
+CACHE_FORMAT_VERSION: int = 2
+METADATA_CACHE = DiskCache("metadata", int(os.environ.get("RS_METADATA_CACHE_MB", "512")) * 1024 * 1024)
+
+
+def crate_digest(crate_context: CrateContext) -> str:
+    """
+    Digest of the ro-crate-metadata.json and YAML files of the crate.
+
+    Args:
+        crate_context (CrateContext): The crate.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256(f"v{CACHE_FORMAT_VERSION}".encode())
+    for path in (os.path.join(crate_context.crate_path, "ro-crate-metadata.json"), crate_context.yaml_file_path):
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _used_entities(crate_context: CrateContext) -> list:
+    """
+    Get the entities read by the service: #compss, the CreateAction, its instrument,
+    its objects (and their parts) and its results.
+    """
+    create_action = get_Create_Action(crate_context)
+    entities = [get_by_id(crate_context, "#compss"), create_action, create_action["instrument"]]
+    for key in ("object", "result"):
+        if key in create_action:
+            for entity in create_action[key]:
+                entities.append(entity)
+                if "hasPart" in entity:
+                    entities.extend(entity["hasPart"])
+    unique = {}
+    for entity in entities:
+        if entity is not None:
+            unique.setdefault(entity.id, entity)
+    return list(unique.values())
+
+
+def load_crate_metadata(crate_context: CrateContext, digest: str) -> bool:
+    """
+    Fill the crate context from the metadata cache.
+
+    Returns:
+        bool: True if the crate was found in the cache.
+    """
+    document = METADATA_CACHE.get_json(digest)
+    if not document or document.get("version") != CACHE_FORMAT_VERSION:
+        return False
+    facts = document["facts"]
+    crate_context.load_records(document["entities"])
+    crate_context.facts.update({
+        "instrument": facts["instrument"],
+        "objects": {(name, id): id for name, id in facts["objects"]},
+        "results": facts["results"],
+        "compss_version": facts["compss_version"],
+        "data_persistence": facts["data_persistence"],
+    })
+    return True
+
+
+def store_crate_metadata(crate_context: CrateContext, digest: str):
+    """
+    Extract the facts of the crate and store them in the metadata cache.
+    """
+    document = {
+        "version": CACHE_FORMAT_VERSION,
+        "facts": {
+            "instrument": get_instument(crate_context),
+            "objects": [[name, id] for (name, id) in get_objects_dict(crate_context)],
+            "results": get_results_dict(crate_context),
+            "compss_version": get_compss_crate_version(crate_context),
+            "data_persistence": get_data_persistence_status(crate_context),
+        },
+        "entities": [entity_record(entity) for entity in _used_entities(crate_context)],
+    }
+    METADATA_CACHE.put_json(digest, document)
+
+
+def cache_crate_metadata(crate_context: CrateContext) -> bool:
+    """
+    Load the crate facts from the metadata cache, or extract and cache them on a miss.
+
+    Args:
+        crate_context (CrateContext): The crate.
+
+    Returns:
+        bool: True if the metadata came from the cache.
+    """
+    digest = crate_context.fact("crate_digest", lambda: crate_digest(crate_context))
+    if load_crate_metadata(crate_context, digest):
+        return True
+    store_crate_metadata(crate_context, digest)
+    return False
@@ -5,46 +5,58 @@ This module asks the user if they want to add the new_dataset and gives the
 directory structure of the old dataset as reference.
 """
 import os
-from utils import print_colored, TextColor, get_yes_or_no
+import shutil
 
-def print_directory_contents(path:str, level=0):
+from crate_context import CrateContext
+from crate_inventory import CrateInventory
+from utils import print_colored, TextColor, get_yes_or_no, preset_answer
+
+def print_directory_contents(inventory: CrateInventory, path: str, level=0):
     """
-    Print the contents of a directory with indentation.
-    To show the directory structure in a tree-like format
+    Print the contents of a crate directory with indentation.
+    To show the directory structure in a tree-like format. The contents are read from
+    the crate inventory, which also lists the dataset of a crate opened lazily.
 
     Args:
+        inventory (CrateInventory): the inventory of the crate.
         path (str): path to the directory
         level (int, optional): Defaults to 0.
     """
-    try:
-        # List all the entries in the directory
-        for entry in os.listdir(path):
-            entry_path = os.path.join(path, entry)
-            # Print the entry (file or directory) with indentation
-            print(' ' * level * 4 + entry)
-            # If the entry is a directory, recursively call the function for the sub-directory
-            if os.path.isdir(entry_path):
-                print_directory_contents(entry_path, level + 1)
-    except PermissionError:
-        # Handle the case where the program does not have permission to access the directory
-        print(' ' * level * 4 + '[Permission Denied]')
+    # List all the entries in the directory
+    for entry in inventory.listdir(path):
+        entry_path = os.path.join(path, entry)
+        # Print the entry (file or directory) with indentation
+        print(' ' * level * 4 + entry)
+        # If the entry is a directory, recursively call the function for the sub-directory
+        if inventory.stat(entry_path).is_dir:
+            print_directory_contents(inventory, entry_path, level + 1)
 
 
-def new_dataset_info_collector(crate_directory:str):
+def new_dataset_info_collector(crate_context: CrateContext):
     """
     Collect information about the new dataset.
     Whether the user wants to add a new dataset or not.
 
     Args:
-        crate_directory (str): the path to the root directory of the RO-Crate.
+        crate_context (CrateContext): The parsed RO-Crate.
     """
+    crate_directory = crate_context.crate_path
     new_dataset_path = os.path.join(crate_directory, "new_dataset")
     os.makedirs(new_dataset_path)
     print("\nPlease copy the new dataset to the 'new_dataset' folder :\n")
     print_colored("New dataset path: " + new_dataset_path, TextColor.BLUE)
     print_colored("WARNING| MAKE SURE THE NEW DATASET FOLLOWS THE SAME DIRECTORY STRUCTURE AS THE OLD DATASET", TextColor.RED)
     print("The old directory structure for reference is as follows:\n")
-    print_directory_contents(os.path.join(crate_directory, "dataset"))
+    dataset_path = os.path.join(crate_directory, "dataset")
+    if crate_context.inventory.exists(dataset_path):
+        print_directory_contents(crate_context.inventory, dataset_path)
+    else:
+        print_colored("The crate has no dataset folder", TextColor.YELLOW)
+    source = preset_answer("new_dataset_path")
+    if source: # batch mode, the manifest gives the folder of the new dataset
+        shutil.copytree(source, new_dataset_path, dirs_exist_ok=True)
+        print(f"Copied the new dataset from {source}")
+        return
     check = False
     while not check:
-        check = get_yes_or_no("Have you copied the new dataset to the 'new_dataset' folder?")
+        check = get_yes_or_no("Have you copied the new dataset to the 'new_dataset' folder?", "new_dataset_copied")
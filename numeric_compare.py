@@ -0,0 +1,205 @@
+"""
+Numeric Comparison Module
+
+Floating point results often differ in the last bits between runs, so comparing
+them byte by byte reports a failure although the run was reproduced. This module
+compares numeric files (NumPy .npy arrays and CSV/TSV/text matrices) value by value
+under an absolute and a relative tolerance, like numpy.isclose:
+
+    |reproduced - original| <= RS_NUMERIC_ATOL + RS_NUMERIC_RTOL * |original|
+
+Arrays are memory-mapped and text files are parsed in blocks of rows, so files of
+several GB are compared without loading them in memory. NumPy is optional: without
+it the results are only compared byte by byte.
+"""
+import itertools
+import os
+
+import verification_engine
+
+from concurrent.futures import ProcessPoolExecutor
+
+NUMERIC_COMPARE: bool = os.environ.get("RS_NUMERIC_COMPARE", "1").lower() not in ("0", "false", "no")
+NUMERIC_ATOL: float = float(os.environ.get("RS_NUMERIC_ATOL", "1e-8"))
+NUMERIC_RTOL: float = float(os.environ.get("RS_NUMERIC_RTOL", "1e-5"))
+NUMERIC_CHUNK_ROWS: int = int(os.environ.get("RS_NUMERIC_CHUNK_ROWS", "65536")) # rows of a text file compared at once
+ARRAY_CHUNK_VALUES = 1 << 23 # values of an array compared at once (64 MiB as float64)
+ARRAY_EXTENSIONS = (".npy",)
+TEXT_DELIMITERS = {".csv": ",", ".tsv": "\t", ".txt": None, ".dat": None, ".out": None}
+NUMERIC_KINDS = "biuf" # dtype kinds compared as float64: bool, signed, unsigned and floating point
+
+
+def is_numeric_file(path: str) -> bool:
+    """
+    Check if a file can be compared value by value, from its extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return extension in ARRAY_EXTENSIONS or extension in TEXT_DELIMITERS
+
+
+def numpy_available() -> bool:
+    try:
+        import numpy # pylint: disable=import-outside-toplevel,unused-import
+        return True
+    except ImportError:
+        return False
+
+
+class _Deviation:
+    """
+    Running statistics of the deviation between two arrays, updated block by block.
+    """
+    def __init__(self, atol: float, rtol: float):
+        self.atol = atol
+        self.rtol = rtol
+        self.count = 0
+        self.outside = 0
+        self.max_abs = 0.0
+        self.sum_abs = 0.0
+
+    def update(self, original, reproduced):
+        import numpy as np # pylint: disable=import-outside-toplevel
+        original = np.asarray(original, dtype=np.float64)
+        reproduced = np.asarray(reproduced, dtype=np.float64)
+        if original.size == 0:
+            return
+        close = np.isclose(reproduced, original, rtol=self.rtol, atol=self.atol, equal_nan=True)
+        deviation = np.abs(reproduced - original)
+        deviation[close & ~np.isfinite(deviation)] = 0.0 # equal NaN or infinite values
+        deviation[~close & np.isnan(deviation)] = np.inf # NaN against a number
+        self.count += original.size
+        self.outside += int(original.size - np.count_nonzero(close))
+        self.max_abs = max(self.max_abs, float(np.max(deviation)))
+        self.sum_abs += float(np.sum(deviation))
+
+    def result(self) -> dict:
+        return {
+            "values": self.count,
+            "outside_tolerance": self.outside,
+            "max_deviation": self.max_abs,
+            "mean_deviation": self.sum_abs / self.count if self.count else 0.0,
+            "within_tolerance": self.outside == 0,
+        }
+
+
+def _compare_arrays(original_path: str, reproduced_path: str, deviation: _Deviation):
+    import numpy as np # pylint: disable=import-outside-toplevel
+    original = np.load(original_path, mmap_mode='r', allow_pickle=False)
+    reproduced = np.load(reproduced_path, mmap_mode='r', allow_pickle=False)
+    if original.shape != reproduced.shape:
+        raise ValueError(f"shape {reproduced.shape} instead of {original.shape}")
+    for array in (original, reproduced): # structured, object, complex or string arrays
+        if array.dtype.kind not in NUMERIC_KINDS:
+            raise ValueError(f"dtype {array.dtype} is not compared as numbers")
+    if original.size == 0: # nothing to compare, the shapes are the same
+        return
+    if original.ndim == 0:
+        deviation.update(original, reproduced)
+        return
+    # Blocks along the first axis of about ARRAY_CHUNK_VALUES values, read from the memory maps
+    step = max(1, ARRAY_CHUNK_VALUES // max(1, original[0].size))
+    for start in range(0, original.shape[0], step):
+        deviation.update(original[start:start + step], reproduced[start:start + step])
+
+
+def _is_numeric_line(line: str, delimiter: str) -> bool:
+    try:
+        for token in line.split(delimiter):
+            if token.strip():
+                float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def _compare_text(original_path: str, reproduced_path: str, deviation: _Deviation, chunk_rows: int):
+    import numpy as np # pylint: disable=import-outside-toplevel
+    delimiter = TEXT_DELIMITERS[os.path.splitext(original_path)[1].lower()]
+    with open(original_path, 'r', encoding='utf-8') as original_file, \
+         open(reproduced_path, 'r', encoding='utf-8') as reproduced_file:
+        line_number = 0
+        # Header lines must be identical
+        while True:
+            original_line = original_file.readline()
+            reproduced_line = reproduced_file.readline()
+            if not original_line or _is_numeric_line(original_line, delimiter):
+                break
+            line_number += 1
+            if original_line != reproduced_line:
+                raise ValueError(f"line {line_number} differs")
+        # the first numeric lines were already read
+        pending = ([original_line] if original_line else [], [reproduced_line] if reproduced_line else [])
+        while True:
+            original_block = pending[0] + list(itertools.islice(original_file, chunk_rows))
+            reproduced_block = pending[1] + list(itertools.islice(reproduced_file, chunk_rows))
+            pending = ([], [])
+            if len(original_block) != len(reproduced_block):
+                raise ValueError("different number of lines")
+            if not original_block:
+                return
+            try:
+                original = np.loadtxt(original_block, delimiter=delimiter, ndmin=2)
+                reproduced = np.loadtxt(reproduced_block, delimiter=delimiter, ndmin=2)
+            except ValueError as e:
+                raise ValueError(f"not numeric after line {line_number}: {e}") from e
+            if original.shape != reproduced.shape:
+                raise ValueError(f"different number of values after line {line_number}")
+            deviation.update(original, reproduced)
+            line_number += len(original_block)
+
+
+def compare_numeric(original_path: str, reproduced_path: str, atol: float = None, rtol: float = None,
+                    chunk_rows: int = None) -> dict:
+    """
+    Compare two numeric files value by value, block by block.
+
+    Args:
+        original_path (str): file of the original run.
+        reproduced_path (str): file of the new run.
+        atol (float, optional): absolute tolerance. Defaults to RS_NUMERIC_ATOL.
+        rtol (float, optional): relative tolerance. Defaults to RS_NUMERIC_RTOL.
+        chunk_rows (int, optional): rows of a text file compared at once. Defaults to RS_NUMERIC_CHUNK_ROWS.
+
+    Returns:
+        dict: number of values compared and outside the tolerance, maximum and mean absolute
+            deviation and whether every value is within the tolerance; or "error" if the files
+            cannot be compared as numbers.
+    """
+    deviation = _Deviation(NUMERIC_ATOL if atol is None else atol, NUMERIC_RTOL if rtol is None else rtol)
+    chunk_rows = chunk_rows or NUMERIC_CHUNK_ROWS
+    try:
+        if os.path.splitext(original_path)[1].lower() in ARRAY_EXTENSIONS:
+            _compare_arrays(original_path, reproduced_path, deviation)
+        else:
+            _compare_text(original_path, reproduced_path, deviation, chunk_rows)
+    except (OSError, ValueError, TypeError, IndexError, UnicodeDecodeError) as e:
+        return {"error": str(e), "within_tolerance": False}
+    return deviation.result()
+
+
+def _compare_pair(pair: tuple) -> dict:
+    return compare_numeric(*pair)
+
+
+def compare_numeric_files(pairs: list, workers: int = None) -> dict:
+    """
+    Compare pairs of numeric files in parallel on a process pool.
+
+    Args:
+        pairs (list): tuples of (original_path, reproduced_path).
+        workers (int, optional): number of processes. Defaults to RS_HASH_WORKERS.
+
+    Returns:
+        dict: reproduced_path -> result of compare_numeric.
+    """
+    if not pairs:
+        return {}
+    workers = max(1, min(workers or verification_engine.HASH_WORKERS, len(pairs)))
+    pairs = [(original_path, reproduced_path, NUMERIC_ATOL, NUMERIC_RTOL, NUMERIC_CHUNK_ROWS)
+             for original_path, reproduced_path in pairs]
+    if workers == 1:
+        results = [_compare_pair(pair) for pair in pairs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_compare_pair, pairs))
+    return {pair[1]: result for pair, result in zip(pairs, results)}
@@ -8,16 +8,15 @@ steps to generate the provenence for COMPSs Runtime
 import os
 import time
 
-from rocrate.rocrate import ROCrate
-from ruamel.yaml import YAML
-from utils import get_instument, get_yes_or_no, get_name_and_description, get_ro_crate_info, print_colored, TextColor
+from crate_context import CrateContext
+from utils import get_answer, get_instument, get_yes_or_no, get_name_and_description, get_ro_crate_info, print_colored, TextColor
 
-def update_yaml(crate_path: str):
+def update_yaml(crate_context: CrateContext):
     """
     Update the 'ro-crate-info.yaml' file with workflow metadata.
 
     Args:
-        crate_path (str): Path to the root directory of the RO-Crate.
+        crate_context (CrateContext): The parsed RO-Crate.
 
     Raises:
         FileNotFoundError: If the specified files or directories do not exist.
@@ -26,11 +25,12 @@ def update_yaml(crate_path: str):
         This function updates the 'ro-crate-info.yaml' file with metadata such as sources,
         main file, name, and description retrieved from the RO-Crate.
     """
-    crate = ROCrate(crate_path)
-    instrument = get_instument(crate)
+    crate_path = crate_context.crate_path
+    instrument = get_instument(crate_context)
     sources_main_file = os.path.join(crate_path, instrument)
     sources = os.path.join(crate_path, "application_sources")
-    name, description, authors = get_name_and_description(crate_path)
+    name, description, authors = get_name_and_description(crate_context)
+    from ruamel.yaml import YAML # heavy import, only needed when provenance is requested
     # Create a YAML instance
     yaml = YAML()
     yaml.preserve_quotes = True
@@ -50,11 +50,11 @@ def update_yaml(crate_path: str):
     # Ask for submitter details
     print_colored("Please provide the submitter's detail for provenance generation: ", TextColor.YELLOW)
     submitter_details = data['Submitter']
-    submitter_details['name'] = input("Submitter's Name [Name]: ").strip() or "Name"
-    submitter_details['e-mail'] = input("Submitter's E-mail [submitter@email.com]: ").strip() or "submitter@email.com"
-    submitter_details['orcid'] = input("Submitter's ORCID [https://orcid.org/XXXX-XXXX-XXXX-XXXX]: ").strip() or "https://orcid.org/XXXX-XXXX-XXXX-XXXX"
-    submitter_details['organisation_name'] = input("Submitter's Organisation Name [Submitter Institution name]: ").strip() or "Submitter Institution name"
-    submitter_details['ror'] = input("Submitter's ROR [https://ror.org/XXXXXXXXX]: ").strip() or "https://ror.org/XXXXXXXXX"
+    submitter_details['name'] = get_answer("Submitter's Name [Name]: ", "submitter.name").strip() or "Name"
+    submitter_details['e-mail'] = get_answer("Submitter's E-mail [submitter@email.com]: ", "submitter.e-mail").strip() or "submitter@email.com"
+    submitter_details['orcid'] = get_answer("Submitter's ORCID [https://orcid.org/XXXX-XXXX-XXXX-XXXX]: ", "submitter.orcid").strip() or "https://orcid.org/XXXX-XXXX-XXXX-XXXX"
+    submitter_details['organisation_name'] = get_answer("Submitter's Organisation Name [Submitter Institution name]: ", "submitter.organisation_name").strip() or "Submitter Institution name"
+    submitter_details['ror'] = get_answer("Submitter's ROR [https://ror.org/XXXXXXXXX]: ", "submitter.ror").strip() or "https://ror.org/XXXXXXXXX"
 
     # Write the updated dictionary back to the YAML file
     with open(yaml_file_path, 'w', encoding='utf-8') as file:
@@ -75,7 +75,7 @@ def provenance_info_collector(execution_path:str, service_path: str) -> bool:
         to ensure it is filled correctly. If not found or verified, it invokes 'get_ro_crate_info'
         to generate the file. It returns True if provenance collection is enabled, False otherwise.
     """
-    provenance_flag = get_yes_or_no("Do you want to generate the provenance of your workflow run?")
+    provenance_flag = get_yes_or_no("Do you want to generate the provenance of your workflow run?", "provenance")
     # print("Provenance_flag:",provenance_flag)
     if provenance_flag:
         files = os.listdir(os.getcwd())
@@ -2,27 +2,105 @@
 Remote Dataset Module
 
 This module is used to download the remote datasets mentioned in the metadata file
-and verify their size.
+and verify their size. The files are downloaded concurrently (RS_DOWNLOAD_WORKERS
+at once, at most RS_DOWNLOAD_PER_HOST from the same server), the largest first so
+that the longest transfers do not start last, and each file is verified as soon as
+its download completes. Interrupted downloads resume where they stopped (see downloader).
 """
 import os
 import sys
+import threading
+import time
 
-from rocrate.rocrate import ROCrate
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from crate_context import CrateContext
 from utils import download_file, get_Create_Action, print_colored, TextColor, get_by_id
 
+DOWNLOAD_WORKERS: int = int(os.environ.get("RS_DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_PER_HOST: int = int(os.environ.get("RS_DOWNLOAD_PER_HOST", "4"))
+
+
+def download_files(downloads: list, download_path: str, workers: int = None, per_host: int = None) -> dict:
+    """
+    Download files concurrently, the largest first, limiting the connections per host.
+
+    Args:
+        downloads (list): tuples of (file_name, url, expected size or None).
+        download_path (str): directory where the files are saved.
+        workers (int, optional): downloads at once. Defaults to RS_DOWNLOAD_WORKERS.
+        per_host (int, optional): downloads at once from the same host. Defaults to RS_DOWNLOAD_PER_HOST.
+
+    Raises:
+        OSError: If a download fails or its size is not the expected one, the downloads not
+            started yet are cancelled and the running ones stop at their next chunk.
+
+    Returns:
+        dict: file_name -> size of the downloaded file.
+    """
+    workers = max(1, workers or DOWNLOAD_WORKERS)
+    per_host = max(1, per_host or DOWNLOAD_PER_HOST)
+    # Largest first; files of unknown size may be the largest ones
+    pending = sorted(downloads, key=lambda download: -1 if download[2] is None else -download[2])
+    per_host_running = {}
+    sizes = {}
+    start = time.perf_counter()
+    cancel = threading.Event() # checked by the running downloads between chunks
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        running = {}
+        while pending or running:
+            # Start the largest downloads whose host has a free connection
+            for download in list(pending):
+                if len(running) >= workers:
+                    break
+                host = urlparse(download[1]).netloc
+                if per_host_running.get(host, 0) >= per_host:
+                    continue
+                pending.remove(download)
+                per_host_running[host] = per_host_running.get(host, 0) + 1
+                running[pool.submit(download_file, download[1], download_path, download[0], download[2],
+                                    cancel)] = (download, host)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                (file_name, url, expected_size), host = running.pop(future)
+                per_host_running[host] -= 1
+                try:
+                    size = future.result()
+                except (ValueError, OSError) as e:
+                    raise OSError(f"Remote dataset {file_name} could not be downloaded from {url}: {e}") from e
+                sizes[file_name] = size
+                if expected_size is None:
+                    print_colored(f"Remote file {file_name} has been successfully downloaded.Could not verify size as it is not mentioned in the metadata", TextColor.GREEN)
+                else: # checked by download_file
+                    print_colored(f"Remote file {file_name} has been successfully downloaded with size verified.", TextColor.GREEN)
+    except BaseException:
+        cancel.set() # the partial files are kept, the next run resumes them
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True) # do not wait for the cancelled downloads to stop
+
+    elapsed = time.perf_counter() - start
+    total = sum(sizes.values()) / (1024 * 1024)
+    print(f"Downloaded: {len(sizes)} files, {total:.1f} MiB in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed > 0 else 0:.1f} MiB/s, {workers} downloads at once)")
+    return sizes
 
-def remote_dataset(crate: ROCrate,crate_directory: str) -> bool:
+
+def remote_dataset(crate_context: CrateContext) -> bool:
     """
     Download the remote datasets mentioned in the metadata file and verify their size.
     Args:
-        crate (ROCrate): ROCrate object.
-        crate_directory (str): the path to the root directory of the RO-Crate.
+        crate_context (CrateContext): the parsed RO-Crate.
 
     Returns:
         bool: True if the remote datasets exist, False otherwise.
     """
 
-    create_action = get_Create_Action(crate)
+    crate_directory = crate_context.crate_path
+    create_action = get_Create_Action(crate_context)
     remote_datasets= {}
     if "object" in  create_action:
         temp = create_action["object"]
@@ -33,23 +111,21 @@ def remote_dataset(crate: ROCrate,crate_directory: str) -> bool:
         if (input.id).startswith("http"):
             remote_datasets[input["name"]] = input.id
 
-    for key,val in remote_datasets.items(): # download the remote datasets with the specified names
-        try:
-            print_colored(f"Please wait while remote file {key} is being downloaded from {val} ...", TextColor.YELLOW)
-            download_file(val, os.path.join(crate_directory,"remote_dataset")
-                          ,key)
-
-            if "contentSize" in get_by_id(crate,val):
-                if get_by_id(crate,val)["contentSize"] == os.path.getsize(os.path.join(crate_directory,"remote_dataset",key)):
-                    print_colored(f"Remote file {key} has been successfully downloaded with size verified.", TextColor.GREEN)
-            else:
-                print_colored(f"Remote file {key} has been successfully downloaded.Could not verify size as it is not mentioned in the metadata", TextColor.GREEN)
-
-        except ValueError:
-            print(f"Remote dataset {key} could not be downloaded.")
-            sys.exit(1)
-
     if len(remote_datasets) == 0:
         return (False, {})
 
+    downloads = [] # tuples of (file_name, url, contentSize or None)
+    for key,val in remote_datasets.items():
+        remote_object = get_by_id(crate_context,val)
+        content_size = remote_object["contentSize"] if remote_object is not None and "contentSize" in remote_object else None
+        downloads.append((key, val, content_size))
+    print_colored(f"Please wait while {len(downloads)} remote files are being downloaded ...", TextColor.YELLOW)
+    try:
+        download_files(downloads, os.path.join(crate_directory,"remote_dataset"))
+    except OSError as e:
+        print(e)
+        sys.exit(1)
+
+    crate_context.invalidate_inventory() # the downloaded files are now part of the crate
+
     return (True, remote_datasets)
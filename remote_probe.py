@@ -0,0 +1,231 @@
+"""
+Remote Probe Module
+
+Reads the metadata of a remote zipped crate without downloading it. The zip central
+directory sits at the end of the archive, so with HTTP Range requests only the tail
+of the file, the central directory and the ro-crate-metadata.json and YAML members
+are transferred (usually a few hundred KB for a crate of several GB). The service
+then shows what the run was, whether data persistence was used, the COMPSs version
+and the size of the dataset before the whole crate is downloaded.
+
+If the server ignores Range requests (it answers 200 with the whole file) or the file
+changes while it is probed, the probe is abandoned and the crate is simply downloaded.
+"""
+import http.client
+import io
+import os
+import tempfile
+import zipfile
+
+from collections import OrderedDict
+
+from crate_context import CrateContext
+from crate_extractor import METADATA_FILE_NAME, SKIPPABLE_DIRECTORIES, extract_member
+from downloader import CONTENT_RANGE, open_url
+from utils import (TextColor, get_Create_Action, get_by_id, get_compss_crate_version, get_create_action_name,
+                   get_data_persistence_status, print_colored)
+
+REMOTE_PROBE: bool = os.environ.get("RS_REMOTE_PROBE", "1").lower() not in ("0", "false", "no")
+RANGE_BLOCK_SIZE = 256 * 1024 # bytes fetched at least by each Range request
+CACHED_BLOCKS = 16
+PROBED_MEMBERS = ("compss_submission_command_line.txt",) # besides the metadata and the YAML file
+
+
+class RangeNotSupported(OSError):
+    """
+    The server does not answer Range requests, or the file changed between two requests.
+    """
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file over HTTP, each read is a Range request. The last blocks
+    read are cached, as zipfile reads the central directory in many small pieces.
+
+    Attributes:
+        url (str): URL of the file.
+        size (int): size of the remote file.
+        transferred (int): bytes received from the server.
+        requests (int): Range requests sent.
+    """
+    def __init__(self, url: str, block_size: int = RANGE_BLOCK_SIZE):
+        super().__init__()
+        self.url = url
+        self.block_size = block_size
+        self.transferred = 0
+        self.requests = 0
+        self._position = 0
+        self._blocks = OrderedDict() # offset -> data
+        self._validator = None
+        # The first request reads the tail, where the end of central directory record is
+        self.size = None
+        self._fetch(None, block_size)
+
+    def _fetch(self, start: int, length: int) -> bytes:
+        """
+        Fetch length bytes from start (the last length bytes if start is None) and cache them.
+        """
+        headers = {"Range": f"bytes=-{length}" if start is None else f"bytes={start}-{start + length - 1}"}
+        if self._validator:
+            headers["If-Range"] = self._validator # the whole file (200) if it changed
+        with open_url(self.url, headers) as response:
+            self.requests += 1
+            if response.status != 206:
+                raise RangeNotSupported(f"{self.url} does not support Range requests or changed meanwhile")
+            match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+            if not match or match.group(3) == "*":
+                raise RangeNotSupported(f"Unexpected Content-Range in the response of {self.url}")
+            data = response.read()
+            if self._validator is None:
+                self._validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        self.transferred += len(data)
+        self.size = int(match.group(3))
+        offset = int(match.group(1))
+        if len(data) != int(match.group(2)) - offset + 1:
+            raise RangeNotSupported(f"Incomplete range received from {self.url}")
+        self._blocks[offset] = data
+        if len(self._blocks) > CACHED_BLOCKS:
+            self._blocks.popitem(last=False)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def _block(self, position: int, wanted: int) -> tuple[int, bytes]:
+        """
+        Get a cached block containing the position, else fetch one from there.
+        """
+        for offset, data in reversed(self._blocks.items()):
+            if offset <= position < offset + len(data):
+                self._blocks.move_to_end(offset)
+                return offset, data
+        return position, self._fetch(position, min(max(wanted, self.block_size), self.size - position))
+
+    def readinto(self, buffer) -> int:
+        # zipfile expects full reads, so the buffer is filled across blocks
+        wanted = max(0, min(len(buffer), self.size - self._position))
+        filled = 0
+        while filled < wanted:
+            offset, data = self._block(self._position, wanted - filled)
+            start = self._position - offset
+            chunk = data[start:start + wanted - filled]
+            buffer[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+            self._position += len(chunk)
+        return filled
+
+
+def _probed(name: str) -> bool:
+    return "/" not in name and (name == METADATA_FILE_NAME or name.endswith(".yaml") or name in PROBED_MEMBERS)
+
+
+def probe_crate(url: str, destination: str) -> dict:
+    """
+    Extract the metadata and YAML members of a remote zipped crate with Range requests.
+
+    Args:
+        url (str): URL of the zipped crate.
+        destination (str): directory where the members are extracted.
+
+    Raises:
+        RangeNotSupported: If the server does not support Range requests.
+        zipfile.BadZipFile: If the remote file is not a zip file.
+        OSError: If the server cannot be reached.
+
+    Returns:
+        dict: size of the archive, number of members, number and size of the dataset files,
+            bytes transferred and requests sent.
+    """
+    with HTTPRangeFile(url) as remote_file, zipfile.ZipFile(remote_file, 'r') as zip_file:
+        members = zip_file.infolist()
+        if not any(info.filename == METADATA_FILE_NAME for info in members):
+            raise zipfile.BadZipFile(f"{METADATA_FILE_NAME} not found in the archive")
+        for info in members:
+            if _probed(info.filename):
+                extract_member(zip_file, info, destination)
+        dataset = [info for info in members if info.filename.startswith(SKIPPABLE_DIRECTORIES) and not info.is_dir()]
+        return {
+            "archive_size": remote_file.size,
+            "members": len(members),
+            "dataset_files": len(dataset),
+            "dataset_size": sum(info.file_size for info in dataset),
+            "transferred": remote_file.transferred,
+            "requests": remote_file.requests,
+        }
+
+
+def _remote_inputs_size(crate_context: CrateContext) -> tuple[int, int]:
+    """
+    Number and total contentSize of the remote inputs of the crate.
+    """
+    create_action = get_Create_Action(crate_context)
+    if create_action is None or "object" not in create_action:
+        return 0, 0
+    count, size = 0, 0
+    for item in create_action["object"]:
+        if item.id.startswith("http"):
+            count += 1
+            entity = get_by_id(crate_context, item.id)
+            if entity is not None and "contentSize" in entity:
+                size += int(entity["contentSize"])
+    return count, size
+
+
+def print_probe_summary(crate_context: CrateContext, probe: dict):
+    """
+    Print what the service knows about the crate before it is downloaded.
+    """
+    def fact(getter):
+        try:
+            return getter(crate_context)
+        except Exception: # pylint: disable=broad-except
+            return "unknown"
+
+    mib = 1024 * 1024
+    print_colored("Remote crate summary (only its metadata was downloaded):", TextColor.BLUE)
+    print(f"  Run: {fact(get_create_action_name)}")
+    print(f"  COMPSs version: {fact(get_compss_crate_version)}")
+    print(f"  Data persistence: {fact(get_data_persistence_status)}")
+    print(f"  Archive: {probe['archive_size'] / mib:.1f} MiB, {probe['members']} files")
+    print(f"  Dataset in the crate: {probe['dataset_files']} files, {probe['dataset_size'] / mib:.1f} MiB uncompressed")
+    remote_inputs = fact(_remote_inputs_size)
+    if remote_inputs != "unknown" and remote_inputs[0]:
+        print(f"  Remote inputs: {remote_inputs[0]} files, {remote_inputs[1] / mib:.1f} MiB to download")
+    print(f"  ({probe['transferred'] / 1024:.0f} KiB transferred in {probe['requests']} requests)")
+
+
+def probe_remote_crate(url: str) -> bool:
+    """
+    Show the summary of a remote zipped crate before downloading it.
+
+    Args:
+        url (str): URL of the zipped crate.
+
+    Returns:
+        bool: True if the crate could be probed, False if it must be downloaded to be inspected.
+    """
+    with tempfile.TemporaryDirectory(prefix="rs_probe_") as probe_directory:
+        try:
+            probe = probe_crate(url, probe_directory)
+        except (OSError, ValueError, zipfile.BadZipFile, http.client.HTTPException) as e:
+            print_colored(f"The crate could not be probed before downloading it ({e})", TextColor.YELLOW)
+            return False
+        crate_context = CrateContext(probe_directory, backend="stream") # whatever the size of the metadata
+        print_probe_summary(crate_context, probe)
+    return True
@@ -2,29 +2,47 @@
 Address Mapper Module
 
 This module provides functionality to map and convert addresses of datasets
-within a given directory structure. It includes the following functions:
-
-# Problems:
-# IF THE DIRECTORY IS TAKEN IN THE FORM OF DATA/INPUT INSTED OF DATA/INPUT/
-# THEN IT WILL NOT BE ABLE TO FIND THE DIRECTORY
-# DO NOT INCLUDE DOUBLE SLASHES IN THE PATHS LIKE INPUT//TEXT.TXT IT WILL NOT FIND IT
+within a given directory structure. Each address of the original run is mapped
+to the longest suffix of it that is a file or directory of the crate, looked up
+in the suffix index of the crate inventory (see crate_inventory.SuffixIndex):
+O(depth) per address and no filesystem probes, so commands with hundreds of
+paths are mapped in milliseconds.
+
+Addresses ending with a slash only match directories. Empty segments
+(INPUT//TEXT.TXT) and "." segments are ignored.
 """
 
 import os
 
+from crate_inventory import CrateInventory
+from status_report import MAX_PRINTED_PATHS
+from utils import print_colored, TextColor
+
 # TO-DO:
 # change address converter backend such that if a file/directory matches with
 # any result object then mak a new folder with same name if directory inside the Results/ and map it there
 # else it is assumed to be a application source or a dataset file/dir
-def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> str:
+def address_segments(addr: str) -> tuple[list, bool]:
+    """
+    Split an address in its segments, ignoring empty and "." segments.
+
+    Returns:
+        tuple[list, bool]: the segments, and whether the address is a directory (ends with a slash).
     """
-    Converts the given address to a mapped address inside the RO_Crate
-    based on the dataset hashmap.
+    return [segment for segment in addr.split("/") if segment not in ("", ".")], addr.endswith("/")
+
+def address_converter_backend(path: str, addr: str, dataset_hashmap: dict,
+                              inventory: CrateInventory = None) -> str:
+    """
+    Converts the given address to a mapped address inside the RO_Crate: the longest
+    suffix of the address that is a path under the base path.
 
     Args:
         path (str): The base path of the dataset.
         addr (str): The address to be converted.
-        dataset_hashmap (dict): A dictionary containing the mapping of dataset addresses.
+        dataset_hashmap (dict): A dictionary containing the mapping of dataset addresses,
+            every mapped address starts with one of them.
+        inventory (CrateInventory, optional): Inventory of the crate, walked once if not given.
 
     Returns:
         str: The mapped address corresponding to the given address.
@@ -32,52 +50,26 @@ def address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> st
     Raises:
         FileNotFoundError: If the mapped address for the given address is not found.
     """
-    filename = None
-    mapped_addr = None
-
-    if addr.startswith("./"):
-        addr = addr[1:]
-
-    if not addr.startswith("/"):
-        addr = "/" + addr
-
-    # Check if the address is a file or a directory and split it accordingly
-    if addr.endswith("/"):
-        addr_list = addr.split("/")
-    else:
-        addr_list = addr.split("/")
-        filename = addr_list.pop()
-
-    for i in range(1, len(addr_list)):
-        if addr_list[i] in dataset_hashmap:
-            temp_addr = os.path.join(path, addr_list[i])
-            for j in range(i + 1, len(addr_list)):
-                temp_addr = os.path.join(temp_addr, addr_list[j])
-
-            if os.path.exists(temp_addr):
-                mapped_addr = temp_addr
-                break
-
-    # If the address is a file, append the filename and check if exists
-    if filename:
-        if not mapped_addr:
-            mapped_addr = path
-        mapped_addr = os.path.join(mapped_addr, filename)
-        if not os.path.exists(mapped_addr):
-            raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
+    segments, directory = address_segments(addr)
+    if any(segment in dataset_hashmap for segment in segments):
+        if inventory is None:
+            inventory = CrateInventory(path)
+        matched = inventory.suffix_index(path).longest_suffix(segments, directory)
+        if matched:
+            mapped_addr = os.path.join(path, *segments[-matched:])
+            return os.path.join(mapped_addr, "") if directory else mapped_addr
 
     # Could not find such directory or file
-    if not mapped_addr:
-        raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
-
-    return mapped_addr
+    raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
 
 def address_converter(path: str, addr: str, dataset_hashmap: dict,
-                      application_sources_hashmap: dict,remote_dataset_hashmap:dict, dataset_flags: tuple[bool, bool]) -> str:
+                      application_sources_hashmap: dict,remote_dataset_hashmap:dict, dataset_flags: tuple[bool, bool],
+                      inventory: CrateInventory = None, ambiguous: list = None) -> str:
     """
     Attempts to convert the given address first using the dataset hashmap and
     then using the application sources hashmap. Raises a `FileNotFoundError` if
-    the address  cannot be mapped in either case.
+    the address  cannot be mapped in either case. When the address is found in
+    several of them the first one is used and the match is reported as ambiguous.
 
     Args:
         path (str): Path to the RO_Crate directory.
@@ -86,6 +78,9 @@ def address_converter(path: str, addr: str, dataset_hashmap: dict,
         application_sources_hashmap (dict): Hashmap generated from addr_extractor.
         remote_dataset_hashmap (dict): Hashmap generated from addr_extractor.
         dataset_flags (tuple[bool, bool]): (remote_dataset_flag, new_dataset_flag)
+        inventory (CrateInventory, optional): Inventory of the crate, to avoid probing the filesystem.
+        ambiguous (list, optional): collects the (address, mapped addresses) found in several
+            places, to report them together (see report_ambiguous_addresses). Printed at once if not given.
 
     Raises:
         FileNotFoundError: Cannot find the address inside the RO_Crate.
@@ -110,14 +105,39 @@ def address_converter(path: str, addr: str, dataset_hashmap: dict,
     if dataset_flags[0]:
         paths_to_try.insert(0,(os.path.join(path, "remote_dataset"), remote_dataset_hashmap, "Remote Dataset Error"))
 
-    for path, hashmap, error_context in paths_to_try: # try all the paths one by one and return where
-        try:                                           # file is found,if not found append the error to the list
-            return address_converter_backend(path, addr, hashmap)
+    mapped = []
+    for path, hashmap, error_context in paths_to_try: # try all the paths, the first one where the file is
+        try:                                           # found is used, if not found append the error to the list
+            mapped.append(address_converter_backend(path, addr, hashmap, inventory))
         except FileNotFoundError as e:
             errors.append((error_context, e))
 
-    handle_address_conversion_failure(addr, errors)
-def addr_extractor(path: str) -> dict:
+    if not mapped:
+        handle_address_conversion_failure(addr, errors)
+    if len(mapped) > 1:
+        if ambiguous is None:
+            report_ambiguous_addresses([(addr, mapped)])
+        else:
+            ambiguous.append((addr, mapped))
+    return mapped[0]
+
+def report_ambiguous_addresses(ambiguous: list):
+    """
+    Warn about the addresses found in several folders of the crate, printing at most
+    MAX_PRINTED_PATHS of them.
+
+    Args:
+        ambiguous (list): tuples of (address, mapped addresses), the first one is the one used.
+    """
+    if not ambiguous:
+        return
+    print_colored(f"{len(ambiguous)} paths of the command were found in several folders of the crate, "
+                  "the first match is used:", TextColor.YELLOW)
+    for addr, mapped in ambiguous[:MAX_PRINTED_PATHS]:
+        print(f"  {addr} -> {mapped[0]} (also {', '.join(mapped[1:])})")
+    if len(ambiguous) > MAX_PRINTED_PATHS:
+        print(f"  ... and {len(ambiguous) - MAX_PRINTED_PATHS} more")
+def addr_extractor(path: str, inventory: CrateInventory = None) -> dict:
     """
     Extracts the addresses of datasets in the given path. For this particular case,
     it is used to extract the mapping of filenames in the crate/dataset and
@@ -125,14 +145,19 @@ def addr_extractor(path: str) -> dict:
 
     Args:
         path (str): The path to the directory containing the datasets.
+        inventory (CrateInventory, optional): Inventory of the crate, to avoid listing the directory again.
 
     Returns:
         dict: A dictionary mapping dataset filenames to a value of 1.
     """
-    if not os.path.exists(path):
-        os.makedirs(path)
+    if inventory is not None and inventory.exists(path):
+        filenames = inventory.listdir(path)
+    else:
+        if not os.path.exists(path):
+            os.makedirs(path)
+        filenames = os.listdir(path)
     hash_map = {}
-    for filename in os.listdir(path):
+    for filename in filenames:
         hash_map[filename] = 1
 
     return hash_map
@@ -14,9 +14,10 @@ import os
 import shlex
 import re
 
-from rocrate.rocrate import ROCrate
-from .address_mapper import address_converter, addr_extractor
-from .utilsr import get_file_names, get_results_dict, check_slurm_cluster
+from command_plan import map_command
+from crate_context import CrateContext
+from .address_mapper import address_converter, addr_extractor, report_ambiguous_addresses
+from .utilsr import get_results_dict, check_slurm_cluster
 
 def generate_command_line(self, sub_directory_path:str) -> list[str]:
     """
@@ -31,25 +32,26 @@ def generate_command_line(self, sub_directory_path:str) -> list[str]:
     """
     # print('\nParsing metadata from: ', self.crate_directory)
     path = self.crate_directory
+    inventory = self.crate_context.inventory
     dataset_flags = (self.remote_dataset_flag, self.new_dataset_flag)
 
     remote_dataset_hashmap = {}
     if self.remote_dataset_flag:
-        remote_dataset_hashmap = addr_extractor(os.path.join(path, "remote_dataset"))
+        remote_dataset_hashmap = addr_extractor(os.path.join(path, "remote_dataset"), inventory)
 
     if not self.new_dataset_flag:
-        dataset_hashmap = addr_extractor(os.path.join(path, "dataset"))
+        dataset_hashmap = addr_extractor(os.path.join(path, "dataset"), inventory)
     else:
-        dataset_hashmap = addr_extractor(os.path.join(path, "new_dataset"))
+        dataset_hashmap = addr_extractor(os.path.join(path, "new_dataset"), inventory)
 
-    application_sources_hashmap = addr_extractor(os.path.join(path, "application_sources"))
+    application_sources_hashmap = addr_extractor(os.path.join(path, "application_sources"), inventory)
 
     compss_submission_command_path = os.path.join(path, "compss_submission_command_line.txt")
 
     with open(compss_submission_command_path, 'r', encoding='utf-8') as file:
         compss_submission_command = next(file).strip()
 
-    new_command = command_line_generator(compss_submission_command, path,
+    new_command = command_line_generator(compss_submission_command, self.crate_context,
                                      dataset_hashmap, application_sources_hashmap,remote_dataset_hashmap,dataset_flags,self.remote_dataset_flag, sub_directory_path)
 
     return new_command
@@ -89,7 +91,7 @@ def is_result(filepath:str,results_dict:dict, sub_directory_path:str)->str:
 
     return None # if it is not a result
 
-def command_line_generator(command: str, path: str, dataset_hashmap: dict,
+def command_line_generator(command: str, crate_context: CrateContext, dataset_hashmap: dict,
                            application_sources_hashmap: dict, remote_dataset_hashmap: dict, dataset_flags: tuple[bool,bool],remote_dataset_flag:bool, sub_directory_path:str) -> list[str]:
     """
     Generates a modified command line by replacing paths in the command with their
@@ -98,84 +100,57 @@ def command_line_generator(command: str, path: str, dataset_hashmap: dict,
 
     Args:
         command (str): Original command line string.
-        path (str): Path to the RO_Crate directory.
+        crate_context (CrateContext): The parsed RO_Crate.
         dataset_hashmap (dict): Hashmap generated from addr_extractor.
         application_sources_hashmap (dict): Hashmap generated from addr_extractor.
 
     Returns:
         list[str]: Modified command line arguments with mapped paths.
     """
+    path = crate_context.crate_path
     command = shlex.split(command)
-    flags = []
-    paths = []
-    values = []
-    # print(1)
-    # print(path)
-    files_a = get_file_names(os.path.join(path, "application_sources"))
-    files_d = get_file_names(os.path.join(path, "dataset"))
-    files_r  = get_file_names(os.path.join(path, "remote_dataset"))
-
-    crate = ROCrate(path)
-    results_dict = get_results_dict(crate)
-
-    for i, cmd in enumerate(command):
-        if cmd.startswith("--") or cmd.startswith("-"):
-            if not (cmd.startswith("--provenance") or cmd.startswith("-p")):
-                flags.append((cmd, i))
-        elif re.compile(r'[/\\]').search(cmd): # Pattern for detecting paths
-            paths.append((cmd, i))
-        else:
-            if results_dict and cmd in results_dict:
-                result_path = os.path.join(sub_directory_path, "Result")
-                if not os.path.exists(result_path):
-                    os.mkdir(result_path)
-                values.append((os.path.join(result_path, cmd), i))
-            elif remote_dataset_flag and cmd in files_r:
-                values.append((files_r[cmd], i))
-            elif cmd in files_a:
-                values.append((files_a[cmd], i))
-            elif cmd in files_d:
-                values.append((files_d[cmd], i))
-            else:
-                values.append((cmd, i))
-
-    new_paths = []
-
-    for filepath in paths:
-        pathr = is_result(filepath[0], results_dict, sub_directory_path)
-
-        if pathr: # if it is a result then it is specially mapped inside Result/ in the sub-dir
-            new_paths.append((pathr, filepath[1]))
-
-        else: # it is treated as a normal path inside application_sources or dataset
-            new_filepath = address_converter(path, filepath[0], dataset_hashmap,
-                                    application_sources_hashmap, remote_dataset_hashmap, dataset_flags)
-            new_paths.append((new_filepath, filepath[1]))
-
-
-    paths = new_paths
-
-    p1 = 0
-    p2 = 0
-
-    new_command = []
-    # for this to work paths and value must be sorted by index
-    values = sorted(values, key=lambda x: x[1]) # needed to add this because of appending result paths at the end
-    while p1 < len(paths) and p2 < len(values):
-        if paths[p1][1] < values[p2][1]:
-            new_command.append(paths[p1][0])
-            p1 += 1
-        else:
-            new_command.append(values[p2][0])
-            p2 += 1
-
-    while p1 < len(paths):
-        new_command.append(paths[p1][0])
-        p1 += 1
-
-    while p2 < len(values):
-        new_command.append(values[p2][0])
-        p2 += 1
+    inventory = crate_context.inventory # one directory walk shared by all the lookups below
+    results_dict = get_results_dict(crate_context)
+    ambiguous = [] # paths found in several folders of the crate, reported together
+
+    dataset_folder = "new_dataset" if dataset_flags[1] else "dataset"
+    searched = [dataset_folder, "application_sources"] # folders address_converter searches
+    if dataset_flags[0]:
+        searched.insert(0, "remote_dataset")
+    file_names = {} # folder -> file names, only listed if a value has to be resolved
+
+    def files(folder: str) -> dict:
+        if folder not in file_names:
+            file_names[folder] = inventory.file_names(os.path.join(path, folder))
+        return file_names[folder]
+
+    def resolve(_, cmd: str) -> tuple:
+        if cmd.startswith("--") or cmd.startswith("-"): # flags are not kept
+            return None, []
+        if re.compile(r'[/\\]').search(cmd): # Pattern for detecting paths
+            pathr = is_result(cmd, results_dict, sub_directory_path)
+            if pathr: # if it is a result then it is specially mapped inside Result/ in the sub-dir
+                return pathr, []
+            # it is treated as a normal path inside application_sources or dataset
+            return address_converter(path, cmd, dataset_hashmap, application_sources_hashmap,
+                                     remote_dataset_hashmap, dataset_flags, inventory, ambiguous), searched
+        if results_dict and cmd in results_dict:
+            result_path = os.path.join(sub_directory_path, "Result")
+            if not os.path.exists(result_path):
+                os.mkdir(result_path)
+            return os.path.join(result_path, cmd), []
+        if remote_dataset_flag and cmd in files("remote_dataset"):
+            return files("remote_dataset")[cmd], ["remote_dataset"]
+        if cmd in files("application_sources"):
+            return files("application_sources")[cmd], ["remote_dataset", "application_sources"]
+        if cmd in files("dataset"):
+            return files("dataset")[cmd], ["remote_dataset", "application_sources", "dataset"]
+        return cmd, ["remote_dataset", "application_sources", "dataset"]
+
+    new_command = map_command(crate_context, "standard", command, (dataset_flags, remote_dataset_flag),
+                              list(dict.fromkeys(["remote_dataset", dataset_folder, "dataset", "application_sources"])),
+                              os.path.join(sub_directory_path, "Result"), resolve)
+    report_ambiguous_addresses(ambiguous)
 
     if check_slurm_cluster()[0]:
         new_command[0] = "enqueue_compss"
@@ -3,9 +3,9 @@ Utils Module for reproducibility_methods module
 
 """
 import os
-import subprocess
 
-from rocrate.rocrate import ROCrate
+from crate_context import CrateContext
+from environment_probe import probe_slurm_cluster
 
 def get_file_names(folder_path: str) -> dict:
     """
@@ -18,20 +18,18 @@ def get_file_names(folder_path: str) -> dict:
     return file_names
 
 
-def get_Create_Action(entity:ROCrate):
+def get_Create_Action(crate_context: CrateContext):
     """
-    Get the Create Action entity from the ROCrate
+    Get the Create Action entity from the crate type index
     """
-    for entity in entity.get_entities():
-        if entity.type == "CreateAction":
-            return entity
-    return None
+    create_actions = crate_context.get_by_type("CreateAction")
+    return create_actions[0] if create_actions else None
 
-def get_results_dict(entity:ROCrate):
+def get_results_dict(crate_context: CrateContext):
     """
     Get the results dictionary from the Create Action entity
     """
-    createAction = get_Create_Action(entity)
+    createAction = get_Create_Action(crate_context)
     results= {}
     if "result" in createAction: # It is not necessary to have inputs/objects in Create Action
         temp = createAction["result"]
@@ -45,14 +43,10 @@ def get_results_dict(entity:ROCrate):
 def check_slurm_cluster() -> tuple[bool, str]:
     """
     To check if the program is running on a SLURM cluster.
+    The check is done once per process, see environment_probe.
 
     Returns:
         tuple[bool, str]: tuple of a boolean indicating if the program
             is running on a SLURM cluster and a message.
     """
-    try:
-        result = subprocess.run(['squeue'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return True, result.stdout
-    except Exception as e:
-        return False, str(e)
+    return probe_slurm_cluster()
@@ -0,0 +1,251 @@
+"""
+Result Verification Module
+
+Final step of the reproduction: compares the results created by the new run in
+Result/ with the results of the original run listed in CreateAction["result"].
+Every original result file is paired with its reproduced counterpart by name and
+by the longest common path suffix. Their sizes are compared, and their contents
+are hashed in parallel, streaming large files. The reference is the original file
+when it is still available (in the crate or at its original path), else the
+sha256 and contentSize recorded in the crate. Numeric results that differ only in
+the last bits can be accepted within a tolerance (see numeric_compare).
+"""
+import os
+import stat
+
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from crate_context import CrateContext
+from crate_inventory import CrateInventory
+from numeric_compare import (
+    NUMERIC_ATOL, NUMERIC_COMPARE, NUMERIC_RTOL, compare_numeric_files, is_numeric_file, numpy_available
+)
+from status_report import ReportWriter, report_file_status
+from utils import get_by_id, get_results_dict, print_colored, TextColor
+from verification_engine import HASH_ALGORITHM, cache_digests, cached_hash_files, record_digests, stat_files
+
+
+def _original_path(crate_context: CrateContext, entity_id: str) -> str:
+    """
+    Local path of an original result: inside the crate for relative ids, the
+    original path for file:// ids, None for remote ones.
+    """
+    if entity_id.startswith("http"):
+        return None
+    if entity_id.startswith("file://"):
+        return urlparse(entity_id).path
+    return os.path.join(crate_context.crate_path, entity_id)
+
+
+def _result_files(crate_context: CrateContext) -> list:
+    """
+    Get the original result entities, replacing the directories by their parts.
+
+    Returns:
+        list: tuples of (result_name, entity) for every result file or directory without parts.
+    """
+    results = []
+    for name, entity_id in get_results_dict(crate_context).items():
+        entity = get_by_id(crate_context, entity_id)
+        if entity is not None and "hasPart" in entity:
+            results.extend((part["name"] if "name" in part else os.path.basename(part.id.rstrip("/")), part)
+                           for part in entity["hasPart"])
+        else:
+            results.append((name, entity if entity is not None else entity_id))
+    return results
+
+
+def pair_results(crate_context: CrateContext, result_dir: str) -> list:
+    """
+    Pair each original result with the file of the new run it corresponds to.
+    Among the reproduced files with the same name, the one sharing the longest
+    path suffix with the original result is chosen.
+
+    Args:
+        crate_context (CrateContext): The parsed RO-Crate.
+        result_dir (str): Directory holding the results of the new run.
+
+    Returns:
+        list: tuples of (result_name, entity_id, original_path, reproduced_path),
+            reproduced_path being None if the new run did not create the result.
+    """
+    by_name = defaultdict(list) # file name -> paths relative to result_dir
+    if os.path.isdir(result_dir):
+        inventory = CrateInventory(result_dir)
+        for relative_path in inventory.entries:
+            by_name[os.path.basename(relative_path)].append(relative_path)
+
+    pairs = []
+    for name, entity in _result_files(crate_context):
+        entity_id = entity if isinstance(entity, str) else entity.id
+        original_path = _original_path(crate_context, entity_id)
+        components = urlparse(entity_id).path.rstrip("/").split("/")
+        candidates = by_name.get(components[-1]) or by_name.get(name) or []
+        best, best_len = None, -1
+        for candidate in candidates:
+            candidate_components = candidate.split(os.sep)
+            common = 0
+            while (common < min(len(components), len(candidate_components))
+                   and components[-1 - common] == candidate_components[-1 - common]):
+                common += 1
+            if common > best_len:
+                best, best_len = candidate, common
+        reproduced_path = os.path.join(result_dir, best) if best is not None else None
+        pairs.append((name, entity_id, original_path, reproduced_path))
+    return pairs
+
+
+def result_verifier(crate_context: CrateContext, result_dir: str, log_dir: str = None) -> bool:
+    """
+    Compare the results of the new run with the results of the original run and
+    report a reproducibility verdict.
+
+    Args:
+        crate_context (CrateContext): The parsed RO-Crate.
+        result_dir (str): Directory holding the results of the new run.
+        log_dir (str, optional): Directory where the per-file report and the digests are recorded.
+
+    Returns:
+        bool: True if every original result was reproduced with the same content.
+    """
+    pairs = pair_results(crate_context, result_dir)
+    if not pairs:
+        print_colored("No results recorded in the crate, so nothing to compare", TextColor.YELLOW)
+        return True
+    print_colored(f"Comparing the {len(pairs)} results of the original run with the new ones", TextColor.YELLOW)
+
+    # The original result files of a crate opened lazily may still be in its archive
+    inventory = crate_context.inventory
+    original_files = []
+    for _, _, original_path, _ in pairs:
+        relative_path = inventory.relative(original_path) if original_path else None
+        entry = inventory.entries.get(relative_path) if relative_path else None
+        if entry is not None and not entry.is_dir:
+            original_files.append(original_path)
+    inventory.materialize(original_files)
+    stats = stat_files([path for _, _, original_path, reproduced_path in pairs
+                        for path in (original_path, reproduced_path) if path])
+
+    # Reference of every reproduced file: the original file, or the digest and size recorded in the crate
+    references = {} # reproduced_path -> (original_path or None, expected digest or None, expected size or None)
+    for _, entity_id, original_path, reproduced_path in pairs:
+        reproduced_stat = stats.get(reproduced_path) if reproduced_path else None
+        if reproduced_stat is None or stat.S_ISDIR(reproduced_stat.st_mode):
+            continue
+        original_stat = stats.get(original_path) if original_path else None
+        entity = get_by_id(crate_context, entity_id)
+        if original_stat is not None and not stat.S_ISDIR(original_stat.st_mode):
+            references[reproduced_path] = (original_path, None, original_stat.st_size)
+        elif entity is not None and (HASH_ALGORITHM in entity or "contentSize" in entity):
+            references[reproduced_path] = (None,
+                                           entity[HASH_ALGORITHM] if HASH_ALGORITHM in entity else None,
+                                           entity["contentSize"] if "contentSize" in entity else None)
+
+    # Compare the sizes first, only the files of the expected size need to be hashed
+    size_mismatch = {reproduced_path for reproduced_path, (_, _, size) in references.items()
+                     if size is not None and stats[reproduced_path].st_size != size}
+    to_hash = []
+    for reproduced_path, (original_path, expected_digest, _) in references.items():
+        if reproduced_path in size_mismatch:
+            continue
+        if original_path is not None:
+            to_hash.extend((original_path, reproduced_path))
+        elif expected_digest:
+            to_hash.append(reproduced_path)
+    digests, signatures = cached_hash_files(to_hash, stats)
+    cache_digests(digests, signatures, {})
+    if log_dir and digests:
+        record_digests(digests, log_dir)
+
+    same_content = {} # reproduced_path -> True if the content is the same as the original
+    for reproduced_path, (original_path, expected_digest, _) in references.items():
+        if reproduced_path in size_mismatch:
+            same_content[reproduced_path] = False
+        elif original_path is not None:
+            same_content[reproduced_path] = (digests.get(reproduced_path) is not None
+                                             and digests.get(reproduced_path) == digests.get(original_path))
+        elif expected_digest:
+            same_content[reproduced_path] = digests.get(reproduced_path) == expected_digest.lower()
+        else:
+            same_content[reproduced_path] = True # only the size is recorded in the crate
+    within_tolerance = numeric_verifier(references, same_content, log_dir)
+
+    status = [] # tuple of (result_name, reproduced_path, reproduced, same_content)
+    missing = []
+    different = []
+    unchecked = []
+    for name, entity_id, original_path, reproduced_path in pairs:
+        if reproduced_path is None:
+            missing.append(entity_id)
+            status.append((name, entity_id, 0, 0))
+            continue
+        if reproduced_path not in references:
+            unchecked.append(reproduced_path)
+            status.append((name, reproduced_path, 1, 2))
+            continue
+        same = same_content[reproduced_path] or reproduced_path in within_tolerance
+        if not same:
+            different.append(reproduced_path)
+        status.append((name, reproduced_path, 1, 1 if same else 0))
+
+    print_colored("RESULTS TABLE (results of the original run compared with the new ones):", TextColor.YELLOW)
+    report_file_status(status, "Reproduced", log_dir, name="result_status", fourth_field="Content")
+
+    if missing:
+        print_colored(f"Results not created by the new run: {len(missing)}", TextColor.RED)
+    if different:
+        print_colored(f"Results with a different content: {len(different)}", TextColor.RED)
+    if unchecked:
+        print_colored(f"Results without a reference to compare with: {len(unchecked)}", TextColor.YELLOW)
+    reproduced = not missing and not different
+    if reproduced:
+        identical = len(pairs) - len(unchecked) - len(within_tolerance)
+        tolerance_note = f" and {len(within_tolerance)} within the numeric tolerance" if within_tolerance else ""
+        print_colored(f"VERDICT: REPRODUCED, {identical} results identical to the original run{tolerance_note}", TextColor.GREEN)
+    else:
+        print_colored("VERDICT: NOT REPRODUCED, the results differ from the original run", TextColor.RED)
+    return reproduced
+
+
+def numeric_verifier(references: dict, same_content: dict, log_dir: str = None) -> set:
+    """
+    Compare value by value, under the numeric tolerance, the numeric results whose
+    bytes differ from the original file (RS_NUMERIC_COMPARE, needs NumPy).
+
+    Args:
+        references (dict): reproduced_path -> (original_path or None, expected digest, expected size).
+        same_content (dict): reproduced_path -> True if the bytes are the same as the original.
+        log_dir (str, optional): Directory where the deviation of every file is exported.
+
+    Returns:
+        set: reproduced paths whose values are all within the tolerance.
+    """
+    candidates = [(original_path, reproduced_path) for reproduced_path, (original_path, _, _) in references.items()
+                  if not same_content[reproduced_path] and original_path is not None and is_numeric_file(reproduced_path)]
+    if not NUMERIC_COMPARE or not candidates:
+        return set()
+    if not numpy_available():
+        print_colored(f"NumPy is not installed, {len(candidates)} numeric results are only compared byte by byte", TextColor.YELLOW)
+        return set()
+
+    print_colored(f"Comparing {len(candidates)} numeric results with atol={NUMERIC_ATOL} and rtol={NUMERIC_RTOL}", TextColor.YELLOW)
+    comparisons = compare_numeric_files(candidates)
+    within_tolerance = set()
+    fields = ["file_path", "values", "outside_tolerance", "max_deviation", "mean_deviation", "within_tolerance", "error"]
+    with ReportWriter(log_dir, "numeric_comparison", fields) as writer:
+        for reproduced_path, comparison in comparisons.items():
+            writer.write((reproduced_path,) + tuple(comparison.get(field) for field in fields[1:]))
+            if comparison["within_tolerance"]:
+                within_tolerance.add(reproduced_path)
+                print(f"{reproduced_path}: within tolerance (max deviation {comparison['max_deviation']:.3g}, "
+                      f"mean {comparison['mean_deviation']:.3g})")
+            elif "error" in comparison:
+                print_colored(f"{reproduced_path}: cannot be compared as numbers: {comparison['error']}", TextColor.RED)
+            else:
+                print_colored(f"{reproduced_path}: {comparison['outside_tolerance']} of {comparison['values']} values "
+                              f"outside tolerance (max deviation {comparison['max_deviation']:.3g}, "
+                              f"mean {comparison['mean_deviation']:.3g})", TextColor.RED)
+    if writer.path:
+        print(f"Numeric comparison report written to {writer.path}")
+    return within_tolerance
@@ -0,0 +1,197 @@
+"""
+Status Report Module
+
+Reports the verification results of the crate files. Big crates can reference
+hundreds of thousands of files, so besides the full table the results can be
+reported as a summary (counts per status) or as a table streamed row by row that
+only shows the failures. Every row is also exported to the log directory as JSON
+lines or CSV for later processing. Rows are processed one at a time, so memory use
+does not depend on the size of the crate.
+
+The mode is set with RS_REPORT_MODE (auto, full, failures or summary) and the
+export format with RS_REPORT_FORMAT (jsonl, csv or none).
+"""
+import csv
+import json
+import os
+
+from collections import Counter
+from utils import TextColor, generate_file_status_table, get_status_symbol, print_colored, print_symbol_reference
+
+REPORT_MODES = ("auto", "full", "failures", "summary")
+REPORT_FORMATS = ("jsonl", "csv", "none")
+REPORT_MODE: str = os.environ.get("RS_REPORT_MODE", "auto").lower()
+REPORT_FORMAT: str = os.environ.get("RS_REPORT_FORMAT", "jsonl").lower()
+FULL_TABLE_LIMIT: int = int(os.environ.get("RS_REPORT_FULL_TABLE_LIMIT", "200")) # rows, in auto mode
+MAX_PRINTED_PATHS: int = 20
+NAME_WIDTH = 40
+PATH_WIDTH = 60
+
+
+class ReportWriter:
+    """
+    Writes report rows to a JSON lines or CSV file as they come.
+
+    Attributes:
+        path (str): path of the report file, None if nothing is exported.
+    """
+    def __init__(self, log_dir: str, name: str, fields: list, export_format: str = None):
+        export_format = (export_format or REPORT_FORMAT).lower()
+        if export_format not in REPORT_FORMATS:
+            print_colored(f"Unknown report format {export_format}, using jsonl", TextColor.YELLOW)
+            export_format = "jsonl"
+        self.fields = fields
+        self.format = export_format
+        self.path = None
+        self._file = None
+        self._csv = None
+        if log_dir and export_format != "none":
+            self.path = os.path.join(log_dir, f"{name}.{export_format}")
+            self._file = open(self.path, 'w', encoding='utf-8', newline='')
+            if export_format == "csv":
+                self._csv = csv.writer(self._file)
+                self._csv.writerow(fields)
+
+    def write(self, row: tuple):
+        if self._file is None:
+            return
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(dict(zip(self.fields, row))) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _fit(text: str, width: int) -> str:
+    """
+    Fit the text in a fixed width column, keeping its end (the file name) when cut.
+    """
+    text = str(text)
+    if len(text) > width:
+        text = "…" + text[len(text) - width + 1:]
+    return text.ljust(width)
+
+
+def _field_key(field: str) -> str:
+    return field.lower().replace(" ", "_").replace(".", "")
+
+
+def _status_name(value: int) -> str:
+    return {1: "ok", 0: "failed"}.get(value, "not_in_metadata")
+
+
+def report_file_status(file_status_list, third_field: str, log_dir: str = None, name: str = "file_status",
+                       mode: str = None, fourth_field: str = "Size") -> Counter:
+    """
+    Report the status of the crate files.
+
+    Args:
+        file_status_list (_type_): iterable of (file_name, file_path, third_field_status, size_status) tuples,
+            with status 1 for success, 0 for failure and 2 when the crate has no value to check.
+        third_field (str): The name of the third field in the table.
+        log_dir (str, optional): Directory where every row is exported (RS_REPORT_FORMAT).
+        name (str, optional): Name of the exported report file. Defaults to "file_status".
+        mode (str, optional): auto, full, failures or summary. Defaults to RS_REPORT_MODE;
+            auto shows the full table up to RS_REPORT_FULL_TABLE_LIMIT files, else the failures.
+        fourth_field (str, optional): The name of the fourth field in the table. Defaults to "Size".
+
+    Returns:
+        Counter: number of files per (third_field_status, size_status).
+    """
+    mode = (mode or REPORT_MODE).lower()
+    if mode not in REPORT_MODES:
+        print_colored(f"Unknown report mode {mode}, using auto", TextColor.YELLOW)
+        mode = "auto"
+    if mode == "auto":
+        size = len(file_status_list) if hasattr(file_status_list, "__len__") else None
+        mode = "full" if size is not None and size <= FULL_TABLE_LIMIT else "failures"
+    if mode == "full":
+        generate_file_status_table(file_status_list, third_field, Fourth_field=fourth_field)
+
+    counts = Counter()
+    header_printed = False
+    with ReportWriter(log_dir, name, ["file_name", "file_path", _field_key(third_field), _field_key(fourth_field)]) as writer:
+        for i, (file_name, file_path, third_status, size_status) in enumerate(file_status_list, start=1):
+            counts[(third_status, size_status)] += 1
+            writer.write((file_name, file_path, _status_name(third_status), _status_name(size_status)))
+            if mode != "failures" or (third_status != 0 and size_status != 0):
+                continue
+            if not header_printed:
+                print(f"{'#':>7} | {_fit('Metadata File Name', NAME_WIDTH)} | {_fit('Host File Path', PATH_WIDTH)} | {third_field} | {fourth_field}")
+                header_printed = True
+            third_symbol, size_symbol = get_status_symbol(third_status, size_status)
+            print(f"{i:>7} | {_fit(file_name, NAME_WIDTH)} | {_fit(file_path, PATH_WIDTH)} | {third_symbol} | {size_symbol}")
+    if header_printed:
+        print_symbol_reference()
+
+    print_status_summary(counts, third_field, fourth_field)
+    if writer.path:
+        print(f"File status report written to {writer.path}")
+    return counts
+
+
+def print_status_summary(counts: Counter, third_field: str, fourth_field: str = "Size"):
+    """
+    Print the number of files per status.
+
+    Args:
+        counts (Counter): number of files per (third_field_status, size_status).
+        third_field (str): The name of the third field in the table.
+        fourth_field (str, optional): The name of the fourth field in the table. Defaults to "Size".
+    """
+    total = sum(counts.values())
+    failed = sum(count for (third_status, size_status), count in counts.items() if 0 in (third_status, size_status))
+    third_counts = Counter()
+    size_counts = Counter()
+    for (third_status, size_status), count in counts.items():
+        third_counts[_status_name(third_status)] += count
+        size_counts[_status_name(size_status)] += count
+
+    def describe(column_counts: Counter) -> str:
+        return ", ".join(f"{column_counts[status]} {status.replace('_', ' ')}"
+                         for status in ("ok", "failed", "not_in_metadata") if column_counts[status])
+
+    color = TextColor.RED if failed else TextColor.GREEN
+    print_colored(f"{total} files checked, {failed} with failures", color)
+    print(f"{third_field}: {describe(third_counts)} | {fourth_field}: {describe(size_counts)}")
+
+
+def report_inaccessible_paths(access_map: dict, log_dir: str = None, name: str = "file_access"):
+    """
+    Report the paths that cannot be accessed, printing at most MAX_PRINTED_PATHS of them.
+    Every path is exported to the log directory with its accessibility.
+
+    Args:
+        access_map (dict): path -> True if the file is accessible else False.
+        log_dir (str, optional): Directory where every path is exported (RS_REPORT_FORMAT).
+        name (str, optional): Name of the exported report file. Defaults to "file_access".
+
+    Returns:
+        int: number of inaccessible paths.
+    """
+    inaccessible = 0
+    with ReportWriter(log_dir, name, ["file_path", "accessible"]) as writer:
+        for path, accessible in access_map.items():
+            writer.write((path, bool(accessible)))
+            if accessible:
+                continue
+            inaccessible += 1
+            if inaccessible == 1:
+                print_colored("The following paths are not accessible:", TextColor.RED)
+            if inaccessible <= MAX_PRINTED_PATHS:
+                print_colored(path, TextColor.RED)
+    if inaccessible > MAX_PRINTED_PATHS:
+        print_colored(f"... and {inaccessible - MAX_PRINTED_PATHS} more", TextColor.RED)
+    if writer.path:
+        print(f"File access report written to {writer.path}")
+    return inaccessible
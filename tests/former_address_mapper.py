@@ -0,0 +1,77 @@
+"""
+Former Address Mapper Module
+
+The address mapping of reproducibility_methods.address_mapper before the crate
+inventory and its suffix index, probing the filesystem with os.path.exists, kept
+to check the new mapping against it (see test_address_mapper) and to time both
+(see benchmarks/bench_address_mapper.py).
+"""
+import os
+
+
+def former_address_converter_backend(path: str, addr: str, dataset_hashmap: dict) -> str:
+    """
+    Converts the given address to a mapped address inside the RO_Crate
+    based on the dataset hashmap.
+
+    Raises:
+        FileNotFoundError: If the mapped address for the given address is not found.
+    """
+    filename = None
+    mapped_addr = None
+
+    if addr.startswith("./"):
+        addr = addr[1:]
+
+    if not addr.startswith("/"):
+        addr = "/" + addr
+
+    # Check if the address is a file or a directory and split it accordingly
+    if addr.endswith("/"):
+        addr_list = addr.split("/")
+    else:
+        addr_list = addr.split("/")
+        filename = addr_list.pop()
+
+    for i in range(1, len(addr_list)):
+        if addr_list[i] in dataset_hashmap:
+            temp_addr = os.path.join(path, addr_list[i])
+            for j in range(i + 1, len(addr_list)):
+                temp_addr = os.path.join(temp_addr, addr_list[j])
+
+            if os.path.exists(temp_addr):
+                mapped_addr = temp_addr
+                break
+
+    # If the address is a file, append the filename and check if exists
+    if filename:
+        if not mapped_addr:
+            mapped_addr = path
+        mapped_addr = os.path.join(mapped_addr, filename)
+        if not os.path.exists(mapped_addr):
+            raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
+
+    # Could not find such directory or file
+    if not mapped_addr:
+        raise FileNotFoundError(f"Could not find the mapped address for: {addr}")
+
+    return mapped_addr
+
+
+def former_address_converter(path: str, addr: str, dataset_hashmap: dict,
+                             application_sources_hashmap: dict) -> str:
+    """
+    Map an address to the dataset, else to the application sources (without a remote
+    or new dataset), the first folder where it is found is used.
+
+    Raises:
+        FileNotFoundError: Cannot find the address inside the RO_Crate.
+    """
+    errors = []
+    for folder, hashmap in ((os.path.join(path, "dataset"), dataset_hashmap),
+                            (os.path.join(path, "application_sources"), application_sources_hashmap)):
+        try:
+            return former_address_converter_backend(folder, addr, hashmap)
+        except FileNotFoundError as e:
+            errors.append(e)
+    raise FileNotFoundError(f"Could not find the mapped address for: {addr}") from errors[-1]
@@ -0,0 +1,180 @@
+"""
+Range Server Module
+
+Local HTTP/1.1 server for the download tests. It serves in-memory files with keep-alive
+connections, Range requests (bytes=start-end, bytes=start- and bytes=-length), ETag and
+Last-Modified validators with If-Range and If-None-Match, an optional bandwidth limit
+per response and connections dropped after a given number of bytes. It records every
+request, the bytes sent and the maximum number of requests served at once for each
+Host header.
+"""
+import hashlib
+import http.server
+import re
+import sys
+import threading
+import time
+
+from email.utils import formatdate
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+WRITE_SIZE = 16 * 1024
+
+
+class RangeServer:
+    """
+    Threaded HTTP server over a dict of files, used as a context manager.
+
+    Attributes:
+        files (dict): path (eg: /data.bin) -> content (bytes), may be replaced while serving.
+        rate (int): bytes per second sent by each response, None for no limit.
+        ranges (bool): False to ignore Range headers and always answer the whole file.
+        fail_after (dict): path -> bytes sent before the connection is dropped, once.
+        requests (list): (host, path, request headers) of every request received.
+        max_active (dict): host -> maximum number of requests served at once.
+        bytes_sent (dict): path -> bytes of content sent for it.
+    """
+    def __init__(self, files: dict = None, rate: int = None, ranges: bool = True):
+        self.files = dict(files or {})
+        self.rate = rate
+        self.ranges = ranges
+        self.fail_after = {}
+        self.requests = []
+        self.max_active = {}
+        self.bytes_sent = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._server = _HTTPServer(("127.0.0.1", 0), _handler(self))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        """
+        URL of a file. localhost and 127.0.0.1 reach the same server as two different hosts.
+        """
+        return f"http://{host}:{self.port}{path}"
+
+    def requests_for(self, path: str) -> list:
+        return [headers for _, request_path, headers in self.requests if request_path == path]
+
+    def validators(self, path: str) -> tuple[str, str]:
+        """
+        ETag and Last-Modified of a file, both change with its content.
+        """
+        digest = hashlib.sha256(self.files[path]).hexdigest()
+        return f'"{digest[:16]}"', formatdate(1700000000 + int(digest[:6], 16), usegmt=True)
+
+    def _enter(self, host: str):
+        with self._lock:
+            self._active[host] = self._active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self._active[host])
+
+    def _leave(self, host: str):
+        with self._lock:
+            self._active[host] -= 1
+
+    def _sent(self, path: str, size: int):
+        with self._lock:
+            self.bytes_sent[path] = self.bytes_sent.get(path, 0) + size
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients close their connection without reading the whole file (eg: the probe of a
+        # server ignoring ranges), the other errors are printed
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _handler(server: RangeServer):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, as the downloader pools connections
+
+        def log_message(self, *args): # pylint: disable=arguments-differ
+            pass
+
+        def do_GET(self): # pylint: disable=invalid-name
+            host = self.headers.get("Host", "")
+            server.requests.append((host, self.path, dict(self.headers)))
+            server._enter(host) # pylint: disable=protected-access
+            try:
+                self._serve()
+            finally:
+                server._leave(host) # pylint: disable=protected-access
+
+        def _serve(self):
+            content = server.files.get(self.path)
+            if content is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            etag, last_modified = server.validators(self.path)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            start, end, size = 0, len(content) - 1, len(content)
+            match = RANGE.match(self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            partial = server.ranges and match and (if_range is None or if_range in (etag, last_modified))
+            if partial:
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else: # the last bytes
+                    start = max(0, size - int(match.group(2)))
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes" if server.ranges else "none")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self._send(content[start:end + 1])
+
+        def _send(self, body: bytes):
+            limit = server.fail_after.pop(self.path, None)
+            sent = 0
+            for position in range(0, len(body), WRITE_SIZE):
+                chunk = body[position:position + WRITE_SIZE]
+                if limit is not None and sent + len(chunk) > limit:
+                    server._sent(self.path, limit - sent) # pylint: disable=protected-access
+                    self.wfile.write(chunk[:limit - sent])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                # Counted before it is written, the client may have it before this thread runs again
+                server._sent(self.path, len(chunk)) # pylint: disable=protected-access
+                try:
+                    self.wfile.write(chunk)
+                except OSError: # the client stopped reading
+                    self.close_connection = True
+                    return
+                sent += len(chunk)
+                if server.rate:
+                    time.sleep(len(chunk) / server.rate)
+
+    return Handler
@@ -0,0 +1,195 @@
+"""
+Address Mapper Test
+
+Maps random addresses of an original run (absolute, relative, with "./", with
+unrelated leading folders, directories ending with a slash...) to a synthetic crate
+with the suffix index of the crate inventory and with the former mapping probing the
+filesystem (see former_address_mapper), and checks that they agree except for the
+intended changes: an address whose directory exists without the file is mapped to the
+same file higher in the tree instead of failing, and the empty and "." segments are
+not kept in the mapped path (nor is a last "." taken as a file). Also checks that the addresses found in several folders of the crate are
+mapped as before and reported as ambiguous.
+
+Usage: python tests/test_address_mapper.py (or with pytest)
+"""
+import collections
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crate_inventory import CrateInventory # pylint: disable=wrong-import-position
+from reproducibility_methods.address_mapper import ( # pylint: disable=wrong-import-position
+    addr_extractor, address_converter, address_converter_backend, address_segments, report_ambiguous_addresses
+)
+from status_report import MAX_PRINTED_PATHS # pylint: disable=wrong-import-position
+from former_address_mapper import ( # pylint: disable=wrong-import-position
+    former_address_converter, former_address_converter_backend
+)
+
+DATASET = ["input/file_0.txt", "input/file_1.txt", "input/sub/file_2.txt", "input/sub/deep/file_3.txt",
+           "file_1.txt", "data.csv", "input/data.csv", "matrices/A/block_0", "matrices/B/block_0",
+           "matrices/B/block_1", "empty_dir/"]
+SOURCES = ["main.py", "tasks/task.py", "data.csv", "input/file_0.txt"]
+PREFIXES = ["home", "user", "run", "gpfs", "projects", "input", "matrices", "sub", "."]
+
+
+def write_crate(crate_path: str):
+    for folder, paths in (("dataset", DATASET), ("application_sources", SOURCES)):
+        for relative_path in paths:
+            path = os.path.join(crate_path, folder, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not relative_path.endswith("/"):
+                with open(path, 'w', encoding='utf-8') as file:
+                    file.write(relative_path)
+
+
+def random_address(rng: random.Random) -> str:
+    """
+    An address of the original run: a known path (or a directory of it, or a file moved
+    to another directory, or an unknown name) under random leading folders.
+    """
+    relative_path = rng.choice(DATASET + SOURCES).rstrip("/")
+    segments = relative_path.split("/")
+    kind = rng.random()
+    if kind < 0.2 and len(segments) > 1: # one of its directories
+        segments = segments[:rng.randrange(1, len(segments))]
+    elif kind < 0.4: # a file name found elsewhere in the crate
+        segments[-1] = os.path.basename(rng.choice(DATASET).rstrip("/")) or "file_1.txt"
+    elif kind < 0.45:
+        segments[-1] = "missing.txt"
+    segments = rng.sample(PREFIXES, rng.randrange(0, 4)) + segments
+    if rng.random() < 0.15 and len(segments) > 1: # segments the former mapping did not ignore
+        segments.insert(rng.randrange(1, len(segments)), rng.choice(["", "."]))
+    address = "/".join(segments)
+    start = rng.random()
+    if start < 0.4:
+        address = "/" + address
+    elif start < 0.6:
+        address = "./" + address
+    if rng.random() < 0.3:
+        address += "/"
+    return address
+
+
+def _map(function, *args) -> str:
+    try:
+        return function(*args)
+    except FileNotFoundError:
+        return None
+
+
+def _same_path(former: str, new: str) -> bool:
+    """
+    The former mapping kept the empty and "." segments it could follow (eg: input/./data.csv).
+    """
+    if former is None or new is None:
+        return former is new
+    return os.path.normpath(former) == os.path.normpath(new) and former.endswith("/") == new.endswith("/")
+
+
+def _missing_file_in_directory(path: str, addr: str, mapped: str) -> bool:
+    """
+    Whether the former mapping failed because the longest existing directory suffix of the
+    address does not hold the file, while the new one maps a shorter suffix.
+    """
+    segments, directory = address_segments(addr)
+    if directory or mapped is None:
+        return False
+    matched = len(os.path.relpath(mapped, path).split(os.sep))
+    for start in range(len(segments) - 1):
+        directory_path = os.path.join(path, *segments[start:-1])
+        if os.path.exists(directory_path):
+            return (len(segments) - start > matched
+                    and not os.path.exists(os.path.join(directory_path, segments[-1])))
+    return False
+
+
+def test_equivalence_with_the_former_mapping():
+    rng = random.Random(22)
+    crate_path = tempfile.mkdtemp(prefix="rs_test_mapper_")
+    write_crate(crate_path)
+    inventory = CrateInventory(crate_path)
+    outcomes = collections.Counter()
+    for folder in ("dataset", "application_sources"):
+        path = os.path.join(crate_path, folder)
+        hashmap = addr_extractor(path)
+        for _ in range(3000):
+            addr = random_address(rng)
+            former = _map(former_address_converter_backend, path, addr, hashmap)
+            new = _map(address_converter_backend, path, addr, hashmap, inventory)
+            if former == new:
+                outcomes["same" if new else "not found by both"] += 1
+            elif _same_path(former, new):
+                outcomes["same path without the empty and . segments"] += 1
+            elif former is not None: # what was mapped is still mapped to the same path
+                raise AssertionError(f"{addr} mapped to {new} instead of {former}")
+            elif _missing_file_in_directory(path, addr, new):
+                outcomes["file found higher in the tree"] += 1
+            else:
+                raise AssertionError(f"unexpected mapping of {addr}: {new} (not found before)")
+    assert outcomes["same"] > 1000 and outcomes["not found by both"] > 100, outcomes
+    assert outcomes["same path without the empty and . segments"] > 0, outcomes
+    assert outcomes["file found higher in the tree"] > 0, outcomes
+    print(f"6000 random addresses: {dict(outcomes)}")
+
+
+def test_intended_divergences():
+    crate_path = tempfile.mkdtemp(prefix="rs_test_mapper_")
+    write_crate(crate_path)
+    path = os.path.join(crate_path, "dataset")
+    hashmap = addr_extractor(path)
+    inventory = CrateInventory(crate_path)
+    # input/sub/ exists without data.csv, which is at the top of the dataset
+    addr = "/home/user/input/sub/data.csv"
+    assert _map(former_address_converter_backend, path, addr, hashmap) is None
+    assert address_converter_backend(path, addr, hashmap, inventory) == os.path.join(path, "data.csv")
+    # The mapped path no longer keeps the empty and "." segments
+    addr = "/home/input/./sub//file_2.txt"
+    assert former_address_converter_backend(path, addr, hashmap) == os.path.join(path, "input/./sub/file_2.txt")
+    assert address_converter_backend(path, addr, hashmap, inventory) == os.path.join(path, "input/sub/file_2.txt")
+    # Unchanged: directories only match directories, and keep their slash
+    assert address_converter_backend(path, "/run/matrices/B/", hashmap, inventory) == os.path.join(path, "matrices/B/")
+    assert _map(address_converter_backend, path, "/run/data.csv/", hashmap, inventory) is None
+    # A last "." was taken as a file name and mapped to the folder itself
+    assert former_address_converter_backend(path, "/run/tasks/.", hashmap) == os.path.join(path, ".")
+    assert _map(address_converter_backend, path, "/run/tasks/.", hashmap, inventory) is None
+    print("existing directory without the file: mapped higher in the tree; empty and . segments not kept")
+
+
+def test_ambiguous_addresses():
+    crate_path = tempfile.mkdtemp(prefix="rs_test_mapper_")
+    write_crate(crate_path)
+    inventory = CrateInventory(crate_path)
+    dataset_hashmap = addr_extractor(os.path.join(crate_path, "dataset"))
+    sources_hashmap = addr_extractor(os.path.join(crate_path, "application_sources"))
+    ambiguous = []
+    for addr in ("/gpfs/run/data.csv", "input/file_0.txt", "/home/tasks/task.py", "/user/matrices/A/block_0"):
+        mapped = address_converter(crate_path, addr, dataset_hashmap, sources_hashmap, {}, (False, False),
+                                   inventory, ambiguous)
+        assert mapped == former_address_converter(crate_path, addr, dataset_hashmap, sources_hashmap), addr
+    assert ambiguous == [
+        ("/gpfs/run/data.csv", [os.path.join(crate_path, "dataset", "data.csv"),
+                                os.path.join(crate_path, "application_sources", "data.csv")]),
+        ("input/file_0.txt", [os.path.join(crate_path, "dataset", "input", "file_0.txt"),
+                              os.path.join(crate_path, "application_sources", "input", "file_0.txt")])]
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        report_ambiguous_addresses(ambiguous * MAX_PRINTED_PATHS)
+    lines = [line for line in output.getvalue().splitlines() if line] # print_colored adds blank lines
+    assert f"{2 * MAX_PRINTED_PATHS} paths of the command were found in several folders" in lines[0]
+    assert len(lines) == MAX_PRINTED_PATHS + 2 and lines[-1] == f"  ... and {MAX_PRINTED_PATHS} more", lines
+    assert lines[1].endswith(f"(also {os.path.join(crate_path, 'application_sources', 'data.csv')})")
+    print("addresses in the dataset and the application sources: dataset used as before, reported as ambiguous")
+
+
+if __name__ == "__main__":
+    test_equivalence_with_the_former_mapping()
+    test_intended_divergences()
+    test_ambiguous_addresses()
@@ -0,0 +1,108 @@
+"""
+Concurrent Downloads Test
+
+Downloads remote datasets from a local throttled server (see range_server) with
+remote_dataset.download_files, and checks the number of connections per host, the
+largest first order, the speedup against one download at a time and that the
+running downloads stop as soon as one of them fails.
+
+Usage: python tests/test_concurrent_downloads.py (or with pytest)
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The cache directories are read when the modules are imported
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+os.environ["RS_DOWNLOAD_PROGRESS_INTERVAL"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader import partial_path # pylint: disable=wrong-import-position
+from remote_dataset import download_files # pylint: disable=wrong-import-position
+from range_server import RangeServer # pylint: disable=wrong-import-position
+
+FILE_SIZE = 256 * 1024
+RATE = 1024 * 1024 # bytes per second of each response
+
+
+def _files(count: int, size: int = FILE_SIZE) -> dict:
+    return {f"/file_{i}.bin": os.urandom(size + i * 1024) for i in range(count)}
+
+
+def _download(server: RangeServer, hosts: tuple, workers: int, per_host: int) -> tuple[dict, str, float]:
+    downloads = [(path[1:], server.url(path, hosts[i % len(hosts)]), len(content))
+                 for i, (path, content) in enumerate(server.files.items())]
+    download_path = tempfile.mkdtemp(prefix="rs_test_downloads_")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sizes = download_files(downloads, download_path, workers, per_host)
+    return sizes, download_path, time.perf_counter() - start
+
+
+def test_per_host_limit():
+    with RangeServer(_files(8), rate=RATE) as server:
+        sizes, download_path, _ = _download(server, ("127.0.0.1", "localhost"), workers=8, per_host=2)
+        for path, content in server.files.items():
+            with open(os.path.join(download_path, path[1:]), 'rb') as file:
+                assert file.read() == content
+            assert sizes[path[1:]] == len(content)
+        hosts = {f"127.0.0.1:{server.port}", f"localhost:{server.port}"}
+        assert set(server.max_active) == hosts
+        assert all(active == 2 for active in server.max_active.values()), server.max_active
+    print(f"per host limit: at most {server.max_active} downloads at once with RS_DOWNLOAD_PER_HOST=2")
+
+
+def test_largest_first():
+    files = {"/small.bin": os.urandom(1024), "/large.bin": os.urandom(64 * 1024), "/medium.bin": os.urandom(8192)}
+    with RangeServer(files) as server:
+        _download(server, ("127.0.0.1",), workers=1, per_host=1)
+        order = [path for _, path, _ in server.requests]
+    assert order == ["/large.bin", "/medium.bin", "/small.bin"], order
+    print(f"download order: {order}")
+
+
+def test_parallel_speedup():
+    files = _files(8)
+    # One server per run, the URLs differ and the second run does not hit the download cache
+    with RangeServer(files, rate=RATE) as server:
+        _, _, sequential = _download(server, ("127.0.0.1",), workers=1, per_host=1)
+    with RangeServer(files, rate=RATE) as server:
+        _, _, parallel = _download(server, ("127.0.0.1",), workers=4, per_host=4)
+        assert server.bytes_sent == {path: len(content) for path, content in files.items()}
+    print(f"8 files of 256 KiB at 1 MiB/s each: {sequential:.2f}s one at a time, "
+          f"{parallel:.2f}s four at a time ({sequential / parallel:.1f}x)")
+    assert sequential / parallel > 2.5
+
+
+def test_failure_stops_running_downloads():
+    files = {"/slow.bin": os.urandom(FILE_SIZE * 4)} # 4s at RATE / 4
+    with RangeServer(files, rate=RATE // 4) as server:
+        downloads = [("slow.bin", server.url("/slow.bin"), len(files["/slow.bin"])),
+                     ("missing.bin", server.url("/missing.bin"), 10)]
+        download_path = tempfile.mkdtemp(prefix="rs_test_downloads_")
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                download_files(downloads, download_path, workers=2, per_host=2)
+            raise AssertionError("the failed download was not reported")
+        except OSError as e:
+            assert "missing.bin" in str(e)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5) # the running download stops at its next chunk
+        workers = [thread for thread in threading.enumerate() if thread.name.startswith("ThreadPoolExecutor")]
+    assert elapsed < 2, elapsed
+    assert not workers, workers
+    assert not os.path.exists(os.path.join(download_path, "slow.bin"))
+    assert os.path.exists(partial_path(server.url("/slow.bin"))) # kept to resume it
+    print(f"failure reported after {elapsed:.2f}s, the running download stopped and kept its partial file")
+
+
+if __name__ == "__main__":
+    test_per_host_limit()
+    test_largest_first()
+    test_parallel_speedup()
+    test_failure_stops_running_downloads()
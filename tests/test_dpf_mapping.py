@@ -0,0 +1,140 @@
+"""
+DPF Mapping Test
+
+Maps the paths of commands of crates with data_persistence false (see
+data_persistance_false.DPFPathMatcher) on a synthetic layout of objects and results
+in a temporary directory standing for the shared filesystem, and checks the ranking
+of the candidates (the longest common path first, objects before results), the
+RS_DPF_MAX_PATH_PROBES budget and its warning, and that a command of 1080 paths
+over 1000 objects is mapped with one existence check per file.
+
+Usage: python tests/test_dpf_mapping.py (or with pytest)
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_persistance_false # pylint: disable=wrong-import-position
+from crate_context import CrateContext # pylint: disable=wrong-import-position
+from data_persistance_false import DPFPathMatcher, command_line_generator_dpf # pylint: disable=wrong-import-position
+
+
+def _touch(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8'):
+        pass
+
+
+def _segments(path: str) -> list:
+    return [segment for segment in path.split("/") if segment]
+
+
+@contextlib.contextmanager
+def count_checks(under: str):
+    """
+    Count the os.path.exists calls on the paths under a directory.
+    """
+    exists = os.path.exists
+    checks = []
+    def counting_exists(path):
+        if str(path).startswith(under):
+            checks.append(str(path))
+        return exists(path)
+    os.path.exists = counting_exists
+    try:
+        yield checks
+    finally:
+        os.path.exists = exists
+
+
+def test_ranking():
+    root = tempfile.mkdtemp(prefix="rs_test_dpf_")
+    for run in ("run_0", "run_1"): # two runs with the same layout
+        _touch(f"{root}/exp/{run}/input/x.dat")
+    _touch(f"{root}/shared/data/a.txt")
+    os.makedirs(f"{root}/out/data")
+    objects = [_segments(f"{root}/exp/{run}/input") for run in ("run_0", "run_1")] + [_segments(f"{root}/shared/data")]
+    matcher = DPFPathMatcher(objects, [_segments(f"{root}/out/data")])
+
+    # The longest common path first: an object path maps to itself, not to the other run
+    assert matcher.match(_segments(f"{root}/exp/run_1/input"), "x.dat") == (False, tuple(_segments(f"{root}/exp/run_1/input")))
+    assert matcher.match(_segments(f"/old/cluster/exp/run_0/input"), "x.dat") == (False, tuple(_segments(f"{root}/exp/run_0/input")))
+    # Objects before results with as much in common, results when they have more in common
+    assert matcher.match(["elsewhere", "data"]) == (False, tuple(_segments(f"{root}/shared/data")))
+    assert matcher.match(["elsewhere", "out", "data"]) == (True, tuple(_segments(f"{root}/out/data")))
+    print("ranking: longest common path first, then objects before results")
+
+
+def test_probe_budget():
+    root = tempfile.mkdtemp(prefix="rs_test_dpf_")
+    objects = []
+    for run in range(10):
+        _touch(f"{root}/exp/run_{run}/input/f_{run}.dat")
+        objects.append(_segments(f"{root}/exp/run_{run}/input"))
+    matcher = DPFPathMatcher(objects, [])
+    max_path_probes = data_persistance_false.MAX_PATH_PROBES
+    data_persistance_false.MAX_PATH_PROBES = 3
+    output = io.StringIO()
+    try:
+        with count_checks(root) as checks, contextlib.redirect_stdout(output):
+            assert matcher.match(["other", "input"], "missing.dat") == (False, None)
+            assert matcher.match(["other", "input"], "also_missing.dat") == (False, None) # a budget per address
+    finally:
+        data_persistance_false.MAX_PATH_PROBES = max_path_probes
+    assert len(checks) == 6, checks
+    warnings = [line for line in output.getvalue().splitlines() if "RS_DPF_MAX_PATH_PROBES" in line]
+    assert len(warnings) == 2 and "3 paths were checked to map other/input" in warnings[0], output.getvalue()
+    print("probe budget: 3 checks per address, then the other candidates are ignored with a warning")
+
+
+def test_command_of_1080_paths():
+    root = tempfile.mkdtemp(prefix="rs_test_dpf_")
+    crate_path = os.path.join(root, "crate")
+    _touch(os.path.join(crate_path, "application_sources", "main.py"))
+    objects = []
+    for run in ("run_0", "run_1"): # the other run has the same layout, it must not be used
+        for index in range(1000):
+            path = f"{root}/scratch/exp/{run}/input/block_{index % 10}/part_{index}.dat"
+            _touch(path)
+            if run == "run_1":
+                objects.append(path)
+    output_dir = f"{root}/scratch/exp/run_1/output/"
+    os.makedirs(output_dir)
+    graph = [{"@id": "./", "@type": "Dataset"},
+             {"@id": "#run", "@type": "CreateAction", "instrument": {"@id": "application_sources/main.py"},
+              "object": [{"@id": f"file://cluster{path}"} for path in objects],
+              "result": [{"@id": f"file://cluster{output_dir}"}]},
+             {"@id": f"file://cluster{output_dir}", "@type": "Dataset", "name": "output"}]
+    graph += [{"@id": f"file://cluster{path}", "@type": "File", "name": os.path.basename(path)} for path in objects]
+    with open(os.path.join(crate_path, "ro-crate-metadata.json"), 'w', encoding='utf-8') as file:
+        json.dump({"@context": "https://w3id.org/ro/crate/1.1/context", "@graph": graph}, file)
+    with open(os.path.join(crate_path, "ro-crate-info.yaml"), 'w', encoding='utf-8') as file:
+        file.write("COMPSs Workflow Information:\n  name: DPF crate\n  data_persistence: no\n")
+    outputs = [f"{output_dir}out_{index}.txt" for index in range(80)]
+    command = " ".join(["runcompss", "--lang=python", "main.py"] + objects + outputs)
+
+    data_persistance_false.RESULT_PATH = os.path.join(root, "Result")
+    try:
+        start = time.perf_counter()
+        with count_checks(os.path.join(root, "scratch")) as checks, contextlib.redirect_stdout(io.StringIO()):
+            new_command = command_line_generator_dpf(command, CrateContext(crate_path, backend="stream"))
+        seconds = time.perf_counter() - start
+    finally:
+        data_persistance_false.RESULT_PATH = None
+    assert new_command[2:1002] == objects
+    assert new_command[1002:] == [os.path.join(root, "Result", f"new_output_{index}", "") for index in range(80)]
+    assert sorted(checks) == sorted(objects + [output_dir.rstrip("/")]), len(checks) # one per file, one for the results
+    print(f"1080 paths over 1000 objects mapped in {seconds:.2f}s with {len(checks)} existence checks")
+
+
+if __name__ == "__main__":
+    test_ranking()
+    test_probe_budget()
+    test_command_of_1080_paths()
@@ -0,0 +1,111 @@
+"""
+Lazy Results Test
+
+Compares the results of a new run with the original results of a zipped crate opened
+with crate_extractor.open_crate_lazily (RS_LAZY_EXTRACT=1), where the dataset/ members
+are only extracted when needed, and checks that the verdict is the same as with the
+whole crate extracted: original results of the same size but another content are not
+reproduced. Also checks that the dataset structure shown as reference for a new
+dataset is read from the archive.
+
+Usage: python tests/test_lazy_results.py (or with pytest)
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crate_extractor # pylint: disable=wrong-import-position
+import status_report # pylint: disable=wrong-import-position
+import utils # pylint: disable=wrong-import-position
+from crate_context import CrateContext # pylint: disable=wrong-import-position
+from new_dataset_backend import new_dataset_info_collector # pylint: disable=wrong-import-position
+from result_verifier import result_verifier # pylint: disable=wrong-import-position
+
+status_report.REPORT_MODE = "summary" # the verdict is checked, not the table (RS_REPORT_MODE)
+
+METADATA = json.dumps({"@context": "https://w3id.org/ro/crate/1.1/context", "@graph": [
+    {"@id": "./", "@type": "Dataset", "name": "Lazy crate"},
+    {"@id": "#compss", "@type": "ComputerLanguage", "name": "COMPSs Programming Model", "version": "3.3.1"},
+    {"@id": "#run", "@type": "CreateAction", "name": "COMPSs run of the lazy crate",
+     "instrument": {"@id": "application_sources/main.py"}, "result": [{"@id": "dataset/out.txt"}]},
+    {"@id": "dataset/out.txt", "@type": "File", "name": "out.txt", "contentSize": 6},
+]})
+
+
+def _crate_zip(directory: str) -> str:
+    zip_path = os.path.join(directory, "crate.zip")
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        zip_file.writestr("ro-crate-metadata.json", METADATA)
+        zip_file.writestr("application_sources/main.py", "print('hello')\n")
+        zip_file.writestr("dataset/out.txt", b"hello\n")
+        zip_file.writestr("dataset/inputs/data.csv", "1,2\n")
+    return zip_path
+
+
+def _verdict(reproduced_content: bytes, lazy: bool) -> bool:
+    """
+    Open the crate (lazily or extracting everything) and compare its result with a new one.
+    """
+    directory = tempfile.mkdtemp(prefix="rs_test_lazy_")
+    zip_path = _crate_zip(directory)
+    crate_path = os.path.join(directory, "crate")
+    result_dir = os.path.join(directory, "Result")
+    os.makedirs(result_dir)
+    with open(os.path.join(result_dir, "out.txt"), 'wb') as file:
+        file.write(reproduced_content)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if lazy:
+                crate_extractor.open_crate_lazily(zip_path, crate_path)
+                assert not os.path.exists(os.path.join(crate_path, "dataset"))
+            else:
+                crate_extractor.extract_crate(zip_path, crate_path, skip_unreferenced=False, workers=1)
+            return result_verifier(CrateContext(crate_path, backend="stream"), result_dir)
+    finally:
+        crate_extractor.LAZY_ARCHIVES.pop(os.path.abspath(crate_path), None)
+
+
+def test_same_size_different_content():
+    assert not _verdict(b"HELLO\n", lazy=False)
+    assert not _verdict(b"HELLO\n", lazy=True)
+    print("same size, different content: not reproduced, lazily opened or fully extracted")
+
+
+def test_same_content():
+    assert _verdict(b"hello\n", lazy=False)
+    assert _verdict(b"hello\n", lazy=True)
+    print("same content: reproduced, lazily opened or fully extracted")
+
+
+def test_new_dataset_reference_tree():
+    directory = tempfile.mkdtemp(prefix="rs_test_lazy_")
+    crate_path = os.path.join(directory, "crate")
+    new_dataset_source = os.path.join(directory, "new")
+    os.makedirs(new_dataset_source)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            crate_extractor.open_crate_lazily(_crate_zip(directory), crate_path)
+            utils.PRESET_ANSWERS = {"new_dataset_path": new_dataset_source}
+            new_dataset_info_collector(CrateContext(crate_path, backend="stream"))
+    finally:
+        utils.PRESET_ANSWERS = None
+        crate_extractor.LAZY_ARCHIVES.pop(os.path.abspath(crate_path), None)
+    tree = output.getvalue().split("as follows:\n\n", 1)[1].split("Copied", 1)[0].splitlines()
+    assert sorted(tree) == ["    data.csv", "inputs", "out.txt"], tree
+    assert tree.index("    data.csv") == tree.index("inputs") + 1, tree
+    assert not os.path.exists(os.path.join(crate_path, "dataset")) # listed, not extracted
+    print("new dataset: the reference structure of the dataset was listed from the archive")
+
+
+if __name__ == "__main__":
+    test_same_size_different_content()
+    test_same_content()
+    test_new_dataset_reference_tree()
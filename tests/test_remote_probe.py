@@ -0,0 +1,143 @@
+"""
+Remote Probe Test
+
+Probes zipped crates served by a local Range server (see range_server) and checks that
+only the metadata, the YAML file and the submission command are transferred, that big
+central directories are read in several requests, and that the probe gives up (so the
+crate is simply downloaded) when the server ignores ranges, when the file changes
+between two requests or when it is not a zip file.
+
+Usage: python tests/test_remote_probe.py (or with pytest)
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from remote_probe import ( # pylint: disable=wrong-import-position
+    HTTPRangeFile, RangeNotSupported, probe_crate, probe_remote_crate
+)
+from range_server import RangeServer # pylint: disable=wrong-import-position
+
+METADATA = json.dumps({"@context": "https://w3id.org/ro/crate/1.1/context", "@graph": [
+    {"@id": "./", "@type": "Dataset", "name": "Probed crate"},
+    {"@id": "#compss", "@type": "ComputerLanguage", "name": "COMPSs Programming Model", "version": "3.3.1"},
+    {"@id": "#run", "@type": "CreateAction", "name": "COMPSs run of the probed crate",
+     "instrument": {"@id": "application_sources/main.py"}},
+]})
+YAML = "COMPSs Workflow Information:\n  name: Probed crate\n  data_persistence: yes\n"
+COMMAND = "runcompss main.py dataset/"
+
+
+def crate_zip(dataset_files: int, file_size: int) -> bytes:
+    """
+    A zipped crate with its metadata, YAML file, submission command, sources and dataset.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for index in range(dataset_files):
+            zip_file.writestr(f"dataset/part_{index:05d}.bin", os.urandom(file_size), zipfile.ZIP_STORED)
+        zip_file.writestr("application_sources/main.py", "print('hello')\n")
+        zip_file.writestr("compss_submission_command_line.txt", COMMAND)
+        zip_file.writestr("ro-crate-info.yaml", YAML)
+        zip_file.writestr("ro-crate-metadata.json", METADATA)
+    return buffer.getvalue()
+
+
+def _probe(server: RangeServer, path: str) -> tuple[dict, dict]:
+    """
+    Probe a crate and get the summary and the content of the extracted files.
+    """
+    with tempfile.TemporaryDirectory() as destination:
+        probe = probe_crate(server.url(path), destination)
+        extracted = {}
+        for name in os.listdir(destination):
+            with open(os.path.join(destination, name), 'r', encoding='utf-8') as file:
+                extracted[name] = file.read()
+    return probe, extracted
+
+
+def test_probe_transfers_only_the_metadata():
+    archive = crate_zip(16, 1024 * 1024)
+    with RangeServer({"/crate.zip": archive}) as server:
+        probe, extracted = _probe(server, "/crate.zip")
+    assert extracted == {"ro-crate-metadata.json": METADATA, "ro-crate-info.yaml": YAML,
+                         "compss_submission_command_line.txt": COMMAND}
+    assert probe["archive_size"] == len(archive)
+    assert probe["dataset_files"] == 16 and probe["dataset_size"] == 16 * 1024 * 1024
+    assert probe["transferred"] == server.bytes_sent["/crate.zip"]
+    assert probe["transferred"] < len(archive) / 20
+    print(f"probe: {probe['transferred'] / 1024:.0f} KiB in {probe['requests']} requests "
+          f"for a {len(archive) / (1024 * 1024):.0f} MiB crate")
+
+
+def test_probe_big_central_directory():
+    archive = crate_zip(20000, 1024) # a central directory of about 1.3 MiB
+    with RangeServer({"/many_files.zip": archive}) as server:
+        probe, extracted = _probe(server, "/many_files.zip")
+        requests = server.requests_for("/many_files.zip")
+    assert probe["dataset_files"] == 20000 and probe["members"] == 20004
+    assert extracted["ro-crate-metadata.json"] == METADATA
+    assert probe["requests"] > 2
+    assert probe["transferred"] < len(archive) / 10
+    assert all("If-Range" in headers for headers in requests[1:])
+    print(f"20000 files: {probe['transferred'] / 1024:.0f} KiB in {probe['requests']} requests "
+          f"for a {len(archive) / (1024 * 1024):.0f} MiB crate")
+
+
+def test_server_without_ranges():
+    with RangeServer({"/crate.zip": crate_zip(4, 1024)}, ranges=False) as server:
+        try:
+            _probe(server, "/crate.zip")
+            raise AssertionError("the server ignoring ranges was not detected")
+        except RangeNotSupported:
+            pass
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert not probe_remote_crate(server.url("/crate.zip")) # downloaded instead
+    print("server without Range support: probe abandoned")
+
+
+def test_file_changed_during_the_probe():
+    with RangeServer({"/crate.zip": crate_zip(64, 16 * 1024)}) as server:
+        with HTTPRangeFile(server.url("/crate.zip"), block_size=4096) as remote_file:
+            server.files["/crate.zip"] = crate_zip(64, 16 * 1024)
+            try:
+                remote_file.seek(0)
+                remote_file.read(16)
+                raise AssertionError("the change of the remote file was not detected")
+            except RangeNotSupported:
+                pass
+    print("remote file changed between two requests: If-Range answered 200, probe abandoned")
+
+
+def test_not_a_zip_file():
+    with RangeServer({"/crate.zip": os.urandom(100 * 1024)}) as server:
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert not probe_remote_crate(server.url("/crate.zip"))
+    print("not a zip file: probe abandoned")
+
+
+def test_probe_summary():
+    with RangeServer({"/crate.zip": crate_zip(8, 64 * 1024)}) as server:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assert probe_remote_crate(server.url("/crate.zip"))
+    summary = output.getvalue()
+    assert "COMPSs run of the probed crate" in summary and "3.3.1" in summary
+    assert "8 files, 0.5 MiB uncompressed" in summary
+    print(summary.rstrip())
+
+
+if __name__ == "__main__":
+    test_probe_transfers_only_the_metadata()
+    test_probe_big_central_directory()
+    test_server_without_ranges()
+    test_file_changed_during_the_probe()
+    test_not_a_zip_file()
+    test_probe_summary()
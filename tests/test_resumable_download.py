@@ -0,0 +1,187 @@
+"""
+Resumable Download Test
+
+Downloads files from a local Range server (see range_server) with downloader.download
+and checks that interrupted transfers resume from their partial file (in the same
+run and in the next one) with If-Range, restart from zero when the remote file changed
+or the server ignores ranges, that size mismatches and stale partial files leave
+nothing behind, and that unchanged files are taken from the download cache without
+touching the files already linked to it.
+
+Usage: python tests/test_resumable_download.py (or with pytest)
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+# The cache directories are read when the modules are imported
+os.environ["RS_CACHE_DIR"] = tempfile.mkdtemp(prefix="rs_test_cache_")
+os.environ["RS_DOWNLOAD_PROGRESS_INTERVAL"] = "0"
+os.environ["RS_DOWNLOAD_BACKOFF_MAX"] = "0.1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disk_cache import DiskCache # pylint: disable=wrong-import-position
+from downloader import download, evict_stale_partials, partial_path # pylint: disable=wrong-import-position
+from range_server import RangeServer # pylint: disable=wrong-import-position
+
+SIZE = 1024 * 1024
+DROPPED_AT = 300 * 1024
+
+
+def _download(url: str, expected_size: int = None, retries: int = None) -> tuple[int, str]:
+    destination = os.path.join(tempfile.mkdtemp(prefix="rs_test_downloads_"), "file.bin")
+    with contextlib.redirect_stdout(io.StringIO()):
+        size = download(url, destination, expected_size, retries)
+    return size, destination
+
+
+def _content(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_resume_in_the_same_run():
+    content = os.urandom(SIZE)
+    with RangeServer({"/same_run.bin": content}) as server:
+        server.fail_after["/same_run.bin"] = DROPPED_AT
+        size, destination = _download(server.url("/same_run.bin"), SIZE)
+        resumed = server.requests_for("/same_run.bin")[1]
+    assert size == SIZE and _content(destination) == content
+    assert resumed["Range"] == f"bytes={DROPPED_AT}-"
+    assert resumed["If-Range"] == server.validators("/same_run.bin")[0]
+    assert server.bytes_sent["/same_run.bin"] == SIZE # nothing was sent twice
+    print(f"dropped at {DROPPED_AT} bytes, resumed with '{resumed['Range']}', {SIZE} bytes sent in total")
+
+
+def test_resume_in_the_next_run():
+    content = os.urandom(SIZE)
+    with RangeServer({"/next_run.bin": content}) as server:
+        url = server.url("/next_run.bin")
+        server.fail_after["/next_run.bin"] = DROPPED_AT
+        try:
+            _download(url, SIZE, retries=0)
+            raise AssertionError("the interrupted download was not reported")
+        except OSError:
+            pass
+        assert os.path.getsize(partial_path(url)) == DROPPED_AT
+        assert os.path.exists(partial_path(url) + ".json")
+        size, destination = _download(url, SIZE)
+    assert size == SIZE and _content(destination) == content
+    assert server.requests_for("/next_run.bin")[1]["Range"] == f"bytes={DROPPED_AT}-"
+    assert server.bytes_sent["/next_run.bin"] == SIZE
+    assert not os.path.exists(partial_path(url)) and not os.path.exists(partial_path(url) + ".json")
+    print(f"failed run left {DROPPED_AT} bytes, the next run downloaded the remaining {SIZE - DROPPED_AT}")
+
+
+def test_if_range_restarts_a_changed_file():
+    with RangeServer({"/changed.bin": os.urandom(SIZE)}) as server:
+        url = server.url("/changed.bin")
+        server.fail_after["/changed.bin"] = DROPPED_AT
+        try:
+            _download(url, retries=0)
+        except OSError:
+            pass
+        new_content = os.urandom(SIZE // 2)
+        server.files["/changed.bin"] = new_content
+        size, destination = _download(url)
+        resumed = server.requests_for("/changed.bin")[1]
+    assert "If-Range" in resumed
+    assert size == len(new_content) and _content(destination) == new_content
+    print("the remote file changed: If-Range made the server send the whole new file")
+
+
+def test_server_without_ranges():
+    content = os.urandom(SIZE)
+    with RangeServer({"/no_ranges.bin": content}, ranges=False) as server:
+        server.fail_after["/no_ranges.bin"] = DROPPED_AT
+        size, destination = _download(server.url("/no_ranges.bin"), SIZE)
+    assert size == SIZE and _content(destination) == content
+    assert server.bytes_sent["/no_ranges.bin"] == DROPPED_AT + SIZE
+    print("the server ignored the Range request, the download restarted from zero")
+
+
+def test_size_mismatch_leaves_nothing():
+    with RangeServer({"/mismatch.bin": os.urandom(1000)}) as server:
+        url = server.url("/mismatch.bin")
+        try:
+            _download(url, expected_size=999)
+            raise AssertionError("the size mismatch was not reported")
+        except ValueError:
+            pass
+    assert not os.path.exists(partial_path(url)) and not os.path.exists(partial_path(url) + ".json")
+    print("size mismatch: partial file and validators removed")
+
+
+def test_stale_partials_are_evicted():
+    with RangeServer({"/stale.bin": os.urandom(SIZE)}) as server:
+        url = server.url("/stale.bin")
+        server.fail_after["/stale.bin"] = DROPPED_AT
+        try:
+            _download(url, retries=0)
+        except OSError:
+            pass
+    part_path = partial_path(url)
+    evict_stale_partials(os.path.dirname(part_path)) # recent, kept
+    assert os.path.exists(part_path)
+    old = time.time() - 30 * 24 * 3600
+    for path in (part_path, part_path + ".json", part_path[:-len(".part")] + ".lock"):
+        os.utime(path, (old, old))
+    evict_stale_partials(os.path.dirname(part_path))
+    assert not any(os.path.exists(path) for path in (part_path, part_path + ".json",
+                                                      part_path[:-len(".part")] + ".lock"))
+    print("partial file unused for 30 days removed with its validators and lock")
+
+
+def test_unchanged_file_from_the_cache():
+    content = os.urandom(SIZE)
+    with RangeServer({"/cached.bin": content}) as server:
+        url = server.url("/cached.bin")
+        _, first_destination = _download(url, SIZE)
+        first_stat = os.stat(first_destination)
+        time.sleep(0.01)
+        start = time.perf_counter()
+        size, destination = _download(url, SIZE)
+        seconds = time.perf_counter() - start
+        revalidation = server.requests_for("/cached.bin")[1]
+    assert size == SIZE and _content(destination) == content
+    # Linked to the same blob, the file of the first run keeps its mtime (and its digest signature)
+    assert os.stat(first_destination).st_mtime_ns == first_stat.st_mtime_ns
+    assert revalidation["If-None-Match"] == server.validators("/cached.bin")[0]
+    assert server.bytes_sent["/cached.bin"] == SIZE # downloaded once
+    print(f"second download answered 304 and linked from the cache in {seconds * 1000:.0f} ms")
+
+
+def test_blob_recency_in_used_files():
+    cache = DiskCache("recency_test", 2500)
+    blobs = {}
+    with cache.lock():
+        for key, mtime in (("first", 100), ("second", 200)):
+            source = os.path.join(cache.directory, key + ".tmp")
+            with open(source, 'wb') as file:
+                file.write(os.urandom(1000))
+            os.utime(source, (mtime, mtime))
+            blobs[key] = cache.put_blob(key, source)
+        os.utime(blobs["second"] + ".used", (300, 300))
+        assert cache.blob_path("first") == blobs["first"] # used again, now the most recent
+        assert os.stat(blobs["first"]).st_mtime == 100 # the blob itself is not touched
+        source = os.path.join(cache.directory, "third.tmp")
+        with open(source, 'wb') as file:
+            file.write(os.urandom(1000))
+        cache.put_blob("third", source)
+    assert cache.blob_path("second") is None and not os.path.exists(blobs["second"] + ".used")
+    assert cache.blob_path("first") is not None and cache.blob_path("third") is not None
+    print("blob cache: the least recently used blob was evicted with its .used file, the blobs were not touched")
+
+
+if __name__ == "__main__":
+    test_resume_in_the_same_run()
+    test_resume_in_the_next_run()
+    test_if_range_restarts_a_changed_file()
+    test_server_without_ranges()
+    test_size_mismatch_leaves_nothing()
+    test_stale_partials_are_evicted()
+    test_unchanged_file_from_the_cache()
+    test_blob_recency_in_used_files()
@@ -4,17 +4,20 @@ Utils Module
 It contains utility functions that are used in the main script or other modules.
 """
 import os
-import yaml
 import shutil
 import subprocess
+import sys
 import threading
 import time
-import urllib.request
 import zipfile
 
-from ruamel.yaml import YAML
-from rocrate.rocrate import ROCrate
-from tabulate import tabulate
+from crate_context import CrateContext
+from environment_probe import probe_compss_version, probe_slurm_cluster
+
+# Seconds the welcome message stays on screen before continuing, 0 to disable
+WELCOME_DELAY: float = float(os.environ.get("RS_WELCOME_DELAY", "1"))
+# Answers to the questions of the service in batch mode (key -> answer), None when interactive
+PRESET_ANSWERS: dict = None
 
 
 class TextColor:
@@ -61,62 +64,56 @@ def print_welcome_message():
     ║                                                    ║
     ╚════════════════════════════════════════════════════╝
     """
-    print_colored(welcome_text, TextColor.GREEN) # sleep for 1s for the user to see this
-    time.sleep(1)
+    print_colored(welcome_text, TextColor.GREEN) # sleep for the user to see this, unless used from a script
+    if WELCOME_DELAY > 0 and sys.stdout.isatty():
+        time.sleep(WELCOME_DELAY)
 
-def get_by_id(entity:ROCrate, id:str):
+def get_by_id(crate_context: CrateContext, id:str):
     """
-    To parse the ROCrate and get the entity with the specified ID.
+    To get the entity with the specified ID from the crate index.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
         id (str): The ID of the entity to be retrieved.
 
     Returns:
         _type_: None if not found else the entity with the specified ID.
     """
-    # Loop through all entities in the RO-Crate
-    for entity in entity.get_entities():
-        if entity.id == id:
-            return entity
-    return None
+    return crate_context.get_by_id(id)
 
-def get_Create_Action(crate:ROCrate):
+def get_Create_Action(crate_context: CrateContext):
     """
-    To get the CreateAction entity from the ROCrate.
+    To get the CreateAction entity from the crate index.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         _type_: None if not found else the CreateAction entity.
     """
-    # Loop through all entities in the RO-Crate
-    for entity in crate.get_entities():
-        if entity.type == "CreateAction":
-            return entity
-    return None
+    create_actions = crate_context.get_by_type("CreateAction")
+    return create_actions[0] if create_actions else None
 
-def get_instument(entity:ROCrate):
+def get_instument(crate_context: CrateContext):
     """
     To get the instrument ID from the CreateAction entity.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         _type_: The ID of the instrument.
     """
-    createAction = get_Create_Action(entity)
-    return createAction["instrument"].id
+    return crate_context.fact("instrument",
+                              lambda: get_Create_Action(crate_context)["instrument"].id)
 
-def get_objects(entity:ROCrate) -> list[str]:
+def get_objects(crate_context: CrateContext) -> list[str]:
     """
     To get the objects from the CreateAction entity.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         _type_: A list of object IDs.
     """
-    createAction = get_Create_Action(entity)
+    createAction = get_Create_Action(crate_context)
     objects = []
     if "object" in createAction:
         # It is not necessary to have inputs/objects in Create Action
@@ -132,16 +129,19 @@ def get_objects(entity:ROCrate) -> list[str]:
             objects.append(val.id)
     return objects
 
-def get_results_dict(entity:ROCrate)->dict:
+def get_results_dict(crate_context: CrateContext)->dict:
     """
     To get the results from the CreateAction entity.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         _type_: A dictionary mapped from the result name to the result ID.
     """
-    createAction = get_Create_Action(entity)
+    return crate_context.fact("results", lambda: _extract_results_dict(crate_context))
+
+def _extract_results_dict(crate_context: CrateContext)->dict:
+    createAction = get_Create_Action(crate_context)
     results= {}
     if "result" in createAction:
         # It is not necessary to have inputs/objects in Create Action
@@ -154,16 +154,19 @@ def get_results_dict(entity:ROCrate)->dict:
     return results
 
 
-def get_objects_dict(entity:ROCrate)->dict:
+def get_objects_dict(crate_context: CrateContext)->dict:
     """
     To get the objects from the CreateAction entity.
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         dict:A dict of (name,id) -> id , so that it does'nt collide with the same name
     """
-    createAction = get_Create_Action(entity)
+    return crate_context.fact("objects", lambda: _extract_objects_dict(crate_context))
+
+def _extract_objects_dict(crate_context: CrateContext)->dict:
+    createAction = get_Create_Action(crate_context)
     objects= {}
     if "object" in createAction:
         # It is not necessary to have inputs/objects in Create Action
@@ -181,16 +184,16 @@ def get_objects_dict(entity:ROCrate)->dict:
             # else it is just a single object
     return objects
 
-def get_create_action_name(entity: ROCrate) -> str:
+def get_create_action_name(crate_context: CrateContext) -> str:
     """
     Gets the COMPSs execution details in CreateAction["name"].
     Args:
-        entity (ROCrate): The ROCrate object.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         str: The CreateAction["name"].
     """
-    createAction = get_Create_Action(entity)
+    createAction = get_Create_Action(crate_context)
     return createAction["name"]
 
 
@@ -212,29 +215,39 @@ def get_file_names(folder_path: str) -> dict:
             file_names[file] = os.path.join(root, file)
     return file_names
 
-def get_compss_crate_version(crate_path: str) ->  str:
+def get_compss_crate_version(crate_context: CrateContext) ->  str:
     """
     Gets the COMPSs version used to create the ROCrate.
     Args:
-        crate_path (str): The path to the ROCrate.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         float: The version of COMPSs used to create the ROCrate.
     """
-    crate = ROCrate(crate_path)
-    compss_object = get_by_id(crate,"#compss")
-    return compss_object["version"]
+    return crate_context.fact("compss_version",
+                              lambda: get_by_id(crate_context,"#compss")["version"])
 
 
-def get_yes_or_no(msg :str) :
+def get_yes_or_no(msg :str, key: str = None) :
     """
     To get the user input as 'y' or 'n'.
+    In batch mode the answer is taken from the manifest instead, see PRESET_ANSWERS.
     Args:
         msg (str): The message outputed to the user
+        key (str, optional): Name of the answer in the batch manifest.
+
+    Raises:
+        ValueError: In batch mode, if the manifest does not answer the question.
 
     Returns:
         _type_: True if 'y' else False if 'n'.
     """
+    if PRESET_ANSWERS is not None:
+        if key not in PRESET_ANSWERS:
+            raise ValueError(f"The batch manifest does not answer the question: {msg}")
+        answer = bool(PRESET_ANSWERS[key])
+        print(f"{msg} (y/n): {'y' if answer else 'n'} (from the batch manifest)")
+        return answer
     while True:
         user_input = input(f"{msg} (y/n):").lower()
         if user_input == 'y' or user_input == 'n':
@@ -245,56 +258,70 @@ def get_yes_or_no(msg :str) :
         else:
             print("Invalid input. Please enter 'y' or 'n'.")
 
-def get_data_persistence_status(crate_path:str) -> bool:
+def preset_answer(key: str, default=None):
+    """
+    To get an answer of the batch manifest.
+    Args:
+        key (str): Name of the answer in the batch manifest.
+        default (optional): Value if the manifest does not give it.
+
+    Returns:
+        The answer, None when the service is interactive.
+    """
+    if PRESET_ANSWERS is None:
+        return None
+    return PRESET_ANSWERS.get(key, default)
+
+def get_answer(msg: str, key: str) -> str:
+    """
+    To get a free text answer of the user, or in batch mode the one of the manifest.
+    Args:
+        msg (str): The message outputed to the user
+        key (str): Name of the answer in the batch manifest.
+
+    Returns:
+        str: The answer, empty if the manifest does not give it.
+    """
+    if PRESET_ANSWERS is not None:
+        answer = str(PRESET_ANSWERS.get(key) or "")
+        print(f"{msg}{answer} (from the batch manifest)")
+        return answer
+    return input(msg)
+
+def get_data_persistence_status(crate_context: CrateContext) -> bool:
     """
     To get data_persistence status from ro-crate-yaml file.
     Args:
-        crate_path (str): Path for the crate directory.
+        crate_context (CrateContext): The parsed crate.
     Raises:
         FileNotFoundError: If ro-crate-info.yaml file not found in the crate.
 
     Returns:
         bool: True if data_persistence is True else False.
     """
-    #It may not be named ro-crate-info.yaml, eg: 838-1 crate
-    yaml_file_path = None
-    for name in os.listdir(crate_path):
-        if name.endswith(".yaml"):
-            yaml_file_path = f"{crate_path}/{name}"
-            break
-    if not yaml_file_path:
-        raise FileNotFoundError("YAML file not found in the crate")
-    # Open and read the YAML file
-    with open(yaml_file_path, 'r') as file:
-        # Load the content of the YAML file
-        config = yaml.safe_load(file)
     # Extract the value of data_persistence
-    data_persistence = config.get('COMPSs Workflow Information',
-                                  {}).get('data_persistence', None)
+    return crate_context.fact("data_persistence",
+                              lambda: _yaml_bool(crate_context.config.get('COMPSs Workflow Information',
+                                                                          {}).get('data_persistence', None)))
 
-    return data_persistence
+def _yaml_bool(value) -> bool:
+    """
+    Read a YAML boolean. The YAML 1.2 loader leaves the YAML 1.1 forms (yes, no, on, off) as strings.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ("yes", "true", "on", "1")
+    return bool(value)
 
-def get_name_and_description(crate_path: str) -> tuple:
+def get_name_and_description(crate_context: CrateContext) -> tuple:
     """
     To get the name and description from the ro-crate-info.yaml file.
     Args:
-        crate_path (str): Path to the crate directory.
+        crate_context (CrateContext): The parsed crate.
 
     Returns:
         tuple: returns tuple of name, description and authors.
     """
-     #It may not be named ro-crate-info.yaml, eg: 838-1 crate
-    yaml_file_path = None
-    for name in os.listdir(crate_path):
-        if name.endswith(".yaml"):
-            yaml_file_path = f"{crate_path}/{name}"
-            break
-    if not yaml_file_path:
-        raise Exception("ro-crate-info.yaml file not found in the crate")
-    # Open and read the YAML file
-    with open(yaml_file_path, 'r') as file:
-        # Load the content of the YAML file
-        data = YAML().load(file)
+    data = crate_context.config
 
     # Extract name and description
     name = data['COMPSs Workflow Information'].get('name', '')
@@ -390,72 +417,59 @@ def executor(command: list[str], execution_path: str) :
         print("Command failed with return code:", process.returncode)
         return False
 
-def download_file(url: str , download_path: str, file_name: str):
+def download_file(url: str , download_path: str, file_name: str, expected_size: int = None,
+                  cancel: threading.Event = None) -> int:
     """
     Downloads a file from the specified URL and saves it to the specified path.
+    The download resumes where it stopped if it was interrupted, see downloader.
     Args:
         url (str):  The URL of the file to be downloaded.
         download_path (str):  The path where the file should be saved.
         file_name (str):  The name of the file to be saved.
+        expected_size (int, optional): contentSize of the file in the crate, checked once downloaded.
+        cancel (threading.Event, optional): stops the download once set.
+
+    Returns:
+        int: size of the downloaded file, before the extraction of zip files.
     """
-    if not os.path.exists(download_path):
-        os.makedirs(download_path)
+    os.makedirs(download_path, exist_ok=True) # downloads can run concurrently
     # Create the full path to the file
     full_path = os.path.join(download_path, file_name)
     print_colored(f"Downloading {file_name} from {url} to {full_path}, please wait...", TextColor.YELLOW)
     # Download the file and save it to the specified path
-    urllib.request.urlretrieve(url, full_path)
+    from downloader import download
+    downloaded_size = download(url, full_path, expected_size, cancel=cancel)
     print(f"File downloaded as {full_path}")
     # Check if the file is a zip file and extract it
     if zipfile.is_zipfile(full_path):
-        with zipfile.ZipFile(full_path, 'r') as zip_ref:
-            zip_ref.extractall(download_path)
+        from crate_extractor import extract_crate
+        extract_crate(full_path, download_path, skip_unreferenced=False)
         print(f"Extracted {file_name} in {download_path}")
 
         # Remove the zip file after extraction
         os.remove(full_path)
         print(f"Removed the zip file {file_name}")
+    return downloaded_size
 
 def check_compss_version()-> str:
     """
     To check the version of COMPSs installed on the system.
+    The check is done once per process, see environment_probe.
     Returns:
         float: The version of COMPSs installed on the system.
     """
-    try:
-        # Execute the command
-        result = subprocess.run(['runcompss', '-v'], capture_output=True, text=True, check=True)
-
-        # Parse the output
-        output = result.stdout.strip()
-        if "COMPSs version" in output:
-            version = output.split('COMPSs version ')[1].split(" ")[0]
-            print(f"COMPSs Version Found: {version}")
-            return version
-        else:
-            return "COMPSs version not found in the output."
-
-    except subprocess.CalledProcessError as e:
-        return f"An error occurred while trying to get COMPSs version: {e}"
-    except FileNotFoundError:
-        return "runcompss command not found. Please ensure that COMPSs is installed and the command is available in your PATH."
+    return probe_compss_version()
 
 def check_slurm_cluster() -> tuple[bool, str]:
     """
     To check if the program is running on a SLURM cluster.
+    The check is done once per process, see environment_probe.
 
     Returns:
         tuple[bool, str]: tuple of a boolean indicating if the program
             is running on a SLURM cluster and a message.
     """
-    try:
-        result = subprocess.run(['squeue'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return True, result.stdout
-    except Exception as e:
-        return False, str(e)
-
-    return False, "squeue command failed without raising an exception"
+    return probe_slurm_cluster()
 
 def get_previous_flags(crate_path: str) -> list[str]:
     """
@@ -511,16 +525,17 @@ def wrap_text(text, width):
     return '\n'.join([text[i:i+width] for i in range(0, len(text), width)])
 
 # Function to generate the table
-def generate_file_status_table(file_status_list,Third_field:str, path_width_limit=40):
+def generate_file_status_table(file_status_list,Third_field:str, path_width_limit=40, Fourth_field:str = "Size"):
     """
     To generate a table to display the file status.
     Args:
         file_status_list (): list of tuples containing the file status information.
         Third_field (str): The name of the third field in the table.
+        Fourth_field (str, optional): The name of the fourth field in the table. Defaults to "Size".
     """
     table = []
     # Adding header row
-    table.append(["", "Metadata File Name", "Host File Path", Third_field , "Size"])
+    table.append(["", "Metadata File Name", "Host File Path", Third_field , Fourth_field])
 
     # Adding file status rows
     for i, (filename, file_path, file_exists, file_size_verified) in enumerate(file_status_list, start=1):
@@ -533,6 +548,7 @@ def generate_file_status_table(file_status_list,Third_field:str, path_width_limi
         table.append([i, wrapped_filename, wrapped_file_path, exists_symbol, size_verified_symbol])
 
     # Print the table
+    from tabulate import tabulate
     print(tabulate(table, headers="firstrow", tablefmt="grid"))
     print_symbol_reference()
 
@@ -0,0 +1,308 @@
+"""
+Verification Engine Module
+
+Runs the filesystem metadata calls needed to verify the files of a crate on a bounded
+thread pool. On parallel filesystems (GPFS, Lustre...) each call waits milliseconds
+on the metadata servers, so issuing them concurrently is what makes the verification
+of big datasets fast. The number of threads is set with RS_VERIFY_WORKERS.
+
+It also provides the optional integrity check (RS_INTEGRITY_CHECK=1): file contents are
+hashed in a process pool, streaming each file in fixed-size chunks, and compared with the
+digests recorded in the crate. Computed digests are cached by stat signature (device,
+inode, size, mtime_ns), so unchanged files are not hashed again on the next runs. The
+cache is split in shards by the hash of the signature, a run only reads and rewrites
+the shards of its own files.
+"""
+import hashlib
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from disk_cache import DiskCache
+
+VERIFY_WORKERS: int = int(os.environ.get("RS_VERIFY_WORKERS", "32"))
+INTEGRITY_CHECK: bool = os.environ.get("RS_INTEGRITY_CHECK", "0").lower() in ("1", "true", "yes")
+HASH_WORKERS: int = int(os.environ.get("RS_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_ALGORITHM = "sha256" # also the name of the crate property holding the expected digest
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+DIGESTS_FILE_NAME = "sha256sums.txt"
+VERIFICATION_CACHE_ENABLED: bool = os.environ.get("RS_VERIFICATION_CACHE", "1").lower() not in ("0", "false", "no")
+VERIFICATION_CACHE = DiskCache("verification", 512 * 1024 * 1024)
+DIGESTS_CACHE_KEY = "file_digests"
+DIGEST_SHARDS = 256
+MAX_CACHED_DIGESTS = 1000000 # in all the shards
+
+
+def _stat(path: str):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _readable(path: str) -> bool:
+    return os.access(path, os.R_OK)
+
+
+def parallel_map(function, paths: list, label: str, workers: int = None) -> dict:
+    """
+    Apply a function to every path on a thread pool and report the throughput.
+
+    Args:
+        function (callable): function taking a path.
+        paths (list): paths to process, duplicates are processed once.
+        label (str): what is being done, for the throughput report.
+        workers (int, optional): number of threads. Defaults to RS_VERIFY_WORKERS.
+
+    Returns:
+        dict: path -> result of the function
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    if not unique_paths:
+        return {}
+    workers = max(1, min(workers or VERIFY_WORKERS, len(unique_paths)))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(unique_paths, pool.map(function, unique_paths)))
+    elapsed = time.perf_counter() - start
+    rate = len(unique_paths) / elapsed if elapsed > 0 else float("inf")
+    print(f"{label}: {len(unique_paths)} files in {elapsed:.2f}s ({rate:.0f} files/s, {workers} threads)")
+    return results
+
+
+def stat_files(paths: list, workers: int = None) -> dict:
+    """
+    Stat every path once, in parallel.
+
+    Args:
+        paths (list): paths of the files to stat.
+        workers (int, optional): number of threads. Defaults to RS_VERIFY_WORKERS.
+
+    Returns:
+        dict: path -> os.stat_result, or None if the file does not exist or cannot be accessed.
+    """
+    return parallel_map(_stat, paths, "Checked", workers)
+
+
+def hash_file(path: str) -> str:
+    """
+    Hash a file reading it in fixed-size chunks, so memory use does not depend on its size.
+
+    Args:
+        path (str): path to the file.
+
+    Returns:
+        str: hex digest, or None if the file cannot be read.
+    """
+    return _hash_file(path)[0]
+
+
+def _hash_file(path: str) -> tuple[str, int]:
+    total = 0
+    digest = hashlib.new(HASH_ALGORITHM)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    try:
+        with open(path, 'rb', buffering=0) as file:
+            while True:
+                read = file.readinto(buffer)
+                if not read:
+                    break
+                digest.update(view[:read])
+                total += read
+    except OSError:
+        return None, 0
+    return digest.hexdigest(), total
+
+
+def hash_files(paths: list, workers: int = None) -> dict:
+    """
+    Hash the files in parallel on a process pool and report the throughput.
+
+    Args:
+        paths (list): paths of the files to hash.
+        workers (int, optional): number of processes. Defaults to RS_HASH_WORKERS.
+
+    Returns:
+        dict: path -> hex digest, or None if the file cannot be read.
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    if not unique_paths:
+        return {}
+    workers = max(1, min(workers or HASH_WORKERS, len(unique_paths)))
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_hash_file(path) for path in unique_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_hash_file, unique_paths))
+    elapsed = time.perf_counter() - start
+    digests = {path: digest for path, (digest, _) in zip(unique_paths, results)}
+    total_bytes = sum(size for _, size in results)
+    rate = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else float("inf")
+    print(f"Hashed: {len(unique_paths)} files in {elapsed:.2f}s ({rate:.1f} MiB/s, {workers} processes)")
+    return digests
+
+
+def stat_signature(file_stat: os.stat_result) -> str:
+    """
+    Signature of a file that changes whenever its content may have changed.
+    """
+    return f"{file_stat.st_dev}:{file_stat.st_ino}:{file_stat.st_size}:{file_stat.st_mtime_ns}"
+
+
+def digests_shard_key(signature: str) -> str:
+    """
+    Key of the verification cache entry holding the digest of a stat signature.
+    """
+    shard = hashlib.sha256(signature.encode()).digest()[0] % DIGEST_SHARDS
+    return f"{DIGESTS_CACHE_KEY}_{shard:02x}"
+
+
+def _by_shard(signatures) -> dict:
+    shards = {}
+    for signature in signatures:
+        shards.setdefault(digests_shard_key(signature), []).append(signature)
+    return shards
+
+
+def cached_hash_files(paths: list, stats: dict = None) -> tuple[dict, dict]:
+    """
+    Hash the files, taking the digests of the files whose stat signature is in the
+    verification cache from it instead of hashing them again.
+
+    Args:
+        paths (list): paths of the files to hash.
+        stats (dict, optional): path -> os.stat_result of the files, as given by stat_files.
+
+    Returns:
+        tuple[dict, dict]: path -> hex digest (None if the file cannot be read),
+            and path -> stat signature of the files that can be cached.
+    """
+    signatures = {}
+    if VERIFICATION_CACHE_ENABLED and stats:
+        signatures = {path: stat_signature(stats[path]) for path in paths if stats.get(path)}
+    cached = {}
+    for key in _by_shard(signatures.values()):
+        cached.update(VERIFICATION_CACHE.get_json(key) or {})
+
+    digests = {}
+    for path, signature in signatures.items():
+        if signature in cached:
+            digests[path] = cached[signature][0]
+    if digests:
+        print(f"{len(digests)} files unchanged since their last verification, not hashed again")
+    digests.update(hash_files([path for path in paths if path not in digests]))
+    return digests, signatures
+
+
+def cache_digests(digests: dict, signatures: dict, verdicts: dict):
+    """
+    Record computed digests in the verification cache.
+
+    Args:
+        digests (dict): path -> hex digest.
+        signatures (dict): path -> stat signature, as given by cached_hash_files.
+        verdicts (dict): path -> whether the digest matched the crate (None if the crate has no digest for it).
+    """
+    if not signatures:
+        return
+    now = int(time.time())
+    # signature -> [digest, verdict (None if the crate has no digest), last use]
+    entries = {signature: [digests[path], verdicts.get(path), now]
+               for path, signature in signatures.items() if digests.get(path)}
+    for key, shard_signatures in _by_shard(entries).items():
+        shard_entries = {signature: entries[signature] for signature in shard_signatures}
+        VERIFICATION_CACHE.update_json(key, lambda document, new=shard_entries: _merge_digests(document, new))
+
+
+def record_digests(digests: dict, log_dir: str):
+    """
+    Append the digests to the sha256sum format file of the log directory.
+    """
+    digests_path = os.path.join(log_dir, DIGESTS_FILE_NAME)
+    with open(digests_path, 'a', encoding='utf-8') as file:
+        for path, digest in digests.items():
+            if digest:
+                file.write(f"{digest}  {path}\n")
+    print(f"Computed digests recorded in {digests_path}")
+
+
+def verify_digests(expected: dict, log_dir: str = None, stats: dict = None) -> list:
+    """
+    Hash the files and compare them with the digests recorded in the crate.
+    Files whose stat signature is in the verification cache are not hashed again.
+    The computed digests are written to log_dir in sha256sum format, for later runs.
+
+    Args:
+        expected (dict): path -> expected digest, or None if the crate has no digest for it.
+        log_dir (str, optional): directory where the computed digests are recorded.
+        stats (dict, optional): path -> os.stat_result of the files, as given by stat_files.
+
+    Returns:
+        list: paths whose content does not match the expected digest.
+    """
+    digests, signatures = cached_hash_files(list(expected), stats)
+    mismatches = [path for path, digest in digests.items()
+                  if expected[path] and digest and digest != expected[path].lower()]
+    mismatched = set(mismatches)
+    cache_digests(digests, signatures,
+                  {path: path not in mismatched for path in expected if expected[path]})
+    if log_dir:
+        record_digests(digests, log_dir)
+    return mismatches
+
+
+def _merge_digests(document: dict, entries: dict) -> dict:
+    """
+    Add entries to a shard of the cached digests, keeping only the most recently used ones.
+    """
+    document = document or {}
+    document.update(entries)
+    max_entries = MAX_CACHED_DIGESTS // DIGEST_SHARDS
+    if len(document) > max_entries:
+        newest = sorted(document.items(), key=lambda item: item[1][2], reverse=True)[:max_entries]
+        document = dict(newest)
+    return document
+
+
+def integrity_verifier(crate_context, file_verifier: list, entity_ids: dict, log_dir: str = None,
+                       stats: dict = None) -> list:
+    """
+    Verify the content hashes of the existing files of a status table against the
+    hash recorded in the RO-Crate, if any. The size column of mismatching files is set to 0.
+
+    Args:
+        crate_context (CrateContext): The parsed RO-Crate.
+        file_verifier (list): status tuples of (file_name, file_path, exists, size_verified). Updated in place.
+        entity_ids (dict): file_path -> id of the entity describing the file in the RO-Crate.
+        log_dir (str, optional): Directory where the computed digests are recorded.
+        stats (dict, optional): path -> os.stat_result of the files, to skip the unchanged ones.
+
+    Returns:
+        list: paths of the files whose content does not match the RO-Crate.
+    """
+    expected = {}
+    for _, file_path, exists, _ in file_verifier:
+        if exists:
+            entity = crate_context.get_by_id(entity_ids.get(file_path))
+            expected[file_path] = entity[HASH_ALGORITHM] if entity is not None and HASH_ALGORITHM in entity else None
+    mismatches = set(verify_digests(expected, log_dir, stats))
+    for i, (name, file_path, exists, _) in enumerate(file_verifier):
+        if file_path in mismatches:
+            file_verifier[i] = (name, file_path, exists, 0)
+    return sorted(mismatches)
+
+
+def check_readable(paths: list, workers: int = None) -> dict:
+    """
+    Check in parallel that every path can be read.
+
+    Args:
+        paths (list): paths of the files to check.
+        workers (int, optional): number of threads. Defaults to RS_VERIFY_WORKERS.
+
+    Returns:
+        dict: path -> True if the file is readable else False.
+    """
+    return parallel_map(_readable, paths, "Checked access to", workers)